@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# mPlane Protocol Reference Implementation
+# Memory footprint benchmark for information model objects
+#
+# Reports the bytes held per live Capability, Specification and Result
+# row, the way a client or supervisor keeps them in its tables.
+#
+# Run from the top of the source tree: python3 benchmarks/memory.py
+#
+
+import gc
+import sys
+import os
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import mplane.model
+
+COUNT = 5000
+RESULTS = 1000
+ROWS = 100
+
+def make_capability(i):
+    cap = mplane.model.Capability(label="ping-" + str(i), when="now ... future / 1s")
+    cap.add_parameter("source.ip4", "10.0.27.2")
+    cap.add_parameter("destination.ip4")
+    cap.add_metadata("System_type", "ping")
+    cap.add_result_column("time")
+    cap.add_result_column("delay.twoway.icmp.us")
+    return cap
+
+def make_specification(cap, i):
+    spec = mplane.model.Specification(capability=cap)
+    spec.set_parameter_value("source.ip4", "10.0.27.2")
+    spec.set_parameter_value("destination.ip4", "10.0." + str(i % 256) + ".1")
+    return spec
+
+def make_result(spec):
+    res = mplane.model.Result(specification=spec)
+    now = datetime.utcnow()
+    for row in range(ROWS):
+        res.set_result_value("time", now, row)
+        res.set_result_value("delay.twoway.icmp.us", row * 10, row)
+    return res
+
+def measure(label, per, build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("%-14s %8.0f bytes" % (label, (after - before) / per))
+    return kept
+
+def main():
+    mplane.model.initialize_registry()
+    caps = measure("capability", COUNT,
+                   lambda: [make_capability(i) for i in range(COUNT)])
+    specs = measure("specification", COUNT,
+                    lambda: [make_specification(caps[i], i) for i in range(COUNT)])
+    measure("result row", RESULTS * ROWS,
+            lambda: [make_result(spec) for spec in specs[:RESULTS]])
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,7 @@ import mplane.utils
 from datetime import datetime
 
 import html.parser
+import itertools
 import urllib3
 
 # FIXME HACK
@@ -54,6 +55,113 @@ DEFAULT_REGISTRATION_PATH = "register/capability"
 DEFAULT_SPECIFICATION_PATH = "show/specification"
 DEFAULT_RESULT_PATH = "register/result"
 
+class _SchemaIndex(object):
+    """
+    The capabilities known to a client which share a schema, keyed
+    by token, with per-parameter indices for finding those which
+    accept a given value. Parameter indices are built on demand, then
+    kept up to date as capabilities are added and removed.
+
+    """
+    def __init__(self):
+        self.capabilities = {}
+        # order in which the capabilities were added, by token
+        self._seq = {}
+        self._next_seq = itertools.count()
+        self._accepting = {}
+
+    def add(self, cap):
+        token = cap.get_token()
+        if token in self.capabilities:
+            self.remove(token)
+        self.capabilities[token] = cap
+        self._seq[token] = next(self._next_seq)
+        for (pname, tables) in self._accepting.items():
+            self._index(tables, pname, token, cap)
+
+    def remove(self, token):
+        cap = self.capabilities.pop(token, None)
+        if cap is None:
+            return
+        for (pname, tables) in self._accepting.items():
+            self._unindex(tables, pname, token, cap)
+        del self._seq[token]
+
+    def _index(self, tables, pname, token, cap):
+        # sort capabilities by the kind of constraint on the parameter:
+        # set members and networks can be looked up, the rest are checked
+        (values, networks, others) = tables
+        entry = (self._seq[token], cap)
+        constraint = cap.get_parameter_constraint(pname)
+        if isinstance(constraint, mplane.model._SetConstraint) and \
+           not constraint.multival:
+            for val in constraint.vs:
+                values.setdefault(val, {})[token] = entry
+        elif isinstance(constraint, mplane.model._NetworkConstraint) and \
+             not constraint.multival:
+            for net in constraint.networks:
+                networks.setdefault((net.version, net.prefixlen), {}) \
+                        .setdefault(int(net.network_address), {})[token] = entry
+        else:
+            others[token] = entry
+
+    def _unindex(self, tables, pname, token, cap):
+        (values, networks, others) = tables
+        constraint = cap.get_parameter_constraint(pname)
+        if isinstance(constraint, mplane.model._SetConstraint) and \
+           not constraint.multival:
+            for val in constraint.vs:
+                _discard(values, val, token)
+        elif isinstance(constraint, mplane.model._NetworkConstraint) and \
+             not constraint.multival:
+            for net in constraint.networks:
+                key = (net.version, net.prefixlen)
+                if key in networks:
+                    _discard(networks[key], int(net.network_address), token)
+                    if not networks[key]:
+                        del networks[key]
+        else:
+            others.pop(token, None)
+
+    def _build(self, pname):
+        tables = ({}, {}, {})
+        for (token, cap) in self.capabilities.items():
+            self._index(tables, pname, token, cap)
+        self._accepting[pname] = tables
+
+    def accepting(self, pname, val):
+        """
+        Returns the capabilities whose constraint on the named
+        parameter is met by the single value val, in the order
+        they were added.
+
+        """
+        if pname not in self._accepting:
+            self._build(pname)
+        (values, networks, others) = self._accepting[pname]
+
+        found = list(values.get(val, {}).values())
+        version = getattr(val, "version", None)
+        if version is not None:
+            x = int(val)
+            for ((netversion, prefixlen), nets) in networks.items():
+                if netversion == version:
+                    shift = val.max_prefixlen - prefixlen
+                    found.extend(nets.get(x >> shift << shift, {}).values())
+        found.extend((seq, cap) for (seq, cap) in others.values()
+                     if cap.get_parameter_constraint(pname).met_by(val))
+
+        return [cap for (seq, cap) in sorted(dict(found).items())]
+
+def _discard(table, key, token):
+    # removes token from the entries of table under key, and the key
+    # once no entries are left
+    entries = table.get(key)
+    if entries is not None:
+        entries.pop(token, None)
+        if not entries:
+            del table[key]
+
 class BaseClient(object):
     """
     Core implementation of a generic programmatic client.
@@ -66,6 +174,8 @@ class BaseClient(object):
         self._tls_state = tls_state
         self._capabilities = {}
         self._capability_labels = {}
+        # capabilities by schema hash, then by token
+        self._capability_schemas = {}
         self._capability_identities = {}
         self._receipt_identities = {}
         self._receipts = {}
@@ -88,7 +198,11 @@ class BaseClient(object):
         # FIXME retoken on token collision with another identity
         token = msg.get_token()
 
+        if token in self._capabilities:
+            self._remove_capability(self._capabilities[token])
+
         self._capabilities[token] = msg
+        self._capability_schemas.setdefault(msg._schema_hash(), _SchemaIndex()).add(msg)
 
         if msg.get_label():
             self._capability_labels[msg.get_label()] = msg
@@ -99,11 +213,19 @@ class BaseClient(object):
     def _remove_capability(self, msg):
         token = msg.get_token()
         if token in self._capabilities:
-            label = self._capabilities[token].get_label()
+            cap = self._capabilities[token]
+            label = cap.get_label()
             del self._capabilities[token]
             if label and label in self._capability_labels:
                 del self._capability_labels[label]
 
+            schema = cap._schema_hash()
+            if schema in self._capability_schemas:
+                same_schema = self._capability_schemas[schema]
+                same_schema.remove(token)
+                if not same_schema.capabilities:
+                    del self._capability_schemas[schema]
+
     def _withdraw_capability(self, msg, identity):
         """
         Process a withdrawal. Match the withdrawal to the capability,
@@ -122,7 +244,7 @@ class BaseClient(object):
         else:
             # Search all capabilities by schema
             for cap in self.capabilities_matching_schema(msg):
-                self._remove_capability(cap.get_token())
+                self._remove_capability(cap)
 
     def capability_for(self, token_or_label):
         """
@@ -154,7 +276,7 @@ class BaseClient(object):
             else:
                 raise KeyError("no identity for receipt token " + token_or_label)
 
-    def capabilities_matching_schema(self, schema_capability):
+    def capabilities_matching_schema(self, schema_capability, covering=None):
         """
         Given a capability, return *all* known capabilities matching the
         given schema capability. A capability matches a schema capability
@@ -162,12 +284,43 @@ class BaseClient(object):
         constraints in the capability are contained by all constraints
         in the schema capability.
 
+        If covering is given, it maps parameter names to values; only
+        capabilities whose constraints accept all these values match.
+
         Used to programmatically select capabilities matching an
         aggregation or other collection operation (e.g. at a supervisor).
+        Only capabilities with the same schema are examined, and of
+        those, only the ones accepting the first single value covered
+        if there is one.
 
         """
-        # FIXME write this, maybe refactor part back into model.
-        pass
+        same_schema = self._capability_schemas.get(schema_capability._schema_hash())
+        if not same_schema:
+            return []
+
+        candidates = same_schema.capabilities.values()
+        for (pname, val) in (covering or {}).items():
+            if not schema_capability.has_parameter(pname):
+                return []
+            if isinstance(val, str):
+                val = mplane.model.element(pname).parse(val)
+            if not isinstance(val, list):
+                candidates = same_schema.accepting(pname, val)
+                break
+
+        constraints = [(pname, schema_capability.get_parameter_constraint(pname))
+                       for pname in schema_capability.parameter_names()]
+
+        matching = []
+        for cap in candidates:
+            if all(constraint.contains(cap.get_parameter_constraint(pname))
+                   for (pname, constraint) in constraints) and \
+               (not covering or
+                all(cap.can_set_parameter_value(pname, val)
+                    for (pname, val) in covering.items())):
+                matching.append(cap)
+
+        return matching
 
     def _spec_for(self, cap_tol, when, params, relabel=None):
         """
@@ -251,6 +404,15 @@ class BaseClient(object):
 
         """
         receipt = None
+        stored = self._results.get(msg.get_token())
+        if (isinstance(msg, mplane.model.Envelope) and
+            msg.get_since() is not None and
+            isinstance(stored, mplane.model.Envelope)):
+            # only the results newer than those we hold were sent;
+            # add them to the ones we have
+            stored.merge(msg)
+            msg = stored
+
         try:
             if isinstance(msg, mplane.model.Envelope):
                 # if the result is an envelope containing multijob
@@ -335,6 +497,20 @@ class BaseClient(object):
         else:
             raise ValueError("Internal error: unknown message "+repr(msg))
 
+    def handle_message_stream(self, chunks, identity=None, token=None):
+        """
+        Handle a message arriving as an iterable of chunks of JSON text
+        or bytes. Messages within an Envelope are handled as soon as
+        they have been decoded, unless the Envelope answers a pending
+        receipt, in which case it is stored whole once complete.
+        Returns the decoded top-level message.
+
+        """
+        stream = _MessageStream(self, identity, token)
+        for chunk in chunks:
+            stream.feed(chunk)
+        return stream.close()
+
     def forget(self, token_or_label):
         """
         forget all receipts and results for the given token or label
@@ -397,6 +573,35 @@ class BaseClient(object):
         """
         return tuple(self._capability_labels.keys())
 
+class _MessageStream(object):
+    """
+    Feeds a message arriving in chunks to a client's handle_message().
+
+    """
+    def __init__(self, client, identity=None, token=None):
+        self._client = client
+        self._identity = identity
+        self._token = token
+
+        # An envelope carrying a token we hold a receipt for is a multijob
+        # result, and must be kept whole. Without a token hint we can't
+        # tell until the envelope is complete.
+        self._dispatch = token is not None and token not in client._receipts
+        if self._dispatch:
+            self._parser = mplane.model.JsonStreamParser(
+                                callback=lambda msg: client.handle_message(msg, identity))
+        else:
+            self._parser = mplane.model.JsonStreamParser()
+
+    def feed(self, data):
+        self._parser.feed(data)
+
+    def close(self):
+        msg = self._parser.close()
+        if not (self._dispatch and isinstance(msg, mplane.model.Envelope)):
+            self._client.handle_message(msg, self._identity, self._token)
+        return msg
+
 class CrawlParser(html.parser.HTMLParser):
     """
     HTML parser class to extract all URLS in a href attributes in
@@ -436,6 +641,10 @@ class HttpInitiatorClient(BaseClient):
         # used to create labels programmatically
         self._ssn = 0
 
+        # (scheme, host, port) of components known to speak
+        # the binary encoding
+        self._binary_peers = set()
+
     def set_default_url(self, url):
         if isinstance(url, str):
             self._default_url = urllib3.util.parse_url(url)
@@ -456,7 +665,16 @@ class HttpInitiatorClient(BaseClient):
 
         pool = self._tls_state.pool_for(dst_url.scheme, dst_url.host, dst_url.port)
 
-        headers = {"Content-Type": "application/x-mplane+json"}
+        # send binary to components which have answered in binary before
+        peer = (dst_url.scheme, dst_url.host, dst_url.port)
+        if peer in self._binary_peers:
+            body = mplane.model.unparse_binary(msg)
+            ctype = mplane.model.MIMETYPE_BINARY
+        else:
+            body = mplane.model.unparse_json(msg).encode("utf-8")
+            ctype = mplane.model.MIMETYPE_JSON
+
+        headers = {"Content-Type": ctype, "Accept": mplane.model.MPLANE_ACCEPT}
         if self._tls_state.forged_identity():
             headers[FORGED_DN_HEADER] = self._tls_state.forged_identity()
 
@@ -464,17 +682,27 @@ class HttpInitiatorClient(BaseClient):
             path = dst_url.path
         else:
             path = "/"
-        res = pool.urlopen('POST', path,
-                           body=mplane.model.unparse_json(msg).encode("utf-8"),
-                           headers=headers)
-        if (res.status == 200 and
-            res.getheader("Content-Type") == "application/x-mplane+json"):
-            component_identity = self._tls_state.extract_peer_identity(dst_url)
-            token = res.getheader("mplane-token")
-            self.handle_message(mplane.model.parse_json(res.data.decode("utf-8")), component_identity, token)
-        else:
-            # Didn't get an mPlane reply. What now?
-            pass
+        res = pool.urlopen('POST', path, body=body,
+                           headers=headers, preload_content=False)
+        try:
+            if (res.status == 200 and
+                res.getheader("Content-Type") == mplane.model.MIMETYPE_JSON):
+                component_identity = self._tls_state.extract_peer_identity(dst_url)
+                token = res.getheader("mplane-token")
+                self.handle_message_stream(res.stream(mplane.utils.STREAM_CHUNK_SIZE),
+                                           component_identity, token)
+            elif (res.status == 200 and
+                  res.getheader("Content-Type") == mplane.model.MIMETYPE_BINARY):
+                self._binary_peers.add(peer)
+                component_identity = self._tls_state.extract_peer_identity(dst_url)
+                token = res.getheader("mplane-token")
+                self.handle_message(mplane.model.parse_binary(res.read()),
+                                    component_identity, token)
+            else:
+                # Didn't get an mPlane reply. What now?
+                pass
+        finally:
+            res.release_conn()
 
     def result_for(self, token_or_label):
         """
@@ -501,8 +729,13 @@ class HttpInitiatorClient(BaseClient):
         elif isinstance(rr, mplane.model.Exception):
             return rr
 
-        # if we're here, we have a receipt. try to redeem it.
-        self.send_message(mplane.model.Redemption(receipt=rr))
+        # if we're here, we have a receipt. try to redeem it,
+        # asking only for results newer than those we already hold.
+        cursor = None
+        held = self._results.get(rr.get_token())
+        if isinstance(held, mplane.model.Envelope):
+            cursor = held.get_cursor()
+        self.send_message(mplane.model.Redemption(receipt=rr, cursor=cursor))
 
         # see if we got a result
         if token_or_label in self._result_labels:
@@ -566,14 +799,15 @@ class HttpInitiatorClient(BaseClient):
             path = url.path
         else:
             path = "/"
-        res = pool.request('GET', path)
+        res = pool.request('GET', path,
+                           headers={"Accept": mplane.model.MPLANE_ACCEPT})
 
         if res.status == 200:
             ctype = res.getheader("Content-Type")
-            if ctype == "application/x-mplane+json":
+            if ctype in (mplane.model.MIMETYPE_JSON, mplane.model.MIMETYPE_BINARY):
                 # Probably an envelope. Process the message.
                 self.handle_message(
-                    mplane.model.parse_json(res.data.decode("utf-8")), identity)
+                    mplane.utils.parse_message_body(res.data, ctype), identity)
             elif ctype == "text/html":
                 # Treat as a list of links to capability messages.
                 parser = CrawlParser()
@@ -717,12 +951,18 @@ class MPlaneHandler(tornado.web.RequestHandler):
 
     def _respond_message(self, msg):
         """
-        Returns an HTTP response containing a JSON message
+        Returns an HTTP response containing a message, in the
+        binary encoding if the request accepts it, otherwise JSON
 
         """
         self.set_status(200)
-        self.set_header("Content-Type", "application/x-mplane+json")
-        self.write(mplane.model.unparse_json(msg))
+        if mplane.utils.accepts_mimetype(self.request.headers.get("Accept"),
+                                         mplane.model.MIMETYPE_BINARY):
+            self.set_header("Content-Type", mplane.model.MIMETYPE_BINARY)
+            self.write(mplane.model.unparse_binary(msg))
+        else:
+            self.set_header("Content-Type", mplane.model.MIMETYPE_JSON)
+            self.write(mplane.model.unparse_json(msg))
         self.finish()
 
     def _respond_plain_text(self, code, text = None):
@@ -759,9 +999,10 @@ class RegistrationHandler(MPlaneHandler):
 
 
     def post(self):
-        # unwrap json message from body
-        if (self.request.headers["Content-Type"] == "application/x-mplane+json"):
-            env = mplane.model.parse_json(self.request.body.decode("utf-8"))
+        # unwrap json or binary message from body
+        ctype = self.request.headers.get("Content-Type")
+        if ctype in (mplane.model.MIMETYPE_JSON, mplane.model.MIMETYPE_BINARY):
+            env = mplane.utils.parse_message_body(self.request.body, ctype)
         else:
             self._respond_plain_text(400, "Invalid format")
             return
@@ -800,11 +1041,14 @@ class SpecificationHandler(MPlaneHandler):
                 print("Specification " + spec.get_label() + " successfully pulled by " + identity)
             else:
                 print("Interrupt " + spec.get_token() + " successfully pulled by " + identity)
-        self._respond_json_text(200, mplane.model.unparse_json(env))
+        self._respond_message(env)
 
+@tornado.web.stream_request_body
 class ResultHandler(MPlaneHandler):
     """
-    Receives results of specifications
+    Receives results of specifications. JSON bodies are decoded
+    as they arrive, so large envelopes are never buffered whole;
+    binary bodies are buffered and decoded at once.
 
     """
 
@@ -812,18 +1056,147 @@ class ResultHandler(MPlaneHandler):
         self._listenerclient = listenerclient
         self._tls = tlsState
 
+    def prepare(self):
+        self._stream = None
+        self._binary = None
+        self._token = None
+        if "mplane-token" in self.request.headers:
+            self._token = self.request.headers["mplane-token"]
+        ctype = self.request.headers.get("Content-Type")
+        if ctype == mplane.model.MIMETYPE_JSON:
+            self._stream = _MessageStream(self._listenerclient,
+                            self._tls.extract_peer_identity(self.request),
+                            self._token)
+        elif ctype == mplane.model.MIMETYPE_BINARY:
+            self._binary = bytearray()
+
+    def data_received(self, chunk):
+        if self._stream is not None:
+            self._stream.feed(chunk)
+        elif self._binary is not None:
+            self._binary += chunk
+
     def post(self):
-        # unwrap json message from body
-        if (self.request.headers["Content-Type"] == "application/x-mplane+json"):
-            env = mplane.model.parse_json(self.request.body.decode("utf-8"))
+        # finish unwrapping json or binary message from body
+        if self._stream is not None:
+            self._stream.close()
+        elif self._binary is not None:
+            self._listenerclient.handle_message(
+                            mplane.model.parse_binary(self._binary),
+                            self._tls.extract_peer_identity(self.request),
+                            self._token)
         else:
             self._respond_plain_text(400, "Invalid format")
             return
-        token = None
-        if "mplane-token" in self.request.headers:
-            token = self.request.headers["mplane-token"]
-        self._listenerclient.handle_message(env,
-                            self._tls.extract_peer_identity(self.request),
-                            token)
         self._respond_plain_text(200)
         return
+
+_TEST_CONSTRAINTS = ["10.0.0.1,10.0.0.2", "10.0.0.0/24",
+                     "10.0.1.0/24,192.168.0.0/16", "10.0.0.0 ... 10.0.0.127",
+                     "*", "[10.0.0.1,10.0.0.3]", "192.168.3.4"]
+
+_TEST_ADDRESSES = ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.200",
+                   "10.0.1.5", "192.168.3.4", "8.8.8.8"]
+
+def _test_capability(constraint, label=None):
+    cap = mplane.model.Capability(when="now ... future", label=label)
+    cap.add_parameter("destination.ip4", constraint)
+    cap.add_result_column("delay.twoway.icmp.us")
+    return cap
+
+def _test_client():
+    """Returns a client knowing a capability per test constraint."""
+    mplane.model.initialize_registry()
+    client = BaseClient(None)
+    for (i, constraint) in enumerate(_TEST_CONSTRAINTS):
+        client.handle_message(_test_capability(constraint, "ping-%d" % i))
+    return client
+
+def _test_labels(caps):
+    return [cap.get_label() for cap in caps]
+
+def _test_scan(client, schema_capability, covering):
+    # capabilities_matching_schema() without the indices
+    return [cap for cap in client._capabilities.values()
+            if cap._schema_hash() == schema_capability._schema_hash() and
+               all(schema_capability.get_parameter_constraint(pname).contains(
+                       cap.get_parameter_constraint(pname))
+                   for pname in schema_capability.parameter_names()) and
+               all(cap.can_set_parameter_value(pname, val)
+                   for (pname, val) in covering.items())]
+
+def test_capabilities_matching_schema():
+    client = _test_client()
+    schema = _test_capability("*")
+
+    assert len(client.capabilities_matching_schema(schema)) == \
+           len(_TEST_CONSTRAINTS) - 1
+    assert _test_labels(client.capabilities_matching_schema(
+            schema, {"destination.ip4": "10.0.0.1"})) == \
+           ["ping-0", "ping-1", "ping-3", "ping-4"]
+    assert _test_labels(client.capabilities_matching_schema(
+            schema, {"destination.ip4": "192.168.3.4"})) == \
+           ["ping-2", "ping-4", "ping-6"]
+    assert _test_labels(client.capabilities_matching_schema(
+            _test_capability("10.0.0.0/16"),
+            {"destination.ip4": "10.0.0.1"})) == \
+           ["ping-0", "ping-1", "ping-3"]
+    assert client.capabilities_matching_schema(
+            schema, {"source.ip4": "10.0.0.1"}) == []
+
+    other = mplane.model.Capability(when="now ... future")
+    other.add_parameter("destination.ip4")
+    other.add_result_column("packets.lost")
+    assert client.capabilities_matching_schema(other) == []
+
+def _test_compare_scan(client):
+    for schema_constraint in _TEST_CONSTRAINTS:
+        schema = _test_capability(schema_constraint)
+        for address in [None] + _TEST_ADDRESSES:
+            covering = {}
+            if address is not None:
+                covering["destination.ip4"] = \
+                    mplane.model.element("destination.ip4").parse(address)
+            assert client.capabilities_matching_schema(schema, covering) == \
+                   _test_scan(client, schema, covering)
+
+def test_capabilities_matching_schema_scan():
+    _test_compare_scan(_test_client())
+
+def test_schema_index_updates():
+    client = _test_client()
+    _test_compare_scan(client)
+    (index,) = client._capability_schemas.values()
+    tables = index._accepting["destination.ip4"]
+
+    # the indices are updated, not rebuilt, as capabilities come and go
+    for (i, constraint) in enumerate(["10.0.0.2,10.0.0.3", "10.0.0.0/25",
+                                      "10.0.0.100 ... 10.0.1.100"]):
+        client.handle_message(_test_capability(constraint, "more-%d" % i))
+    for constraint in _TEST_CONSTRAINTS[:3]:
+        client.handle_message(mplane.model.Withdrawal(
+                capability=_test_capability(constraint)))
+    # added again, now after the others
+    client.handle_message(_test_capability(_TEST_CONSTRAINTS[1], "again"))
+    assert index._accepting["destination.ip4"] is tables
+    _test_compare_scan(client)
+
+    for cap in list(client._capabilities.values()):
+        client.handle_message(mplane.model.Withdrawal(capability=cap))
+    assert tables == ({}, {}, {})
+
+def test_withdraw_capability_by_schema():
+    client = _test_client()
+    schema = _test_capability("*")
+    client.capabilities_matching_schema(schema, {"destination.ip4": "10.0.0.1"})
+
+    client.handle_message(mplane.model.Withdrawal(
+            capability=_test_capability("10.0.0.0/23")))
+    assert sorted(_test_labels(client._capabilities.values())) == \
+           ["ping-2", "ping-4", "ping-5", "ping-6"]
+    assert _test_labels(client.capabilities_matching_schema(
+            schema, {"destination.ip4": "10.0.0.1"})) == ["ping-4"]
+
+    for cap in list(client._capabilities.values()):
+        client.handle_message(mplane.model.Withdrawal(capability=cap))
+    assert client._capability_schemas == {}
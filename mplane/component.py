@@ -28,6 +28,7 @@ import mplane.model
 import mplane.azn
 import mplane.tls
 import importlib
+import tornado.gen
 import tornado.web
 import tornado.httpserver
 from datetime import datetime
@@ -72,13 +73,13 @@ class BaseComponent(object):
         self.tls = mplane.tls.TlsState(self.config)
         self.scheduler = mplane.scheduler.Scheduler(config)
 
-        for service in self._services():
+        for (service, options) in self._services():
             if config["component"]["workflow"] == "client-initiated" and \
                       "listen-cap-link" in config["component"]:
                 service.set_capability_link(config["component"]["listen-cap-link"])
             else:
                 service.set_capability_link("")
-            self.scheduler.add_service(service)
+            self.scheduler.add_service(service, **options)
 
     def _services(self):
         services = []
@@ -89,8 +90,21 @@ class BaseComponent(object):
                 for arg in self.config[section]:
                     if not arg.startswith("module"):
                         kwargs[arg] = self.config[section][arg]
-                for service in module.services(**kwargs):
-                    services.append(service)
+                options = {
+                    "retention": mplane.scheduler.retention_limits(
+                                    self.config[section], "module_"),
+                    "concurrency": self.config[section].getint(
+                                    "module_concurrency")}
+                module_services = module.services(**kwargs)
+                processes = self.config[section].getint("module_processes")
+                if processes:
+                    options["pool"] = mplane.scheduler.ProcessPool(
+                        processes, self.config[section]["module"], kwargs,
+                        module_services,
+                        self.config["component"].get("registry_uri"),
+                        self.config["component"].get("registry_preload"))
+                for service in module_services:
+                    services.append((service, options))
         return services
 
 class ListenerHttpComponent(BaseComponent):
@@ -129,11 +143,33 @@ class MPlaneHandler(tornado.web.RequestHandler):
     handler to respond with an mPlane Message.
 
     """
+    @tornado.gen.coroutine
     def _respond_message(self, msg, token = None):
         self.set_status(200)
-        self.set_header("Content-Type", "application/x-mplane+json")
-        self.set_header("mplane-token", token)
-        self.write(mplane.model.unparse_json(msg))
+        if token is not None:
+            self.set_header("mplane-token", token)
+
+        # use the binary encoding if the client asked for it
+        if mplane.utils.accepts_mimetype(self.request.headers.get("Accept"),
+                                         mplane.model.MIMETYPE_BINARY):
+            self.set_header("Content-Type", mplane.model.MIMETYPE_BINARY)
+            self.finish(mplane.model.unparse_binary(msg))
+            return
+
+        self.set_header("Content-Type", mplane.model.MIMETYPE_JSON)
+
+        # write the message out as it is encoded. Flushing before
+        # finishing makes tornado use chunked transfer encoding, so
+        # only do that if there is more than one chunk.
+        pending = None
+        for chunk in mplane.utils.coalesce_chunks(
+                            mplane.model.unparse_json_stream(msg)):
+            if pending is not None:
+                self.write(pending)
+                yield self.flush()
+            pending = chunk
+        if pending is not None:
+            self.write(pending)
         self.finish()
 
 class DiscoveryHandler(MPlaneHandler):
@@ -155,7 +191,7 @@ class DiscoveryHandler(MPlaneHandler):
             if (len(path) == 1 or path[1] is None):
                 self._respond_capability_links()
             else:
-                self._respond_capability(path[1])
+                return self._respond_capability(path[1])
         else:
             # FIXME how do we tell tornado we don't want to handle this?
             raise ValueError("I only know how to handle /"+CAPABILITY_PATH_ELEM+" URLs via HTTP GET")
@@ -171,7 +207,7 @@ class DiscoveryHandler(MPlaneHandler):
         self.finish()
 
     def _respond_capability(self, key):
-        self._respond_message(self.scheduler.capability_for_key(key))
+        return self._respond_message(self.scheduler.capability_for_key(key))
 
 class MessagePostHandler(MPlaneHandler):
     """
@@ -200,13 +236,15 @@ class MessagePostHandler(MPlaneHandler):
         self.write("</body></html>")
         self.finish()
 
+    @tornado.gen.coroutine
     def post(self):
-        # unwrap json message from body
-        if (self.request.headers["Content-Type"] == "application/x-mplane+json"):
-            msg = mplane.model.parse_json(self.request.body.decode("utf-8"))
+        # unwrap json or binary message from body
+        ctype = self.request.headers.get("Content-Type")
+        if ctype in (mplane.model.MIMETYPE_JSON, mplane.model.MIMETYPE_BINARY):
+            msg = mplane.utils.parse_message_body(self.request.body, ctype)
         else:
             # FIXME how do we tell tornado we don't want to handle this?
-            raise ValueError("I only know how to handle mPlane JSON messages via HTTP POST")
+            raise ValueError("I only know how to handle mPlane JSON or binary messages via HTTP POST")
 
         # hand message to scheduler
         reply = self.scheduler.process_message(self.tls.extract_peer_identity(self.request), msg)
@@ -218,13 +256,13 @@ class MessagePostHandler(MPlaneHandler):
             job = self.scheduler.job_for_message(reply)
             wait_start = datetime.utcnow()
             while (datetime.utcnow() - wait_start).total_seconds() * 1000 < self.immediate_ms:
-                time.sleep(SLEEP_QUANTUM)
+                yield tornado.gen.sleep(SLEEP_QUANTUM)
                 if job.failed() or job.finished():
                     reply = job.get_reply()
                     break
 
         # return reply
-        self._respond_message(reply, job.get_token())
+        yield self._respond_message(reply, reply.get_token())
 
 class InitiatorHttpComponent(BaseComponent):
 
@@ -259,6 +297,9 @@ class InitiatorHttpComponent(BaseComponent):
 
         self.pool = self.tls.pool_for(self.url.scheme, self.url.host, self.url.port)
         self._result_url = dict()
+
+        # whether the client has shown it understands the binary encoding
+        self._binary = False
         self.register_to_client()
 
         self._callback_lock = threading.Lock()
@@ -334,11 +375,16 @@ class InitiatorHttpComponent(BaseComponent):
             # FIXME configurable default idle time.
             self.idle_time = 5
             # send a request for specifications
-            res = self.pool.request('GET', self.specification_path)
+            res = self.pool.request('GET', self.specification_path,
+                                    headers={"Accept": mplane.model.MPLANE_ACCEPT})
             if res.status == 200:
 
                 # specs retrieved: split them if there is more than one
-                env = mplane.model.parse_json(res.data.decode("utf-8"))
+                ctype = res.getheader("Content-Type")
+                env = mplane.utils.parse_message_body(res.data, ctype)
+
+                # a client answering in binary will take binary messages too
+                self._binary = (ctype == mplane.model.MIMETYPE_BINARY)
                 for spec in env.messages():
                     # handle callbacks
                     if spec.get_label()  == "callback":
@@ -352,9 +398,10 @@ class InitiatorHttpComponent(BaseComponent):
                             self._result_url[spec.get_token()] = spec.get_link()
 
                         # send receipt to the Client/Supervisor
+                        (body, ctype) = self._message_body(reply)
                         res = self.pool.urlopen('POST', self.result_path,
-                                                body=mplane.model.unparse_json(reply).encode("utf-8"),
-                                                headers={"content-type": "application/x-mplane+json"})
+                                                body=body,
+                                                headers={"content-type": ctype})
 
             # not registered on supervisor, need to re-register
             elif res.status == 428:
@@ -363,6 +410,22 @@ class InitiatorHttpComponent(BaseComponent):
 
             sleep(self.idle_time)
 
+    def _message_body(self, msg, stream=False):
+        """
+        Returns the body and content type in which to send a message to
+        the Client/Supervisor: binary if it understands it, otherwise
+        JSON, encoded in chunks as it is sent if stream is True.
+
+        """
+        if self._binary:
+            return (mplane.model.unparse_binary(msg), mplane.model.MIMETYPE_BINARY)
+        elif stream:
+            return (mplane.utils.coalesce_chunks(mplane.model.unparse_json_stream(msg)),
+                    mplane.model.MIMETYPE_JSON)
+        else:
+            return (mplane.model.unparse_json(msg).encode("utf-8"),
+                    mplane.model.MIMETYPE_JSON)
+
     def return_results(self, receipt):
         """
         Checks if a job is complete, and in case sends it to the Client/Supervisor
@@ -371,7 +434,10 @@ class InitiatorHttpComponent(BaseComponent):
         #wait for scheduling process above
         with self._callback_lock:
             pass
-        job = self.scheduler.job_for_message(receipt)
+        job = self.scheduler._use_job(receipt.get_token())
+        if job is None:
+            # evicted before its results could be returned
+            return
         reply = job.get_reply()
 
         # check if job is completed
@@ -380,16 +446,17 @@ class InitiatorHttpComponent(BaseComponent):
             return
 
         result_url = urllib3.util.parse_url(self._result_url[job.get_token()])
-        # send result to the Client/Supervisor
+        # send result to the Client/Supervisor, encoding it as it is sent
+        (body, ctype) = self._message_body(reply, stream=True)
         if result_url != "" and self.pool.is_same_host(mplane.utils.parse_url(result_url)):
             res = self.pool.urlopen('POST', self.result_path,
-                    body=mplane.model.unparse_json(reply).encode("utf-8"),
-                    headers={"content-type": "application/x-mplane+json", "mplane-token" : job.get_token()})
+                    body=body, chunked=True,
+                    headers={"content-type": ctype, "mplane-token" : job.get_token()})
         else:
             pool = self.tls.pool_for(result_url.scheme, result_url.host, result_url.port)
             res = pool.urlopen('POST', result_url.path,
-                    body=mplane.model.unparse_json(reply).encode("utf-8"),
-                    headers={"content-type": "application/x-mplane+json", "mplane-token" : job.get_token()})
+                    body=body, chunked=True,
+                    headers={"content-type": ctype, "mplane-token" : job.get_token()})
 
         # handle response
         if isinstance(reply, mplane.model.Envelope):
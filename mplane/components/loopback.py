@@ -50,7 +50,7 @@ def loopback_test_capability():
         """
     )
 
-class LoopbackTestService(mplane.scheduler.Service):
+class LoopbackTestService(mplane.scheduler.AsyncService):
     """
     This class handles the capabilities exposed by the component:
     executes them, and fills the results
@@ -60,7 +60,7 @@ class LoopbackTestService(mplane.scheduler.Service):
     def __init__(self, cap):
         super().__init__(cap)
 
-    def run(self, spec, check_interrupt):
+    async def run(self, spec, interrupted):
         """ Run a loopback test: copy the input string to the output """
 
         res = mplane.model.Result(specification=spec)
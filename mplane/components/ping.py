@@ -28,7 +28,7 @@ the mPlane reference implementation.
 """
 
 import re
-import subprocess
+import asyncio
 import collections
 from datetime import datetime
 import mplane.model
@@ -66,7 +66,7 @@ def _parse_ping_line(line):
     mg = m.groups()
     return PingValue(datetime.utcnow(), int(mg[0]), int(mg[1]), int(float(mg[2]) * 1000))
 
-def _ping_process(progname, sipaddr, dipaddr, period=None, count=None):
+async def _ping_process(progname, sipaddr, dipaddr, period=None, count=None):
     ping_argv = [progname]
     if period is not None:
         ping_argv += [_pingopt_period, str(period)]
@@ -77,13 +77,14 @@ def _ping_process(progname, sipaddr, dipaddr, period=None, count=None):
 
     print("running " + " ".join(ping_argv))
 
-    return subprocess.Popen(ping_argv, stdout=subprocess.PIPE)
+    return await asyncio.create_subprocess_exec(*ping_argv,
+                                                stdout=asyncio.subprocess.PIPE)
 
-def _ping4_process(sipaddr, dipaddr, period=None, count=None):
-    return _ping_process(_ping4cmd, sipaddr, dipaddr, period, count)
+async def _ping4_process(sipaddr, dipaddr, period=None, count=None):
+    return await _ping_process(_ping4cmd, sipaddr, dipaddr, period, count)
 
-def _ping6_process(sipaddr, dipaddr, period=None, count=None):
-    return _ping_process(_ping6cmd, sipaddr, dipaddr, period, count)
+async def _ping6_process(sipaddr, dipaddr, period=None, count=None):
+    return await _ping_process(_ping6cmd, sipaddr, dipaddr, period, count)
 
 def pings_min_delay(pings):
     return min(map(lambda x: x.usec, pings))
@@ -139,7 +140,7 @@ def ping6_singleton_capability(ipaddr):
     cap.add_result_column("delay.twoway.icmp.us")
     return cap
 
-class PingService(mplane.scheduler.Service):
+class PingService(mplane.scheduler.AsyncService):
     def __init__(self, cap):
         # verify the capability is acceptable
         if not ((cap.has_parameter("source.ip4") or 
@@ -154,7 +155,7 @@ class PingService(mplane.scheduler.Service):
             raise ValueError("capability not acceptable")
         super(PingService, self).__init__(cap)
 
-    def run(self, spec, check_interrupt):
+    async def run(self, spec, interrupted):
          # unpack parameters
         period = int(spec.when().period().total_seconds())
         duration = spec.when().duration().total_seconds()
@@ -166,30 +167,31 @@ class PingService(mplane.scheduler.Service):
         if spec.has_parameter("destination.ip4"):
             sipaddr = spec.get_parameter_value("source.ip4")
             dipaddr = spec.get_parameter_value("destination.ip4")
-            ping_process = _ping4_process(sipaddr, dipaddr, period, count)
+            ping_process = await _ping4_process(sipaddr, dipaddr, period, count)
         elif spec.has_parameter("destination.ip6"):
             sipaddr = spec.get_parameter_value("source.ip6")
             dipaddr = spec.get_parameter_value("destination.ip6")
-            ping_process = _ping6_process(sipaddr, dipaddr, period, count)
+            ping_process = await _ping6_process(sipaddr, dipaddr, period, count)
         else:
             raise ValueError("Missing destination")
 
-        # read output from ping
+        # read output from ping until it ends or we are interrupted
         pings = []
-        for line in ping_process.stdout:
-            if check_interrupt():
-                break
-            oneping = _parse_ping_line(line.decode("utf-8"))
-            if oneping is not None:
-                print("ping "+repr(oneping))
-                pings.append(oneping)
- 
+        try:
+            async for line in ping_process.stdout:
+                oneping = _parse_ping_line(line.decode("utf-8"))
+                if oneping is not None:
+                    print("ping "+repr(oneping))
+                    pings.append(oneping)
+        except asyncio.CancelledError:
+            pass
+
         # shut down and reap
         try:
             ping_process.kill()
         except OSError:
             pass
-        ping_process.wait()
+        await ping_process.wait()
 
         # derive a result from the specification
         res = mplane.model.Result(specification=spec)
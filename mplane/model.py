@@ -309,18 +309,33 @@ The client receives the Envelope and decomposes the encapsulated messages:
 """
 
 try:
-    from ipaddress import ip_address
+    from ipaddress import ip_address, ip_network, collapse_addresses
 except ImportError:
     from ipaddr import IPAddress as ip_address
+    from ipaddr import IPNetwork as ip_network
+    from ipaddr import collapse_address_list as collapse_addresses
 
 from datetime import datetime, timedelta, timezone
 from copy import copy, deepcopy
+from array import array
 import urllib.request
 import urllib.parse
+import urllib.error
+import http.server
 import collections
 import functools
+import itertools
+import codecs
+import io
+import calendar
+import bisect
 import operator
+import struct
+import sys
 import hashlib
+import marshal
+import tempfile
+import threading
 import json
 import yaml
 import re
@@ -338,6 +353,7 @@ RANGE_SEP = " ... "
 DURATION_SEP = " + "
 PERIOD_SEP = " / "
 SET_SEP = ","
+NETWORK_SEP = "/"
 MV_BEGIN = "["
 MV_END = "]"
 ANCHOR_SEP = "#"
@@ -375,6 +391,9 @@ KEY_WHEN = "when"
 KEY_REGISTRY = "registry"
 KEY_LABEL = "label"
 KEY_CONTENTS = "contents"
+KEY_CURSOR = "cursor"
+KEY_SINCE = "since"
+KEY_EVICTED = "evicted"
 
 KEY_MONTHS = "months"
 KEY_DAYS = "days"
@@ -444,7 +463,83 @@ _innerwhen_pat = '\{ (.*?) \}'
 _innerwhen_re = re.compile(_innerwhen_pat)
 
 
+# Fixed layouts of the timestamps we generate are parsed and formatted
+# without strptime/strftime. The datetime (when parsing) or string (when
+# formatting) of the last whole second seen is cached, since consecutive
+# timestamps in a result column generally share it.
+_ascii_digits = "0123456789"
+_time_frac_scale = (None, 100000, 10000, 1000, 100, 10, 1)
+_time_parse_cache = (None, None)
+_time_unparse_cache = (None, None)
+
+def _parse_time_prefix(prefix):
+    # parse YYYY-MM-DD HH:MM:SS, or return None if not in that layout
+    if prefix[4] != "-" or prefix[7] != "-" or prefix[10] != " " or \
+       prefix[13] != ":" or prefix[16] != ":":
+        return None
+    fields = (prefix[0:4], prefix[5:7], prefix[8:10],
+              prefix[11:13], prefix[14:16], prefix[17:19])
+    if "".join(fields).strip(_ascii_digits):
+        return None
+    return datetime(*[int(f) for f in fields])
+
+def _parse_time_fast(valstr, cache):
+    """
+    Parses timestamps in the layout YYYY-MM-DD HH:MM:SS, with optional
+    fractional seconds of up to six digits. Returns a tuple of the
+    datetime and the updated (prefix, datetime) cache, or None for the
+    datetime if valstr is not in this layout.
+
+    """
+    n = len(valstr)
+    if n != 19 and (n < 21 or n > 26 or valstr[19] != "."):
+        return (None, cache)
+
+    prefix = valstr[:19]
+    if prefix == cache[0]:
+        base = cache[1]
+    else:
+        base = _parse_time_prefix(prefix)
+        if base is None:
+            return (None, cache)
+        cache = (prefix, base)
+
+    if n == 19:
+        return (base, cache)
+    frac = valstr[20:]
+    if frac.strip(_ascii_digits):
+        return (None, cache)
+    return (base.replace(microsecond=int(frac) * _time_frac_scale[len(frac)]), cache)
+
+def _unparse_time_fast(valts, precision, cache):
+    """
+    Formats a datetime with a four-digit year at the given precision.
+    Returns a tuple of the string and the updated (fields, prefix)
+    cache; the string is None if the datetime cannot be formatted here.
+
+    """
+    if type(valts) is not datetime or valts.year < 1000:
+        return (None, cache)
+
+    fields = (valts.year, valts.month, valts.day,
+              valts.hour, valts.minute, valts.second)
+    if fields == cache[0]:
+        prefix = cache[1]
+    else:
+        prefix = "%04d-%02d-%02d %02d:%02d:%02d" % fields
+        cache = (fields, prefix)
+
+    if precision == "us":
+        return ("%s.%06d" % (prefix, valts.microsecond), cache)
+    elif precision == "s":
+        return (prefix, cache)
+    elif precision == "m":
+        return (prefix[:16], cache)
+    else:
+        return (prefix[:10], cache)
+
 def parse_time(valstr):
+    global _time_parse_cache
     if valstr is None:
         return None
     elif valstr == TIME_PAST:
@@ -454,6 +549,10 @@ def parse_time(valstr):
     elif valstr == TIME_NOW:
         return time_now
     else:
+        (dt, _time_parse_cache) = _parse_time_fast(valstr, _time_parse_cache)
+        if dt is not None:
+            return dt
+
         m = _iso8601_re.match(valstr)
         if m:
             mstr = m.group(0)
@@ -473,7 +572,11 @@ def parse_time(valstr):
             raise ValueError(repr(valstr)+" does not appear to be an mPlane timestamp")
 
 def unparse_time(valts, precision="us"):
-    if isinstance(valts, datetime):
+    global _time_unparse_cache
+    (valstr, _time_unparse_cache) = _unparse_time_fast(valts, precision, _time_unparse_cache)
+    if valstr is not None:
+        return valstr
+    elif isinstance(valts, datetime):
         return valts.strftime(_iso8601_fmt[precision])
     else:
         return str(valts)
@@ -578,7 +681,19 @@ def _unparse_wdayset(valset):
     return SET_SEP.join(map(lambda x: _dow_label[x], sorted(list(valset))))
 
 
+# How far ahead to look for a time matching a crontab before giving up;
+# the calendar repeats itself every 400 years.
+_CRON_SEARCH_YEARS = 400
+
+def _next_in(values, x):
+    # smallest of the sorted values at or above x, or None
+    i = bisect.bisect_left(values, x)
+    return values[i] if i < len(values) else None
+
 class _Crontab(object):
+    __slots__ = ("_months", "_days", "_weekdays", "_hours", "_minutes",
+                 "_seconds", "_fields")
+
     def __init__(self):
         super().__init__()
         self._months = set()
@@ -587,6 +702,7 @@ class _Crontab(object):
         self._hours = set()
         self._minutes = set()
         self._seconds = set()
+        self._fields = None
 
     def _parse_value(self, val):
         # Check if this is a range
@@ -609,6 +725,119 @@ class _Crontab(object):
         self._days = set(range(1,32)) if (valsplit[3] == '*') else self._parse_value(valsplit[3])
         self._weekdays = set(range(0,7)) if (valsplit[4] == '*') else self._parse_value(valsplit[4])
         self._months = set(range(1,13)) if (valsplit[5] == '*') else self._parse_value(valsplit[5])
+        self._fields = None
+
+    def _sorted_fields(self):
+        """
+        Returns the sets of this crontab as sorted lists of valid values,
+        in the order months, days, weekdays, hours, minutes, seconds.
+        An empty set matches any value.
+
+        """
+        if self._fields is None:
+            def field(vals, lo, hi):
+                if not len(vals):
+                    vals = range(lo, hi + 1)
+                return [v for v in sorted(vals) if lo <= v <= hi]
+            self._fields = (field(self._months, 1, 12),
+                            field(self._days, 1, 31),
+                            set(field(self._weekdays, 0, 6)),
+                            field(self._hours, 0, 23),
+                            field(self._minutes, 0, 59),
+                            field(self._seconds, 0, 59))
+        return self._fields
+
+    def matches(self, t):
+        """
+        Returns True if the second containing the datetime t matches
+        this crontab. Weekdays count from 0 for Sunday.
+
+        """
+        (months, days, weekdays, hours, minutes, seconds) = self._sorted_fields()
+        return t.month in months and t.day in days and \
+               (t.weekday() + 1) % 7 in weekdays and t.hour in hours and \
+               t.minute in minutes and t.second in seconds
+
+    def _first_match(self, t):
+        """
+        Returns the earliest whole second at or after the whole
+        second t matching this crontab, or None if there is none.
+        Skips whole months, days, hours, and minutes that cannot
+        match instead of stepping through them.
+
+        """
+        (months, days, weekdays, hours, minutes, seconds) = self._sorted_fields()
+        (y, mo, d, h, mi, s) = (t.year, t.month, t.day, t.hour, t.minute, t.second)
+        ylimit = y + _CRON_SEARCH_YEARS
+
+        # Each step either settles a field, or carries into the next
+        # larger one and resets the smaller ones. Out-of-range values
+        # never match, so carries propagate on the next pass.
+        while y < ylimit:
+            nmo = _next_in(months, mo)
+            if nmo is None:
+                (y, mo, d, h, mi, s) = (y + 1, 1, 1, 0, 0, 0)
+                continue
+            if nmo != mo:
+                (mo, d, h, mi, s) = (nmo, 1, 0, 0, 0)
+
+            mdays = calendar.monthrange(y, mo)[1]
+            nd = _next_in(days, d)
+            while nd is not None and nd <= mdays and \
+                  (calendar.weekday(y, mo, nd) + 1) % 7 not in weekdays:
+                nd = _next_in(days, nd + 1)
+            if nd is None or nd > mdays:
+                (mo, d, h, mi, s) = (mo + 1, 1, 0, 0, 0)
+                if mo > 12:
+                    (y, mo) = (y + 1, 1)
+                continue
+            if nd != d:
+                (d, h, mi, s) = (nd, 0, 0, 0)
+
+            nh = _next_in(hours, h)
+            if nh is None:
+                (d, h, mi, s) = (d + 1, 0, 0, 0)
+                continue
+            if nh != h:
+                (h, mi, s) = (nh, 0, 0)
+
+            nmi = _next_in(minutes, mi)
+            if nmi is None:
+                (h, mi, s) = (h + 1, 0, 0)
+                continue
+            if nmi != mi:
+                (mi, s) = (nmi, 0)
+
+            ns = _next_in(seconds, s)
+            if ns is None:
+                (mi, s) = (mi + 1, 0)
+                continue
+
+            return datetime(y, mo, d, h, mi, ns, tzinfo=t.tzinfo)
+
+        return None
+
+    def next_after(self, t):
+        """
+        Returns the earliest whole second after the datetime t
+        matching this crontab, or None if there is none.
+
+        """
+        return self._first_match(t.replace(microsecond=0) + timedelta(seconds=1))
+
+    def fire_times(self, a, b):
+        """
+        Iterates over the whole seconds matching this crontab from
+        the datetime a (inclusive) to the datetime b (exclusive).
+
+        """
+        t = a.replace(microsecond=0)
+        if t < a:
+            t += timedelta(seconds=1)
+        t = self._first_match(t)
+        while t is not None and t < b:
+            yield t
+            t = self._first_match(t + timedelta(seconds=1))
 
     def __str__(self):
         return" ".join([_unparse_numset(self._seconds),
@@ -626,7 +855,15 @@ class When(object):
     Defines the temporal scopes for capabilities, results, or
     single measurement specifications.
 
+    Whens are immutable once constructed, and compare and hash
+    by their string representation; see parse_when() for a way
+    to share parsed instances.
+
     """
+    __slots__ = ("_a", "_b", "_duration", "_period", "_repeated",
+                 "_inner_duration", "_inner_period", "_crontab", "_str",
+                 "_frozen")
+
     def __init__(self, valstr=None, a=None, b=None, duration=None, period=None,
                  repeated=False, inner_duration=None, inner_period=None, crontab=None):
         super().__init__()
@@ -638,10 +875,32 @@ class When(object):
         self._inner_duration = inner_duration
         self._inner_period = inner_period
         self._crontab = crontab
+        self._str = None
 
         if valstr is not None:
             self._parse(valstr)
 
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("When is immutable")
+        super().__setattr__(name, value)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, When):
+            return NotImplemented
+        return self is other or str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
     def _parse(self, valstr):
         # First check if this is a repeated measurement
         valsplit = valstr.split(WHEN_REPEAT)
@@ -729,6 +988,11 @@ class When(object):
             self._b = None
 
     def __str__(self):
+        if self._str is None:
+            object.__setattr__(self, "_str", self._unparse())
+        return self._str
+
+    def _unparse(self):
         if self._repeated:
             valstr = "".join((WHEN_REPEAT, unparse_time(self._a)))
         else:
@@ -984,29 +1248,23 @@ class When(object):
 
         tzero = t
 
-        # loop through time by period and check for match
-        t -= period
-        # repeat with cron
+        # repeat with cron: yield the times t + n * period falling within
+        # a second that matches the crontab, jumping straight from each
+        # one to the first such time at or after the next matching second
         if self._crontab:
-            while True:
-                t += period
-                if self.sort_scope(t, tzero) > 0:
+            while self.sort_scope(t, tzero) <= 0:
+                second = t.replace(microsecond=0)
+                match = self._crontab._first_match(second)
+                if match is None:
                     break
-                if len(self._crontab._seconds) and (t.second not in self._crontab._seconds):
-                    continue
-                if len(self._crontab._minutes) and (t.minute not in self._crontab._minutes):
-                    continue
-                if len(self._crontab._hours) and (t.hour not in self._crontab._hours):
-                    continue
-                if len(self._crontab._days) and (t.day not in self._crontab._days):
-                    continue
-                if len(self._crontab._weekdays) and ((t.weekday() + 1) % 7 not in self._crontab._weekdays):
-                    continue
-                if len(self._crontab._months) and (t.month not in self._crontab._months):
-                    continue
-                yield When(a=t, period=self._inner_period, duration=self._inner_duration)
-        # repeat without cron
+                if match == second:
+                    yield When(a=t, period=self._inner_period, duration=self._inner_duration)
+                    t += period
+                else:
+                    t += period * -((t - match) // period)
+        # loop through time by period
         else:
+            t -= period
             while True:
                 t += period
                 if self.sort_scope(t, tzero) > 0:
@@ -1016,6 +1274,19 @@ class When(object):
 
 when_infinite = When(a=time_past, b=time_future)
 
+# Number of distinct scope strings parse_when() keeps parsed Whens for
+WHEN_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=WHEN_CACHE_SIZE)
+def parse_when(valstr):
+    """
+    Returns a When parsed from valstr. Since Whens are immutable,
+    the same instance is returned for recently parsed strings,
+    saving the parse for the handful of scopes most statements use.
+
+    """
+    return When(valstr)
+
 # class Schedule(object):
 #     """
 #     Defines a schedule for repeated operations based on crontab-like
@@ -1245,6 +1516,55 @@ def test_tscope():
     assert wrep_subspec.follows(When("2009-03-02 00:00:00 ... 2009-03-02 15:00:00"), tzero=parse_time("2009-03-02 00:00:03"))
     assert wrep_subspec.timer_delays(tzero=parse_time("2009-03-01 23:00:00")) == (3600, 3605)
 
+def test_crontab_next():
+    def stepped(crontab, t, end):
+        while t < end:
+            if crontab.matches(t):
+                yield t
+            t += timedelta(seconds=1)
+
+    tzero = parse_time("2012-02-27 23:58:30")
+    end = tzero + timedelta(days=2)
+    for spec in ("30 59 23 * * *", "0,15,45 * 0 * * *", "0 0 * 29 * 2",
+                 "10 1 1 1 1,3 *", "0,20,40 58,59 23 * * *"):
+        crontab = _Crontab()
+        crontab._parse(spec)
+        fires = list(crontab.fire_times(tzero, end))
+        assert fires == list(stepped(crontab, tzero, end))
+        for (fire, following) in zip(fires, fires[1:]):
+            assert crontab.next_after(fire) == following
+
+    # February 30th never comes
+    crontab = _Crontab()
+    crontab._parse("0 0 0 30 * 2")
+    assert crontab.next_after(tzero) is None
+
+    # leap day on a Sunday, jumping over years
+    crontab = _Crontab()
+    crontab._parse("0 0 12 29 0 2")
+    assert crontab.next_after(tzero) == parse_time("2032-02-29 12:00:00")
+
+    # iterator agrees with stepping by the period through each second
+    wcron = When("repeat now ... future cron 0,30 0 0 * * * { now + 1s }")
+    iter = wcron.iterator(parse_time("2009-02-20 13:30:00"))
+    assert [next(iter).datetimes()[0] for i in range(3)] == \
+           [parse_time("2009-02-21 00:00:00"), parse_time("2009-02-21 00:00:30"),
+            parse_time("2009-02-22 00:00:00")]
+
+def test_when_interning():
+    w = parse_when("now ... future / 1s")
+    assert parse_when("now ... future / 1s") is w
+    assert w == When("now ... future / 1s")
+    assert hash(w) == hash(When("now ... future / 1s"))
+    assert w != When("now + 30s")
+    assert str(w) == "now ... future / 1s"
+    assert copy(w) is w and deepcopy(w) is w
+    try:
+        w._b = time_now
+        assert False
+    except AttributeError:
+        pass
+
 #######################################################################
 # Primitive Types
 #######################################################################
@@ -1270,6 +1590,13 @@ class _Primitive(object):
     def __repr__(self):
         return "<special mplane primitive "+self.name+">"
 
+    # primitives are stateless singletons; copies share them
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def parse(self, sval):
         """
         Converts a string to a value; default implementation
@@ -1298,6 +1625,35 @@ class _Primitive(object):
             else:
                 return str(val)
 
+    def parse_many(self, svals):
+        """
+        Converts a sequence of strings to a list of values. Subclasses
+        may override this with a faster implementation than calling
+        parse() on each.
+
+        """
+        parse = self.parse
+        return [parse(sval) for sval in svals]
+
+    def unparse_many(self, vals):
+        """
+        Converts a sequence of values to a list of strings. Subclasses
+        may override this with a faster implementation than calling
+        unparse() on each.
+
+        """
+        unparse = self.unparse
+        return [unparse(val) for val in vals]
+
+    def _column_store(self):
+        """
+        Returns a new, empty column store for values of this primitive;
+        used by ResultColumn. The default implementation keeps values
+        as Python objects.
+
+        """
+        return _BoxedColumn()
+
 class _StringPrimitive(_Primitive):
     """
     Represents a string. Uses the default implementation.
@@ -1334,6 +1690,9 @@ class _NaturalPrimitive(_Primitive):
             # also converts values like 100.0 or 10E2
             return int(float(sval))
 
+    def _column_store(self):
+        return _NaturalColumn()
+
 class _RealPrimitive(_Primitive):
     """
     Represents a real number (floating point).
@@ -1356,6 +1715,9 @@ class _RealPrimitive(_Primitive):
         else:
             return float(sval)
 
+    def _column_store(self):
+        return _RealColumn()
+
 class _BooleanPrimitive(_Primitive):
     """
     Represents a real number (floating point).
@@ -1410,6 +1772,9 @@ class _AddressPrimitive(_Primitive):
         else:
             return ip_address(sval)
 
+    def _column_store(self):
+        return _AddressColumn()
+
 class _URLPrimitive(_Primitive):
     """
     Represents a URL. For now, URLs are implemented only as strings,
@@ -1440,6 +1805,32 @@ class _TimePrimitive(_Primitive):
     def unparse(self, val):
         return unparse_time(val)
 
+    def parse_many(self, svals):
+        # keep the prefix cache local to this run of values
+        cache = (None, None)
+        out = []
+        for sval in svals:
+            if sval.__class__ is str:
+                (val, cache) = _parse_time_fast(sval, cache)
+                if val is not None:
+                    out.append(val)
+                    continue
+            out.append(parse_time(sval))
+        return out
+
+    def unparse_many(self, vals):
+        cache = (None, None)
+        out = []
+        for val in vals:
+            (valstr, cache) = _unparse_time_fast(val, "us", cache)
+            if valstr is None:
+                valstr = unparse_time(val)
+            out.append(valstr)
+        return out
+
+    def _column_store(self):
+        return _TimeColumn()
+
 prim_string = _StringPrimitive()
 prim_natural = _NaturalPrimitive()
 prim_real = _RealPrimitive()
@@ -1485,10 +1876,442 @@ def test_primitives():
     assert prim_time.unparse(time_past) == "past"
     assert prim_time.unparse(time_future) == "future"
 
+def test_time_fast_path():
+    def slow_parse(valstr):
+        # the regex and strptime path, bypassing the fixed layouts
+        saved = _parse_time_fast
+        try:
+            globals()["_parse_time_fast"] = lambda v, c: (None, c)
+            return parse_time(valstr)
+        finally:
+            globals()["_parse_time_fast"] = saved
+
+    for valstr in ("2013-07-30 23:19:42", "2013-07-30 23:19:42.5",
+                   "2013-07-30 23:19:42.000123", "2013-07-30 23:19:42.123456",
+                   "2013-07-30 23:19", "2013-07-30", "2013-7-30 23:19:42",
+                   "2013-07-30  23:19:42.1", "0999-07-30 23:19:42",
+                   "2013-07-30 23:19:42.123456 junk", "2013-07-30 23:19:4x"):
+        assert parse_time(valstr) == slow_parse(valstr)
+        assert prim_time.parse_many([valstr, valstr]) == [slow_parse(valstr)] * 2
+    for valstr in ("2013-13-30 23:19:42", "2013-07-30 23:19:42.1234567",
+                   "2013-07-30 23:19:42.\u0663"):
+        for parse in (parse_time, slow_parse):
+            try:
+                parse(valstr)
+                assert False
+            except ValueError:
+                pass
+
+    for dt in (datetime(2013, 7, 30, 23, 19, 42), datetime(2013, 7, 30, 23, 19, 42, 7),
+               datetime(999, 1, 2, 3, 4, 5), datetime(2013, 7, 30, tzinfo=timezone.utc)):
+        for precision in ("us", "s", "m", "d"):
+            assert unparse_time(dt, precision) == \
+                   dt.strftime(_iso8601_fmt[precision])
+        assert prim_time.unparse_many([dt, dt]) == [unparse_time(dt)] * 2
+    assert prim_time.unparse_many([time_now, None]) == ["now", "None"]
+
+#######################################################################
+# Columnar storage for result values
+#######################################################################
+
+class _Bitmap(object):
+    """
+    A growable vector of bits, packed eight to a byte.
+    Used by the typed column stores to mark null cells.
+
+    """
+    __slots__ = ("_bits", "_len")
+
+    def __init__(self):
+        super().__init__()
+        self._bits = bytearray()
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        return (self._bits[i >> 3] >> (i & 7)) & 1 == 1
+
+    def __setitem__(self, i, bit):
+        if bit:
+            self._bits[i >> 3] |= 1 << (i & 7)
+        else:
+            self._bits[i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def append(self, bit):
+        if self._len & 7 == 0:
+            self._bits.append(0)
+        self._len += 1
+        if bit:
+            self[self._len - 1] = True
+
+    def extend(self, n, bit):
+        """Appends n copies of the given bit."""
+        if bit:
+            for i in range(n):
+                self.append(True)
+        else:
+            self._len += n
+            self._bits.extend(bytes((self._len + 7) // 8 - len(self._bits)))
+
+    def __delitem__(self, i):
+        for j in range(i, self._len - 1):
+            self[j] = self[j + 1]
+        self[self._len - 1] = False
+        self._len -= 1
+        del self._bits[(self._len + 7) // 8:]
+
+    def any(self, start=0, stop=None):
+        """
+        Returns True if any bit is set; if start and stop are
+        given, may also return True for bits near that range.
+
+        """
+        if stop is None:
+            return any(self._bits)
+        return any(self._bits[start >> 3:(stop + 7) >> 3])
+
+    def clear(self):
+        self._bits.clear()
+        self._len = 0
+
+class _BoxedColumn(object):
+    """
+    Column store keeping each value as a Python object in a list.
+    Used for primitives without a compact representation, and as a
+    fallback for typed columns given values they cannot represent.
+
+    Column stores are only indexed with non-negative integers within
+    range; index normalization and extension are handled by ResultColumn.
+
+    """
+    __slots__ = ("_vals",)
+
+    def __init__(self, vals=None):
+        super().__init__()
+        if vals is None:
+            self._vals = []
+        else:
+            self._vals = list(vals)
+
+    def __len__(self):
+        return len(self._vals)
+
+    def __getitem__(self, i):
+        return self._vals[i]
+
+    def __setitem__(self, i, val):
+        self._vals[i] = val
+
+    def __delitem__(self, i):
+        del self._vals[i]
+
+    def __iter__(self):
+        return iter(self._vals)
+
+    def values(self, start, stop):
+        """Returns a list of the values from start to stop."""
+        return self._vals[start:stop]
+
+    def append(self, val):
+        self._vals.append(val)
+
+    def extend_nulls(self, n):
+        self._vals.extend([None] * n)
+
+class _TypedColumn(object):
+    """
+    Column store keeping values in their native machine representation
+    in an array, with a bitmap marking null cells. Subclasses define the
+    array typecode and convert values to and from the stored form;
+    conversion raises TypeError or OverflowError for values the store
+    cannot represent.
+
+    """
+    typecode = None
+
+    __slots__ = ("_data", "_nulls")
+
+    def __init__(self):
+        super().__init__()
+        self._data = array(self.typecode)
+        self._nulls = _Bitmap()
+
+    def _pack(self, val):
+        raise NotImplementedError("Cannot instantiate a raw typed column")
+
+    def _unpack(self, raw):
+        raise NotImplementedError("Cannot instantiate a raw typed column")
+
+    def __len__(self):
+        return len(self._nulls)
+
+    def __getitem__(self, i):
+        if self._nulls[i]:
+            return None
+        return self._unpack(self._data[i])
+
+    def __setitem__(self, i, val):
+        if val is None:
+            self._data[i] = 0
+            self._nulls[i] = True
+        else:
+            self._data[i] = self._pack(val)
+            self._nulls[i] = False
+
+    def __delitem__(self, i):
+        del self._data[i]
+        del self._nulls[i]
+
+    def __iter__(self):
+        unpack = self._unpack
+        nulls = self._nulls
+        for i, raw in enumerate(self._data):
+            if nulls[i]:
+                yield None
+            else:
+                yield unpack(raw)
+
+    def values(self, start, stop):
+        """Returns a list of the values from start to stop."""
+        unpack = self._unpack
+        nulls = self._nulls
+        if not nulls.any(start, stop):
+            return [unpack(raw) for raw in self._data[start:stop]]
+        return [None if nulls[i] else unpack(raw)
+                for (i, raw) in enumerate(self._data[start:stop], start)]
+
+    def append(self, val):
+        if val is None:
+            self._data.append(0)
+            self._nulls.append(True)
+        else:
+            self._data.append(self._pack(val))
+            self._nulls.append(False)
+
+    def extend_nulls(self, n):
+        self._data.extend(array(self.typecode, bytes(n * self._data.itemsize)))
+        self._nulls.extend(n, True)
+
+class _NaturalColumn(_TypedColumn):
+    """Stores natural values as signed 64-bit integers."""
+    typecode = 'q'
+
+    __slots__ = ()
+
+    def _pack(self, val):
+        # bool is an int, but must keep its own string representation
+        if type(val) is not int:
+            raise TypeError("not a plain int")
+        return val
+
+    def _unpack(self, raw):
+        return raw
+
+    def values(self, start, stop):
+        if not self._nulls.any(start, stop):
+            return self._data[start:stop].tolist()
+        return super().values(start, stop)
+
+class _RealColumn(_TypedColumn):
+    """Stores real values as doubles."""
+    typecode = 'd'
+
+    __slots__ = ()
+
+    def _pack(self, val):
+        # ints would come back as floats and unparse differently
+        if type(val) is not float:
+            raise TypeError("not a float")
+        return val
+
+    def _unpack(self, raw):
+        return raw
+
+    def values(self, start, stop):
+        if not self._nulls.any(start, stop):
+            return self._data[start:stop].tolist()
+        return super().values(start, stop)
+
+_epoch = datetime(1970, 1, 1)
+_one_us = timedelta(microseconds=1)
+
+class _TimeColumn(_TypedColumn):
+    """
+    Stores naive UTC timestamps as signed 64-bit microseconds since
+    the epoch. The special times past, now, and future are not
+    representable, and cause a fallback to boxed storage.
+
+    """
+    typecode = 'q'
+
+    __slots__ = ()
+
+    def _pack(self, val):
+        if type(val) is not datetime or val.tzinfo is not None:
+            raise TypeError("not a naive datetime")
+        return (val - _epoch) // _one_us
+
+    def _unpack(self, raw):
+        return _epoch + timedelta(microseconds=raw)
+
+_v4_mapped = bytes(10) + b'\xff\xff'
+
+class _AddressColumn(_TypedColumn):
+    """
+    Stores IPv4 and IPv6 addresses as packed 16-byte values, with IPv4
+    addresses in IPv4-mapped form and a second bitmap marking them as
+    IPv4, so that IPv4-mapped IPv6 addresses survive the round trip.
+
+    """
+    __slots__ = ("_v4",)
+
+    def __init__(self):
+        self._data = bytearray()
+        self._nulls = _Bitmap()
+        self._v4 = _Bitmap()
+
+    def _pack(self, val):
+        try:
+            packed = val.packed
+            version = val.version
+        except AttributeError:
+            raise TypeError("not an address")
+        if getattr(val, "scope_id", None) is not None:
+            raise TypeError("scoped addresses are not packable")
+        if version == 4:
+            return (_v4_mapped + packed, True)
+        else:
+            return (packed, False)
+
+    def __getitem__(self, i):
+        if self._nulls[i]:
+            return None
+        packed = bytes(self._data[i * 16:(i + 1) * 16])
+        if self._v4[i]:
+            return ip_address(packed[12:])
+        else:
+            return ip_address(packed)
+
+    def __setitem__(self, i, val):
+        if val is None:
+            (packed, v4) = (bytes(16), False)
+        else:
+            (packed, v4) = self._pack(val)
+        self._data[i * 16:(i + 1) * 16] = packed
+        self._nulls[i] = val is None
+        self._v4[i] = v4
+
+    def __delitem__(self, i):
+        del self._data[i * 16:(i + 1) * 16]
+        del self._nulls[i]
+        del self._v4[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def values(self, start, stop):
+        return [self[i] for i in range(start, min(stop, len(self)))]
+
+    def append(self, val):
+        if val is None:
+            (packed, v4) = (bytes(16), False)
+        else:
+            (packed, v4) = self._pack(val)
+        self._data.extend(packed)
+        self._nulls.append(val is None)
+        self._v4.append(v4)
+
+    def extend_nulls(self, n):
+        self._data.extend(bytes(16 * n))
+        self._nulls.extend(n, True)
+        self._v4.extend(n, False)
+
+def test_column_stores():
+    initialize_registry()
+
+    natcol = ResultColumn(element("packets.lost"))
+    assert isinstance(natcol._vals, _NaturalColumn)
+    natcol[0] = "42"
+    natcol[3] = 7
+    assert len(natcol) == 4
+    assert list(natcol) == [42, None, None, 7]
+    natcol[1] = 2 ** 70
+    assert isinstance(natcol._vals, _BoxedColumn)
+    assert list(natcol) == [42, 2 ** 70, None, 7]
+
+    realcol = ResultColumn(element("cpuload"))
+    realcol[0] = 0.5
+    realcol[1] = "1e3"
+    assert list(realcol) == [0.5, 1000.0]
+    assert isinstance(realcol._vals, _RealColumn)
+    del realcol[0]
+    assert list(realcol) == [1000.0]
+
+    timecol = ResultColumn(element("time"))
+    timecol[0] = "2013-07-30 23:19:42.123456"
+    timecol[2] = datetime(1969, 12, 31, 23, 59, 59)
+    assert timecol[0] == datetime(2013, 7, 30, 23, 19, 42, 123456)
+    assert timecol[1] is None
+    assert timecol[-1] == datetime(1969, 12, 31, 23, 59, 59)
+    assert isinstance(timecol._vals, _TimeColumn)
+
+    addrcol = ResultColumn(element("source.ip6"))
+    addrcol[0] = "10.0.27.2"
+    addrcol[1] = "::ffff:10.0.27.2"
+    addrcol[2] = "2001:db8::1"
+    assert addrcol[0] == ip_address("10.0.27.2")
+    assert addrcol[1] == ip_address("::ffff:10.0.27.2")
+    assert addrcol[2] == ip_address("2001:db8::1")
+    del addrcol[1]
+    assert addrcol[1:] == [ip_address("2001:db8::1")]
+    assert isinstance(addrcol._vals, _AddressColumn)
+    addrcol.clear()
+    assert len(addrcol) == 0
+
+    # typed columns survive a round trip through a Result
+    res = Result(verb="measure", when="2013-07-30 23:19:42 ... 2013-07-30 23:19:43")
+    res.add_result_column("time")
+    res.add_result_column("source.ip4")
+    res.add_result_column("packets.lost")
+    res.add_result_column("cpuload")
+    for i in range(100):
+        res.set_result_value("time", datetime(2013, 7, 30, 23, 19, 42, i), i)
+        res.set_result_value("source.ip4", ip_address(i), i)
+        res.set_result_value("packets.lost", i, i)
+    res.set_result_value("cpuload", 0.25, 50)
+    clires = parse_json(unparse_json(res))
+    assert clires.count_result_rows() == 100
+    assert clires._result_rows() == res._result_rows()
+    assert clires._result_rows()[7] == ["2013-07-30 23:19:42.000007",
+                                        "0.0.0.7", "7", "*"]
+    rows = list(clires.schema_dict_iterator())
+    assert rows[50]["cpuload"] == 0.25
+
+    # row, column, and batch views agree with each other
+    tuples = list(clires.row_tuples())
+    assert len(tuples) == 100
+    assert tuples[7] == (datetime(2013, 7, 30, 23, 19, 42, 7),
+                         ip_address("0.0.0.7"), 7, None)
+    assert tuples[50][3] == 0.25
+    assert list(clires.columns()) == list(clires.result_column_names())
+    assert clires.columns()["packets.lost"][10:13] == [10, 11, 12]
+    batches = list(clires.iter_batches(30))
+    assert [len(batch[0]) for batch in batches] == [30, 30, 30, 10]
+    assert [v for batch in batches for v in batch[3]] == [row[3] for row in tuples]
+    assert rows[7]["source.ip4"] == tuples[7][1]
+
 #######################################################################
 # Elements and registries
 #######################################################################
 
+@functools.lru_cache(maxsize=4096)
+def _qualified_name(namespace, name):
+    # shared between the many Parameters and ResultColumns of an Element
+    return namespace + ANCHOR_SEP + name
+
 class Element(object):
     """
     An Element represents a name for a particular type of data with
@@ -1503,12 +2326,14 @@ class Element(object):
     elements; use initialize_registry() to use these.
 
     """
+    __slots__ = ("_name", "_prim", "_desc", "_qualname")
+
     def __init__(self, name, prim, desc=None, namespace=REGURI_DEFAULT):
         super().__init__()
         self._name = name
         self._prim = prim
         self._desc = desc
-        self._qualname = namespace + ANCHOR_SEP + name
+        self._qualname = _qualified_name(namespace, name)
 
     def __str__(self):
         return self._name
@@ -1577,6 +2402,7 @@ class Registry(object):
         self._revision = None
         self._elements = collections.OrderedDict()
         self._namespaces = set()
+        self._name_table = None
 
         # stash URI and parse the registry
         if uri:
@@ -1597,6 +2423,20 @@ class Registry(object):
 
     def _add_element(self, elem):
         self._elements[elem.name()] = elem
+        self._name_table = None
+        _invalidate_element_index()
+
+    def _element_names(self):
+        """
+        Returns a list of element names in registry order, and a
+        dictionary mapping each name to its index in the list.
+        Used by the binary encoding to refer to elements by index.
+
+        """
+        if self._name_table is None:
+            names = list(self._elements.keys())
+            self._name_table = (names, {n: i for i, n in enumerate(names)})
+        return self._name_table
 
     def _include_registry(self, other_registry):
         for elem in other_registry._elements.values():
@@ -1663,11 +2503,49 @@ class Registry(object):
                     path = "/" + path
                 uri = "file://" + path
 
-            try:
-                with urllib.request.urlopen(uri) as stream:
-                    self._parse_json_bytestream(stream)
-            except:
+                try:
+                    with urllib.request.urlopen(uri) as stream:
+                        self._parse_json_bytestream(stream)
+                except:
+                    raise ValueError("Invalid Registry uri: " + uri)
+            else:
+                self._parse_from_remote(uri)
+
+    def _parse_from_remote(self, uri):
+        """
+        Parses a registry at a remote URI. If the registry cache holds a
+        snapshot of it, the registry is fetched only if it changed since
+        (as told by its ETag or Last-Modified time), otherwise the
+        snapshot is used; a registry fetched is snapshotted.
+
+        """
+        path = _registry_cache_path(uri)
+        snapshot = _load_registry_snapshot(path, uri)
+        request = urllib.request.Request(uri)
+        if snapshot is not None:
+            (etag, modified, body) = snapshot
+            if etag is not None:
+                request.add_header("If-None-Match", etag)
+            if modified is not None:
+                request.add_header("If-Modified-Since", modified)
+
+        try:
+            with urllib.request.urlopen(request) as stream:
+                body = stream.read()
+                etag = stream.headers.get("ETag")
+                modified = stream.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            # not modified since the snapshot was taken
+            if e.code != 304 or snapshot is None:
                 raise ValueError("Invalid Registry uri: " + uri)
+        except:
+            raise ValueError("Invalid Registry uri: " + uri)
+        else:
+            snapshot = None
+
+        self._parse_json_bytestream(io.BytesIO(body))
+        if snapshot is None:
+            _store_registry_snapshot(path, uri, etag, modified, body)
 
     def _dump_json(self):
         d = collections.OrderedDict()
@@ -1693,13 +2571,108 @@ class Registry(object):
          """
         return self._uri
 
+#######################################################################
+# Registry cache
+#
+# Remote registries are snapshotted to disk after they are fetched, with
+# the validators (ETag and Last-Modified time) the server gave for them,
+# so that processes started later only fetch them again if they changed.
+# A snapshot is a marshalled tuple of (format, uri, ETag, Last-Modified
+# time, sha256 of the body, body), and is ignored if any part of it does
+# not check out.
+#######################################################################
+
+_REGISTRY_SNAPSHOT_FORMAT = 2
+
+def _registry_cache_path(uri):
+    """
+    Returns the path of the snapshot for the registry at uri, in the
+    directory named by the MPLANE_REGISTRY_CACHE environment variable,
+    or in mplane/ under the user's cache directory if that is unset.
+    Returns None if MPLANE_REGISTRY_CACHE is set but empty.
+
+    """
+    cachedir = os.environ.get("MPLANE_REGISTRY_CACHE")
+    if cachedir is None:
+        cachedir = os.environ.get("XDG_CACHE_HOME",
+                                  os.path.join(os.path.expanduser("~"), ".cache"))
+        cachedir = os.path.join(cachedir, "mplane")
+    if not cachedir:
+        return None
+    name = hashlib.sha1(uri.encode("utf-8")).hexdigest()
+    return os.path.join(cachedir, "registry-" + name)
+
+def _load_registry_snapshot(path, uri):
+    """
+    Returns the ETag, Last-Modified time and body of the registry
+    snapshotted at path for uri, or None if there is no valid snapshot.
+
+    """
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            (fmt, snapuri, etag, modified, digest, body) = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if fmt != _REGISTRY_SNAPSHOT_FORMAT or snapuri != uri or \
+       hashlib.sha256(body).hexdigest() != digest:
+        return None
+    return (etag, modified, body)
+
+def _store_registry_snapshot(path, uri, etag, modified, body):
+    """
+    Snapshots the registry body fetched from uri to path, with the
+    validators the server gave for it; without any, the snapshot could
+    not be revalidated, so none is taken. The cache is an optimization
+    only, so failure to write it is silently ignored.
+
+    """
+    if path is None or (etag is None and modified is None):
+        return
+    snapshot = (_REGISTRY_SNAPSHOT_FORMAT, uri, etag, modified,
+                hashlib.sha256(body).hexdigest(), body)
+    tmppath = path + "." + str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmppath, "wb") as f:
+            marshal.dump(snapshot, f)
+        os.replace(tmppath, path)
+    except OSError:
+        pass
+
 _base_registry = None
 _registries = collections.OrderedDict()
 
+# Merged name -> Element index over all registries, built on first
+# lookup after the set of registries changes.
+_element_index = None
+
+def _invalidate_element_index():
+    global _element_index
+    _element_index = None
+
+def _build_element_index():
+    """
+    Merges the elements of all known registries into one dictionary.
+    Earlier registries take precedence over later ones, and all of
+    them over the base registry, as a search in that order would.
+
+    """
+    global _element_index
+    index = {}
+    if _base_registry is not None:
+        index.update(_base_registry._elements)
+    for reg in reversed(_registries.values()):
+        index.update(reg._elements)
+    _element_index = index
+    return index
+
 def preload_registry(filename=None):
     global _registries
     preloaded = Registry(filename=filename)
     _registries[preloaded.uri()] = preloaded
+    _invalidate_element_index()
 
 def registry_for_uri(uri):
     """
@@ -1711,6 +2684,7 @@ def registry_for_uri(uri):
 
     if uri not in _registries:
         _registries[uri] = Registry(uri=uri)
+        _invalidate_element_index()
 
     return _registries[uri]
 
@@ -1724,6 +2698,7 @@ def initialize_registry(uri=REGURI_DEFAULT):
     """
     global _base_registry
     _base_registry = registry_for_uri(uri)
+    _invalidate_element_index()
 
 def element(name, reguri=None):
     """
@@ -1731,17 +2706,14 @@ def element(name, reguri=None):
     If reguri is given, searches the speficied Registry,
     otherwise searches the base Registry.
     """
-    global _base_registry
-    global _registries
-
-    for reg in _registries:
-        if _registries[reg][name] != None:
-            return _registries[reg][name]
-    if _base_registry[name] != None:
-        return _base_registry[name]
+    index = _element_index
+    if index is None:
+        index = _build_element_index()
 
-    # fall-through: no results
-    raise KeyError("Key error: " + name + " not present in registries")
+    elem = index.get(name)
+    if elem is None:
+        raise KeyError("Key error: " + name + " not present in registries")
+    return elem
 
 def test_registry():
     # default registry trough the Registry-Object
@@ -1775,6 +2747,92 @@ def test_registry():
     assert element("start").name() == "start"
     assert element("start").primitive_name() == "time"
     assert element("start").desc() == "Start time of an event/flow that may have a non-zero duration"
+    assert element("start") is _base_registry["start"]
+    try:
+        element("no.such.element")
+        assert False
+    except KeyError:
+        pass
+
+def test_registry_cache():
+    served = {"revision": 1, "etag": '"r1"'}
+    requests = []
+
+    class RegistryHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.headers.get("If-None-Match"))
+            if served["etag"] is not None and \
+               self.headers.get("If-None-Match") == served["etag"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = json.dumps({KEY_REGFMT: REGFMT_FLAT,
+                               KEY_REGREV: served["revision"],
+                               KEY_REGURI: "http://example.com/test-registry",
+                               KEY_ELEMENTS: [{KEY_ELEMNAME: "test.element",
+                                               KEY_ELEMPRIM: "natural"}]})
+            body = body.encode("utf-8")
+            self.send_response(200)
+            if served["etag"] is not None:
+                self.send_header("ETag", served["etag"])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), RegistryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    uri = "http://127.0.0.1:%d/registry.json" % server.server_port
+    cachedir = os.environ.get("MPLANE_REGISTRY_CACHE")
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.environ["MPLANE_REGISTRY_CACHE"] = tmpdir
+            path = _registry_cache_path(uri)
+
+            # fetched and snapshotted, then revalidated
+            assert Registry(uri)._revision == 1
+            assert _load_registry_snapshot(path, uri)[0] == '"r1"'
+            assert Registry(uri)._revision == 1
+            assert requests == [None, '"r1"']
+
+            # a changed registry is fetched again
+            served.update(revision=2, etag='"r2"')
+            assert Registry(uri)._revision == 2
+            assert Registry(uri)._revision == 2
+            assert requests[2:] == ['"r1"', '"r2"']
+
+            # corrupt snapshots are ignored
+            with open(path, "wb") as f:
+                f.write(b"garbage")
+            assert _load_registry_snapshot(path, uri) is None
+            assert _load_registry_snapshot(path + "-missing", uri) is None
+            assert Registry(uri)._revision == 2
+            assert requests[-1] is None
+            assert _load_registry_snapshot(path, uri + "-other") is None
+
+            # registries which cannot be revalidated are not snapshotted
+            os.remove(path)
+            served["etag"] = None
+            assert Registry(uri)._revision == 2
+            assert not os.path.exists(path)
+
+            # nor are any if the cache is disabled
+            served["etag"] = '"r2"'
+            os.environ["MPLANE_REGISTRY_CACHE"] = ""
+            assert _registry_cache_path(uri) is None
+            Registry(uri)
+            Registry(uri)
+            assert requests[-2:] == [None, None]
+            assert os.listdir(tmpdir) == []
+    finally:
+        if cachedir is None:
+            del os.environ["MPLANE_REGISTRY_CACHE"]
+        else:
+            os.environ["MPLANE_REGISTRY_CACHE"] = cachedir
+        server.shutdown()
+        server.server_close()
 
 #######################################################################
 # Constraints
@@ -1793,6 +2851,8 @@ class _Constraint(object):
     Constraint classes through Parameters.
 
     """
+    __slots__ = ("_prim", "multival")
+
     def __init__(self, prim, multival=False):
         super().__init__()
         self._prim = prim
@@ -1811,6 +2871,14 @@ class _Constraint(object):
         else:
             return "mplane.model.constraint_all"
 
+    # constraints are never changed once built, so parameters
+    # derived from one another share them instead of copying
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def met_by(self, val):
         """Determines if this constraint is met by a given value."""
         if self.multival:
@@ -1827,12 +2895,37 @@ class _Constraint(object):
         """
         return None
 
-constraint_all = _Constraint(None)
-constraint_all_multiple = _Constraint(None, True)
+    def contains(self, other):
+        """
+        Determines if every value meeting the other constraint
+        also meets this one. The default constraint contains
+        every other constraint allowing no more values per
+        parameter than it does.
+
+        """
+        return self.multival or not other.multival
+
+    def _contains_values(self, other):
+        # containment for the subclasses, which all contain a set of
+        # values if they are met by each of them; other kinds of
+        # constraint are handled by the subclasses themselves
+        if not (self.multival or not other.multival):
+            return False
+        if isinstance(other, _SetConstraint):
+            return all(self._met_by_single(v) for v in other.vs)
+        return None
+
+    def _met_by_single(self, val):
+        return not _val_is_multiple(val)
+
+constraint_all = _Constraint(None)
+constraint_all_multiple = _Constraint(None, True)
 
 class _RangeConstraint(_Constraint):
     """Represents acceptable values for an element as an inclusive range"""
 
+    __slots__ = ("a", "b")
+
     def __init__(self, prim, sval=None, a=None, b=None, multival=False):
         super().__init__(prim, multival)
         if sval is not None:
@@ -1881,8 +2974,30 @@ class _RangeConstraint(_Constraint):
         else:
             return None
 
+    def _met_by_single(self, val):
+        try:
+            return (val >= self.a) and (val <= self.b)
+        except TypeError:
+            # e.g. IPv4 against IPv6 addresses
+            return False
+
+    def contains(self, other):
+        """Determines if every value meeting the other constraint is within the range"""
+        contained = self._contains_values(other)
+        if contained is not None:
+            return contained
+        if isinstance(other, _RangeConstraint):
+            return self.a <= other.a and other.b <= self.b
+        if isinstance(other, _NetworkConstraint):
+            return all(self._met_by_single(n.network_address) and
+                       self._met_by_single(n.broadcast_address)
+                       for n in other.networks)
+        return False
+
 class _SetConstraint(_Constraint):
     """Represents acceptable values as a discrete set."""
+    __slots__ = ("vs",)
+
     def __init__(self, prim, sval=None, vs=None, multival=False):
         super().__init__(prim, multival)
         if sval is not None:
@@ -1922,19 +3037,138 @@ class _SetConstraint(_Constraint):
         else:
             return None
 
+    def _met_by_single(self, val):
+        return val in self.vs
+
+    def contains(self, other):
+        """Determines if every value meeting the other constraint is a member of the set"""
+        contained = self._contains_values(other)
+        if contained is not None:
+            return contained
+        # ranges and networks only fit in a set if they are a single value
+        single = other.single_value()
+        return single is not None and single in self.vs
+
 class _NetworkConstraint(_Constraint):
-  """
-  Represents acceptable values as a network address with a prefix length.
-  Not yet implemented.
+    """
+    Represents acceptable address values as a set of networks,
+    each given as an address with a prefix length. IPv4 and IPv6
+    networks may be mixed.
+
+    """
+    __slots__ = ("networks", "_tables")
+
+    def __init__(self, prim, sval=None, networks=None, multival=False):
+        super().__init__(prim, multival)
+        if sval is not None:
+            self.networks = [ip_network(n.strip(), strict=False)
+                             for n in sval.split(SET_SEP)]
+        elif networks is not None:
+            self.networks = list(networks)
+        else:
+            self.networks = []
+
+        # compile to sorted, disjoint (start, end) address intervals
+        # per IP version, for lookup by bisection
+        self._tables = {}
+        for version in (4, 6):
+            nets = collapse_addresses([n for n in self.networks
+                                       if n.version == version])
+            bounds = [(int(n.network_address), int(n.broadcast_address))
+                      for n in nets]
+            self._tables[version] = ([a for (a, b) in bounds],
+                                     [b for (a, b) in bounds])
+
+    def __str__(self):
+        out = SET_SEP.join(map(str, self.networks))
+        if self.multival:
+            out = MV_BEGIN + out + MV_END
+        return out
+
+    def __repr__(self):
+        return "mplane.model.NetworkConstraint("+repr(self._prim)+\
+                                               ", "+repr(str(self))+")"
+
+    def _interval(self, val):
+        # index of the interval containing the address val, or None
+        try:
+            (starts, ends) = self._tables[val.version]
+        except (AttributeError, KeyError):
+            return None
+        x = int(val)
+        i = bisect.bisect_right(starts, x) - 1
+        if i >= 0 and x <= ends[i]:
+            return i
+        return None
+
+    def _contains(self, val):
+        return self._interval(val) is not None
+
+    def _contains_span(self, a, b):
+        # an address span is contained if both ends are in one interval
+        i = self._interval(a)
+        return i is not None and i == self._interval(b) and \
+               a.version == b.version
+
+    def _contains_all(self, vals):
+        # check all values in one sweep over the sorted values
+        # and intervals, rather than one bisection per value
+        by_version = {4: [], 6: []}
+        for val in vals:
+            try:
+                by_version[val.version].append(int(val))
+            except (AttributeError, KeyError):
+                return False
+        for (version, xs) in by_version.items():
+            (starts, ends) = self._tables[version]
+            i = 0
+            for x in sorted(xs):
+                while i < len(ends) and ends[i] < x:
+                    i += 1
+                if i == len(ends) or x < starts[i]:
+                    return False
+        return True
 
-  """
-  pass
+    def met_by(self, val):
+        """Determines if the value is an address within one of the networks"""
+        if _val_is_multiple(val):
+            if not self.multival:
+                return False
+            else:
+                return self._contains_all(val)
+        else:
+            return self._contains(val)
 
+    def single_value(self):
+        """If this constraint only allows a single value, return it. Otherwise, return None."""
+        if len(self.networks) == 1 and \
+           self.networks[0].num_addresses == 1:
+            return self.networks[0].network_address
+        else:
+            return None
+
+    def _met_by_single(self, val):
+        return self._contains(val)
+
+    def contains(self, other):
+        """Determines if every value meeting the other constraint is within the networks"""
+        contained = self._contains_values(other)
+        if contained is not None:
+            return contained
+        if isinstance(other, _NetworkConstraint):
+            return all(self._contains_span(n.network_address, n.broadcast_address)
+                       for n in other.networks)
+        if isinstance(other, _RangeConstraint):
+            return self._contains_span(other.a, other.b)
+        return False
+
+@functools.lru_cache(maxsize=1024)
 def parse_constraint(prim, sval):
     """
     Given a primitive and a string value, parses a constraint
     string (returned via str(constraint)) into an instance of an
-    appropriate constraint class.
+    appropriate constraint class. Constraints parsed from the same
+    string are shared.
 
     """
     if sval[0] == MV_BEGIN and sval[-1] == MV_END:
@@ -1950,6 +3184,8 @@ def parse_constraint(prim, sval):
             return constraint_all
     elif sval.find(RANGE_SEP) > 0:
         return _RangeConstraint(prim=prim, sval=sval, multival=multival)
+    elif isinstance(prim, _AddressPrimitive) and sval.find(NETWORK_SEP) > 0:
+        return _NetworkConstraint(prim=prim, sval=sval, multival=multival)
     else:
         return _SetConstraint(prim=prim, sval=sval, multival=multival)
 
@@ -1976,6 +3212,40 @@ def test_constraints():
     assert sc.met_by(ip_address('10.0.28.103'))
     assert not sc.met_by(ip_address('10.0.27.103'))
 
+    nc = parse_constraint(prim_address,"10.0.0.0/8,192.168.0.0/16,2001:db8::/32")
+    assert isinstance(nc, _NetworkConstraint)
+    assert nc.met_by(ip_address('10.1.2.3'))
+    assert nc.met_by(ip_address('192.168.255.255'))
+    assert nc.met_by(ip_address('2001:db8::1'))
+    assert not nc.met_by(ip_address('192.169.0.0'))
+    assert not nc.met_by(ip_address('11.0.0.0'))
+    assert not nc.met_by(ip_address('2001:db9::1'))
+    assert not nc.met_by(ip_address('::ffff:10.0.0.1'))
+    assert str(nc) == "10.0.0.0/8,192.168.0.0/16,2001:db8::/32"
+    assert nc.single_value() is None
+    assert parse_constraint(prim_address,"10.0.27.1/32").single_value() == ip_address('10.0.27.1')
+
+    mnc = parse_constraint(prim_address,"[10.0.0.0/8,2001:db8::/32]")
+    assert mnc.met_by([ip_address('10.0.0.1'), ip_address('2001:db8::1'), ip_address('10.255.0.1')])
+    assert not mnc.met_by([ip_address('10.0.0.1'), ip_address('9.255.255.255')])
+    assert not nc.met_by([ip_address('10.0.0.1')])
+
+    # containment between constraints
+    assert constraint_all.contains(rc)
+    assert not constraint_all.contains(mrc)
+    assert constraint_all_multiple.contains(mrc)
+    assert rc.contains(parse_constraint(prim_natural,"10 ... 20"))
+    assert not rc.contains(parse_constraint(prim_natural,"10 ... 200"))
+    assert rc.contains(parse_constraint(prim_natural,"0,42,99"))
+    assert not rc.contains(constraint_all)
+    assert sc.contains(parse_constraint(prim_address,"10.0.27.100"))
+    assert sc.contains(parse_constraint(prim_address,"10.0.27.100/32"))
+    assert not sc.contains(parse_constraint(prim_address,"10.0.27.0/24"))
+    assert nc.contains(parse_constraint(prim_address,"10.1.0.0/16,192.168.3.4"))
+    assert nc.contains(parse_constraint(prim_address,"10.0.0.1 ... 10.0.0.9"))
+    assert not nc.contains(parse_constraint(prim_address,"10.0.0.1 ... 11.0.0.9"))
+    assert not nc.contains(parse_constraint(prim_address,"0.0.0.0/0"))
+
 
 #######################################################################
 # Statements
@@ -1989,6 +3259,8 @@ class Parameter(Element):
     values.
 
     """
+    __slots__ = ("_constraint", "_val")
+
     def __init__(self, parent_element, constraint=constraint_all, val=None):
         super().__init__(parent_element._name, parent_element._prim)
         self._val = None
@@ -2010,6 +3282,10 @@ class Parameter(Element):
         """Returns True if this component has a value."""
         return self._val is not None
 
+    def get_constraint(self):
+        """Returns the Constraint on values of this Parameter."""
+        return self._constraint
+
     def is_single_value(self):
         """
         Returns True if this parameter's Constraint only allows a single value
@@ -2101,6 +3377,8 @@ class Metavalue(Element):
     Metavalues are used in statement metadata sections.
 
     """
+    __slots__ = ("_val",)
+
     def __init__(self, parent_element, val):
         super().__init__(parent_element._name, parent_element._prim)
         self.set_value(val)
@@ -2125,6 +3403,28 @@ class Metavalue(Element):
     def _as_tuple(self):
         return (self._name, self._prim.unparse(self._val))
 
+# Number of rows of result values converted to strings at once
+_ROW_BATCH = 1024
+
+# When True, Results decoded from dictionaries keep their values as the
+# raw strings received until first accessed. See set_lazy_result_decoding().
+_lazy_results = False
+
+def set_lazy_result_decoding(lazy=True):
+    """
+    Enable or disable lazy decoding of result values. When enabled,
+    Results decoded with parse_json() or message_from_dict() keep the
+    rows of values as received, and parse each column only the first
+    time it is accessed. Results whose values are never looked at
+    are reserialized from the original strings, without parsing.
+
+    Note that in lazy mode, malformed values are not detected until
+    their column is accessed.
+
+    """
+    global _lazy_results
+    _lazy_results = lazy
+
 class ResultColumn(Element):
     """
     A ResultColumn is an element which can take an array of values.
@@ -2133,44 +3433,143 @@ class ResultColumn(Element):
     in the Result have the same number of values.
 
     """
+    __slots__ = ("_vals", "_raw", "_raw_index")
+
     def __init__(self, parent_element):
         super().__init__(parent_element._name, parent_element._prim)
-        self._vals = []
+        self._vals = self._prim._column_store()
+        # raw rows of values not yet decoded, and this column's index therein
+        self._raw = None
+        self._raw_index = None
 
     def __repr__(self):
         return "<ResultColumn "+str(self)+" "+repr(self._prim)+\
                " with "+str(len(self))+" values>"
 
     def __len__(self):
+        if self._raw is not None:
+            return len(self._raw)
         return len(self._vals)
 
+    def _set_raw(self, rows, index):
+        """
+        Defer decoding of this column to first access. rows is a list
+        of lists of value strings, each containing this column's value
+        at the given index.
+
+        """
+        self._vals = self._prim._column_store()
+        self._raw = rows
+        self._raw_index = index
+
+    def _decode(self):
+        rows, j = self._raw, self._raw_index
+        self._raw = None
+        self._raw_index = None
+        vals = [row[j] for row in rows]
+        if all(val.__class__ is str for val in vals):
+            self._extend(self._prim.parse_many(vals))
+        else:
+            for i, val in enumerate(vals):
+                self[i] = val
+
+    def _extend(self, vals):
+        """Appends a list of parsed values to the column."""
+        i = 0
+        try:
+            append = self._vals.append
+            for val in vals:
+                append(val)
+                i += 1
+        except (TypeError, OverflowError):
+            # No compact representation for this value; box the column
+            self._vals = _BoxedColumn(self._vals)
+            self._vals._vals.extend(vals[i:])
+
+    def _unparse(self, key):
+        """Returns the string representation of the value at key."""
+        if self._raw is not None:
+            return self._raw[key][self._raw_index]
+        return self._prim.unparse(self[key])
+
+    def _unparse_range(self, start, stop):
+        """
+        Returns a list of the string representations of the values
+        from start to stop, padded with VALUE_NONE past the end
+        of the column.
+
+        """
+        if self._raw is not None:
+            j = self._raw_index
+            strs = [row[j] for row in self._raw[start:stop]]
+        else:
+            strs = self._prim.unparse_many(self[start:stop])
+        if len(strs) < stop - start:
+            strs.extend([VALUE_NONE] * (stop - start - len(strs)))
+        return strs
+
+    def _index(self, key):
+        n = len(self._vals)
+        if key < 0:
+            key += n
+        if key < 0 or key >= n:
+            raise IndexError("result column index out of range")
+        return key
+
     def __getitem__(self, key):
-        return self._vals[key]
+        if self._raw is not None:
+            self._decode()
+        if isinstance(key, slice):
+            (start, stop, step) = key.indices(len(self._vals))
+            if step == 1:
+                return self._vals.values(start, stop)
+            return [self._vals[i] for i in range(start, stop, step)]
+        return self._vals[self._index(key)]
 
     def __setitem__(self, key, val):
+        if self._raw is not None:
+            self._decode()
+
         # Automatically parse strings
         if isinstance(val, str):
             val = self._prim.parse(val)
 
-        # Automatically extend column to fit
-        while len(self) < key:
-            self._vals.append(None)
-
-        # Append or replace value
-        if len(self) == key:
-            self._vals.append(val)
+        try:
+            self._store(key, val)
+        except (TypeError, OverflowError):
+            # No compact representation for this value; box the column
+            self._vals = _BoxedColumn(self._vals)
+            self._store(key, val)
+
+    def _store(self, key, val):
+        n = len(self._vals)
+        if key < n:
+            self._vals[self._index(key)] = val
         else:
-            self._vals[key] = val
+            # Automatically extend column to fit, then append
+            if key > n:
+                self._vals.extend_nulls(key - n)
+            self._vals.append(val)
 
     def __delitem__(self, key):
-        del(self._vals[key])
+        if self._raw is not None:
+            self._decode()
+        if isinstance(key, slice):
+            for i in sorted(range(*key.indices(len(self._vals))), reverse=True):
+                del self._vals[i]
+        else:
+            del self._vals[self._index(key)]
 
     def __iter__(self):
+        if self._raw is not None:
+            self._decode()
         return iter(self._vals)
 
     def clear(self):
         """ Clears values. """
-        self._vals.clear()
+        self._vals = self._prim._column_store()
+        self._raw = None
+        self._raw_index = None
 
 class Statement(object):
     """
@@ -2183,18 +3582,28 @@ class Statement(object):
 
     """
 
+    __slots__ = ("_version", "_verb", "_label", "_token", "_when", "_reguri",
+                 "_link", "_export", "_params", "_metadata", "_resultcolumns",
+                 "_hashes", "_shared_params", "_shared_columns")
+
     def __init__(self, dictval=None, verb=VERB_MEASURE, label=None, token=None, when=None, reguri=None):
         super().__init__()
         # Make a blank statement
         self._version = MPLANE_VERSION
-        self._params = collections.OrderedDict()
-        self._metadata = collections.OrderedDict()
-        self._resultcolumns = collections.OrderedDict()
+        self._params = {}
+        self._metadata = {}
+        self._resultcolumns = {}
         self._verb = None
         self._label = None
         self._token = None
         self._link = None
         self._export = None
+        # digests of this statement, computed on demand; cleared on change
+        self._hashes = {}
+        # names of parameters and result columns whose objects are shared
+        # with a related statement, and must be copied before changing
+        self._shared_params = frozenset()
+        self._shared_columns = frozenset()
 
         if dictval is not None:
             # Fill in from dictionary
@@ -2207,7 +3616,7 @@ class Statement(object):
             if when is None:
                 when = when_infinite
             elif isinstance(when, str):
-                when = When(when)
+                when = parse_when(when)
             self._when = when
             if reguri is not None:
                 self._reguri = reguri
@@ -2244,6 +3653,9 @@ class Statement(object):
         self._params[elem_name] = Parameter(element(elem_name, reguri=self._reguri),
                                             constraint=constraint,
                                             val = val)
+        if elem_name in self._shared_params:
+            self._shared_params = self._shared_params - {elem_name}
+        self._invalidate_hashes()
 
     def has_parameter(self, elem_name):
         """Returns True if the statement has a parameter with the given name."""
@@ -2277,10 +3689,15 @@ class Statement(object):
         """Returns the value for a named parameter on this Statement."""
         return self._params[elem_name].get_value()
 
+    def get_parameter_constraint(self, elem_name):
+        """Returns the constraint on a named parameter on this Statement."""
+        return self._params[elem_name].get_constraint()
+
     def set_parameter_value(self, elem_name, value):
         """Programatically sets a value for a parameter on this Statement."""
-        elem = self._params[elem_name]
+        elem = self._own_parameter(elem_name)
         elem.set_value(value)
+        self._invalidate_hashes()
 
     def can_set_parameter_value(self, elem_name, value):
         """Determines whether a given Parameter can take a value."""
@@ -2297,6 +3714,7 @@ class Statement(object):
     def add_metadata(self, elem_name, val):
         """Programatically adds a metadata element to this Statement."""
         self._metadata[elem_name] = Metavalue(element(elem_name, reguri=self._reguri), val)
+        self._invalidate_hashes()
 
     def has_metadata(self, elem_name):
         """Returns True if the statement has a metadata element with the given name."""
@@ -2313,6 +3731,59 @@ class Statement(object):
     def add_result_column(self, elem_name):
         """Programatically adds a result column to this Statement."""
         self._resultcolumns[elem_name] = ResultColumn(element(elem_name, reguri=self._reguri))
+        if elem_name in self._shared_columns:
+            self._shared_columns = self._shared_columns - {elem_name}
+        self._invalidate_hashes()
+
+    def _derive_from(self, statement):
+        """
+        Takes over the parameters, metadata, and result columns of a
+        related statement, sharing the objects themselves instead of
+        copying them. Shared parameters and result columns are copied
+        on write, by either statement; see _own_parameter() and
+        _own_result_column().
+
+        """
+        self._reguri = statement._reguri
+        self._params = dict(statement._params)
+        self._metadata = dict(statement._metadata)
+        self._resultcolumns = dict(statement._resultcolumns)
+        # everything either statement has is now shared; both can
+        # refer to the same (immutable) sets of names
+        self._shared_params = statement._shared_params = frozenset(self._params)
+        self._shared_columns = statement._shared_columns = frozenset(self._resultcolumns)
+        self._invalidate_hashes()
+
+    def _own_parameter(self, elem_name):
+        """
+        Returns the named Parameter for changing, first making a
+        private copy of it if it is shared with another statement.
+
+        """
+        param = self._params[elem_name]
+        if elem_name in self._shared_params:
+            # elements and constraints are never changed in place,
+            # so the copy can keep referring to them
+            param = copy(param)
+            self._params[elem_name] = param
+            self._shared_params = self._shared_params - {elem_name}
+        return param
+
+    def _own_result_column(self, elem_name):
+        """
+        Returns the named ResultColumn for changing, first making a
+        private copy of it if it is shared with another statement.
+
+        """
+        col = self._resultcolumns[elem_name]
+        if elem_name in self._shared_columns:
+            if len(col):
+                col = deepcopy(col)
+            else:
+                col = ResultColumn(col)
+            self._resultcolumns[elem_name] = col
+            self._shared_columns = self._shared_columns - {elem_name}
+        return col
 
     def has_result_column(self, elem_name):
         """Returns True if the statement has results column with the given name."""
@@ -2352,6 +3823,7 @@ class Statement(object):
     def set_export(self, export):
         """Sets the Statement's export URL."""
         self._export = export
+        self._invalidate_hashes()
 
     def get_label(self):
         """Returns the Statement's label."""
@@ -2373,13 +3845,22 @@ class Statement(object):
         mplane.model.When, or a string describing the scope.
         """
         if isinstance(when, str):
-            when = When(when)
+            when = parse_when(when)
         if not force and \
            (self._when is not None) and \
            not when.follows(self._when):
             raise ValueError("Cannot set temporal scope "+str(when)+
                              " within "+str(self._when))
         self._when = when
+        self._invalidate_hashes()
+
+    def _invalidate_hashes(self):
+        """
+        Forgets the cached digests of this statement; called by
+        every method changing a part of the statement they cover.
+
+        """
+        self._hashes = {}
 
     def _schema_hash(self, lim=None):
         """
@@ -2387,10 +3868,13 @@ class Statement(object):
         and result columns (the schema) of this statement.
 
         """
-        sstr = self._reguri + \
-               " p " + " ".join(sorted(self._params.keys())) + \
-               " r " + " ".join(sorted(self._resultcolumns.keys()))
-        hstr = hashlib.md5(sstr.encode('utf-8')).hexdigest()
+        hstr = self._hashes.get("schema")
+        if hstr is None:
+            sstr = self._reguri + \
+                   " p " + " ".join(sorted(self._params.keys())) + \
+                   " r " + " ".join(sorted(self._resultcolumns.keys()))
+            hstr = hashlib.md5(sstr.encode('utf-8')).hexdigest()
+            self._hashes["schema"] = hstr
         if lim is not None:
             return hstr[:lim]
         else:
@@ -2403,6 +3887,10 @@ class Statement(object):
         of this statement. Used as a specification key.
 
         """
+        if astr is None and "pv" in self._hashes:
+            hstr = self._hashes["pv"]
+            return hstr[:lim] if lim is not None else hstr
+
         spk = sorted(self._params.keys())
         spv = [self._params[k].unparse(self._params[k].get_value()) for k in spk]
         tstr = self._reguri + self._verb + " w " + str(self._when) +\
@@ -2412,6 +3900,8 @@ class Statement(object):
         if astr:
             tstr += astr
         hstr = hashlib.md5(tstr.encode('utf-8')).hexdigest()
+        if astr is None:
+            self._hashes["pv"] = hstr
         if lim is not None:
             return hstr[:lim]
         else:
@@ -2425,6 +3915,10 @@ class Statement(object):
         Used as a complete token for statements.
 
         """
+        if astr is None and "mpcv" in self._hashes:
+            hstr = self._hashes["mpcv"]
+            return hstr[:lim] if lim is not None else hstr
+
         spk = sorted(self._params.keys())
         spc = [str(self._params[k]._constraint) for k in spk]
         spv = [self._params[k].unparse(self._params[k].get_value()) for k in spk]
@@ -2440,6 +3934,8 @@ class Statement(object):
         if astr:
             tstr += astr
         hstr = hashlib.md5(tstr.encode('utf-8')).hexdigest()
+        if astr is None:
+            self._hashes["mpcv"] = hstr
         if lim is not None:
             return hstr[:lim]
         else:
@@ -2464,18 +3960,31 @@ class Statement(object):
     def _default_token(self):
       return self._mpcv_hash()
 
+    def _result_row_iterator(self):
+        """
+        Iterates over the result values of this statement one row at a
+        time, yielding each row as a list of strings.
+
+        """
+        cols = list(self._resultcolumns.values())
+
+        # if no column has been touched since decoding, reuse the rows
+        if len(cols) and cols[0]._raw is not None and \
+                all(col._raw is cols[0]._raw for col in cols) and \
+                all(col._raw_index == j for j, col in enumerate(cols)):
+            for row in cols[0]._raw:
+                yield list(row)
+            return
+
+        # otherwise unparse a batch of rows at a time, column by column
+        nrows = self.count_result_rows()
+        for start in range(0, nrows, _ROW_BATCH):
+            stop = min(start + _ROW_BATCH, nrows)
+            for row in zip(*[col._unparse_range(start, stop) for col in cols]):
+                yield list(row)
+
     def _result_rows(self):
-        rows = []
-        for row_index in range(self.count_result_rows()):
-            row = []
-            rows.append(row)
-            for col in self._resultcolumns.values():
-                try:
-                    valstr = col._prim.unparse(col[row_index])
-                except IndexError:
-                    valstr = VALUE_NONE
-                row.append(valstr)
-        return rows
+        return list(self._result_row_iterator())
 
     def to_dict(self, token_only=False):
         """
@@ -2483,6 +3992,14 @@ class Statement(object):
         to JSON or YAML), which can be passed as the dictval
         argument of the appropriate statement constructor.
 
+        """
+        return self._to_dict(token_only)
+
+    def _to_dict(self, token_only=False, values=True):
+        """
+        Implements to_dict(); if values is False, leaves out the
+        result values, for callers which serialize them separately.
+
         """
         self.validate()
         d = collections.OrderedDict()
@@ -2516,7 +4033,7 @@ class Statement(object):
 
         if self.count_result_columns() > 0:
             d[KEY_RESULTS] = [k for k in self._resultcolumns.keys()]
-            if self.count_result_rows() > 0:
+            if values and self.count_result_rows() > 0:
                 d[KEY_RESULTVALUES] = self._result_rows()
 
         return d
@@ -2565,7 +4082,7 @@ class Statement(object):
           self._token = d[KEY_TOKEN]
 
         if KEY_WHEN in d:
-            self._when = When(d[KEY_WHEN])
+            self._when = parse_when(d[KEY_WHEN])
 
         if KEY_PARAMETERS in d:
             self._params_from_dict(d[KEY_PARAMETERS])
@@ -2578,9 +4095,13 @@ class Statement(object):
             for v in d[KEY_RESULTS]:
                 self.add_result_column(v)
 
+        self._invalidate_hashes()
+
     def _clear_constraints(self):
-        for param in self._params.values():
-            param._clear_constraint()
+        for elem_name in list(self._params.keys()):
+            if self._params[elem_name]._constraint is not constraint_all:
+                self._own_parameter(elem_name)._clear_constraint()
+        self._invalidate_hashes()
 
 class Capability(Statement):
     """
@@ -2597,8 +4118,14 @@ class Capability(Statement):
 
     """
 
+    __slots__ = ()
+
     def __init__(self, dictval=None, verb=VERB_MEASURE, label=None, token=None, when=None, registry_uri=None):
         super().__init__(dictval=dictval, verb=verb, label=label, token=token, when=when, reguri=registry_uri)
+        if dictval is not None:
+            # capabilities are matched against every specification;
+            # compute the schema digest up front
+            self._schema_hash()
 
     def _more_repr(self):
         return " p/m/r "+str(self.count_parameters())+"/"+\
@@ -2650,6 +4177,8 @@ class Specification(Statement):
 
     """
 
+    __slots__ = ()
+
     def __init__(self, dictval=None, capability=None, verb=VERB_MEASURE, label=None, token=None, when=None, schedule=None):
         super().__init__(dictval=dictval, verb=verb, label=label, token=token, when=when)
 
@@ -2657,18 +4186,22 @@ class Specification(Statement):
             # Build a statement from a capabilitiy
             self._verb = capability._verb
             self._label = capability._label
-            self._metadata = capability._metadata
-            self._params = deepcopy(capability._params)
-            self._resultcolumns = deepcopy(capability._resultcolumns)
-            self._reguri = capability._reguri
+            self._derive_from(capability)
 
             # inherit from capability only when necessary
             if when is None:
                 self._when = capability._when
 
             # now set values we know we can
-            for param in self._params.values():
-                param.set_single_value()
+            for elem_name in list(self._params.keys()):
+                param = self._params[elem_name]
+                if not param.has_value() and \
+                   param._constraint.single_value() is not None:
+                    self._own_parameter(elem_name).set_single_value()
+
+            # the schema is the capability's
+            self._invalidate_hashes()
+            self._hashes["schema"] = capability._schema_hash()
 
     def _more_repr(self):
         return " p(v)/m/r "+str(self.count_parameters())+"("+\
@@ -2737,11 +4270,11 @@ class Specification(Statement):
         relative temporal scope and schedule.
         """
         if self._when.is_repeated():
-            subspec = deepcopy(self)  # Brian does not like that but he said it is okay
-
             iter = self._when.iterator()
             while 1:
-                subspec._when = next(iter)
+                subspec = copy(self)
+                subspec._derive_from(self)
+                subspec.set_when(next(iter), force=True)
                 subspec.retoken(True)
                 yield subspec
         else:
@@ -2756,15 +4289,14 @@ class Result(Statement):
     Results are generally created by passing the specification the new result responds to as the specification= argument to the constructor. A result inherits its token from the specification it responds to.
 
     """
+    __slots__ = ()
+
     def __init__(self, dictval=None, specification=None, verb=VERB_MEASURE, label=None, token=None, when=None):
         super().__init__(dictval=dictval, verb=verb, label=label, token=token, when=when)
         if dictval is None and specification is not None:
             self._verb = specification._verb
             self._label = specification._label
-            self._metadata = specification._metadata
-            self._params = deepcopy(specification._params)
-            self._resultcolumns = deepcopy(specification._resultcolumns)
-            self._reguri = specification._reguri
+            self._derive_from(specification)
             # assign token from specification
             self._token = specification.get_token()
             # allow parameters to take values other than constrained
@@ -2773,6 +4305,10 @@ class Result(Statement):
             if when is not None:
                 self._when = specification._when
 
+            # the schema is the specification's
+            self._invalidate_hashes()
+            self._hashes["schema"] = specification._schema_hash()
+
 
     def _more_repr(self):
         return " p/m/r(r) "+str(self.count_parameters())+"/"+\
@@ -2809,15 +4345,76 @@ class Result(Statement):
         column_key = list(self._resultcolumns.keys())
 
         if KEY_RESULTVALUES in d:
-            for i, row in enumerate(d[KEY_RESULTVALUES]):
-                for j, val in enumerate(row):
-                    self._resultcolumns[column_key[j]][i] = val
+            rows = d[KEY_RESULTVALUES]
+            if isinstance(rows, _DecodedColumns):
+                rows.load(self._resultcolumns.values())
+            elif len(rows) and all(len(row) == len(column_key) for row in rows):
+                # decode a column at a time, unless decoding lazily
+                for j, k in enumerate(column_key):
+                    self._resultcolumns[k]._set_raw(rows, j)
+                    if not _lazy_results:
+                        self._resultcolumns[k]._decode()
+            else:
+                for i, row in enumerate(rows):
+                    for j, val in enumerate(row):
+                        self._resultcolumns[column_key[j]][i] = val
 
     def set_result_value(self, elem_name, val, row_index=0):
         """
         Sets a single result value.
         """
-        self._resultcolumns[elem_name][row_index] = val
+        self._own_result_column(elem_name)[row_index] = val
+
+    def _concat_key(self):
+        # Results can be concatenated if they agree on all of this
+        return (self._schema_hash(), self._verb, self._label,
+                tuple((k, self._params[k].unparse(self._params[k].get_value()))
+                      for k in sorted(self._params.keys())))
+
+    def concat(self, others):
+        """
+        Returns a new Result holding the rows of this Result followed
+        by those of each of the others in turn, with a temporal scope
+        spanning all of theirs. Metadata is taken from this Result.
+
+        Raises ValueError unless all the Results share a schema,
+        verb, label, and parameter values.
+
+        """
+        results = [self] + list(others)
+        key = self._concat_key()
+        for other in results[1:]:
+            if not isinstance(other, Result) or other._concat_key() != key:
+                raise ValueError("Cannot concatenate "+repr(other)+" to "+repr(self))
+
+        out = copy(self)
+        out._derive_from(self)
+
+        # fresh columns, filled a column at a time
+        names = list(self._resultcolumns.keys())
+        cols = [ResultColumn(self._resultcolumns[k]) for k in names]
+        out._resultcolumns = dict(zip(names, cols))
+        out._shared_columns = frozenset()
+        for res in results:
+            nrows = res.count_result_rows()
+            for (k, col) in zip(names, cols):
+                vals = res._resultcolumns[k][:]
+                if len(vals) < nrows:
+                    vals.extend([None] * (nrows - len(vals)))
+                col._extend(vals)
+
+        (start, end) = (None, None)
+        for res in results:
+            (a, b) = res.when().datetimes()
+            if b is None:
+                b = a
+            if start is None or a < start:
+                start = a
+            if end is None or b > end:
+                end = b
+        out.set_when(When(a=start, b=end), force=True)
+
+        return out
 
     def schema_dict_iterator(self):
         """
@@ -2825,12 +4422,233 @@ class Result(Statement):
         mapping all parameter and result column names to their values.
 
         """
-        for i in range(self.count_result_rows()):
-            d = self.parameter_values()
-            for k in self.result_column_names():
-                d[k] = self._resultcolumns[k][i]
+        params = self.parameter_values()
+        names = tuple(self.result_column_names())
+        for row in self.row_tuples():
+            d = params.copy()
+            d.update(zip(names, row))
             yield d
 
+    def row_tuples(self):
+        """
+        Iterates over each row in this result, yielding a tuple of
+        values in the order of result_column_names(). Missing values
+        at the end of shorter columns are None.
+
+        """
+        return itertools.zip_longest(*self._resultcolumns.values())
+
+    def columns(self):
+        """
+        Returns a dictionary mapping each result column name to its
+        ResultColumn, in order. The columns are the result's own
+        storage, not copies, and should be treated as read-only;
+        use set_result_value() to change values.
+
+        """
+        return dict(self._resultcolumns)
+
+    def iter_batches(self, n=_ROW_BATCH):
+        """
+        Iterates over the rows in this result n at a time, yielding
+        for each batch a list holding one list of values per result
+        column, in the order of result_column_names().
+
+        """
+        cols = list(self._resultcolumns.values())
+        nrows = self.count_result_rows()
+        for start in range(0, nrows, n):
+            stop = min(start + n, nrows)
+            batch = []
+            for col in cols:
+                vals = col[start:stop]
+                if len(vals) < stop - start:
+                    vals.extend([None] * (stop - start - len(vals)))
+                batch.append(vals)
+            yield batch
+
+
+def test_result_concat():
+    initialize_registry()
+    cap = Capability(when="now ... future / 1s", label="ping")
+    cap.add_parameter("destination.ip4")
+    cap.add_result_column("time")
+    cap.add_result_column("delay.twoway.icmp.us")
+    spec = Specification(capability=cap)
+    spec.set_parameter_value("destination.ip4", "10.0.27.2")
+
+    env = Envelope(token=spec.get_token(), label="ping")
+    for i in range(3):
+        res = Result(specification=spec)
+        res.set_when("2013-07-30 23:19:4"+str(i)+" ... 2013-07-30 23:19:4"+str(i+1), force=True)
+        res.set_result_value("time", parse_time("2013-07-30 23:19:4"+str(i)))
+        res.set_result_value("delay.twoway.icmp.us", i)
+        env.append_message(res)
+    env.append_message(Exception(token="nope", errmsg="in the way"))
+
+    compact = env.compact()
+    assert len(env) == 4
+    assert len(compact) == 2
+    (merged, exc) = compact.messages()
+    assert isinstance(exc, Exception)
+    assert merged.count_result_rows() == 3
+    # the merged result still answers the specification
+    assert merged.get_token() == spec.get_token()
+    assert parse_json(unparse_json(merged)).get_token() == spec.get_token()
+    assert merged.get_parameter_value("destination.ip4") == ip_address("10.0.27.2")
+    assert [row[1] for row in merged.row_tuples()] == [0, 1, 2]
+    assert merged.when().datetimes() == (parse_time("2013-07-30 23:19:40"),
+                                         parse_time("2013-07-30 23:19:43"))
+    assert parse_json(unparse_json(compact)).get_token() == env.get_token()
+
+    # results for other parameter values are kept apart
+    other = Result(specification=spec)
+    other.set_parameter_value("destination.ip4", "10.0.27.3")
+    other.set_when("2013-07-30 23:19:45", force=True)
+    try:
+        merged.concat([other])
+        assert False
+    except ValueError:
+        pass
+
+def test_envelope_cursor():
+    initialize_registry()
+    cap = Capability(when="now ... future / 1s", label="ping")
+    cap.add_parameter("destination.ip4")
+    cap.add_result_column("delay.twoway.icmp.us")
+    spec = Specification(capability=cap)
+    spec.set_parameter_value("destination.ip4", "10.0.27.2")
+
+    def results(env, values):
+        for i in values:
+            res = Result(specification=spec)
+            res.set_when("2013-07-30 23:19:4"+str(i), force=True)
+            res.set_result_value("delay.twoway.icmp.us", i)
+            env.append_message(res)
+        return env
+
+    held = results(Envelope(token=spec.get_token()), range(3))
+    held.set_cursor(3)
+    delta = results(Envelope(token=spec.get_token()), range(2, 5))
+    delta.set_cursor(5, 2)
+    delta.set_evicted(2)
+
+    for unparse, parse in ((unparse_json, parse_json),
+                           (unparse_binary, parse_binary)):
+        copy = parse(unparse(delta))
+        assert (copy.get_cursor(), copy.get_since()) == (5, 2)
+        assert copy.get_evicted() == 2
+        red = parse(unparse(Redemption(receipt=Receipt(specification=spec), cursor=3)))
+        assert red.get_cursor() == 3
+
+    held.merge(parse_json(unparse_json(delta)))
+    assert held.get_cursor() == 5
+    assert [row for msg in held.messages()
+            for (row,) in msg.row_tuples()] == [0, 1, 2, 3, 4]
+    assert held.get_evicted() == 2
+
+    held.trim(2)
+    assert len(held) == 2
+    held.trim(0)
+    assert len(held) == 0
+
+def test_statement_hashes():
+    initialize_registry()
+    cap = Capability(when="now ... future", label="ping")
+    cap.add_parameter("destination.ip4")
+    cap.add_result_column("delay.twoway.icmp.us")
+    schema = cap._schema_hash()
+    assert cap._hashes["schema"] == schema
+    assert cap._schema_hash(REPHL) == schema[:REPHL]
+    cap.add_result_column("time")
+    assert cap._schema_hash() != schema
+    schema = cap._schema_hash()
+
+    # specifications carry their capability's schema digest
+    spec = Specification(capability=cap)
+    assert spec._hashes == {"schema": schema}
+    assert spec.fulfills(cap)
+
+    token = spec._pv_hash()
+    mpcv = spec._mpcv_hash()
+    spec.set_parameter_value("destination.ip4", "10.0.37.2")
+    assert spec._pv_hash() != token
+    token = spec._pv_hash()
+    assert spec._pv_hash(astr="x") != token
+    assert spec._pv_hash() == token
+    spec.set_when("2017-12-24 22:18:42 ... 2017-12-24 22:19:42", force=True)
+    assert spec._pv_hash() != token
+    assert spec._schema_hash() == schema
+    mpcv = spec._mpcv_hash()
+    spec.add_metadata("System_type", "ping")
+    assert spec._mpcv_hash() != mpcv
+
+    # digests are always those of the statement as it is now
+    for stmt in (cap, spec, Result(specification=spec)):
+        hashes = (stmt._schema_hash(), stmt._pv_hash(), stmt._mpcv_hash())
+        stmt._invalidate_hashes()
+        assert hashes == (stmt._schema_hash(), stmt._pv_hash(), stmt._mpcv_hash())
+
+def test_compact_statements():
+    initialize_registry()
+    caps = [Capability(when="now ... future / 1s", label="ping")
+            for i in range(2)]
+    for cap in caps:
+        cap.add_parameter("destination.port", "1 ... 100")
+        cap.add_result_column("delay.twoway.icmp.us")
+        assert not hasattr(cap, "__dict__")
+        assert not hasattr(cap._params["destination.port"], "__dict__")
+
+    # constraints, primitives, and scopes are shared, not copied
+    (first, second) = [cap._params["destination.port"] for cap in caps]
+    assert first._constraint is second._constraint
+    assert deepcopy(first)._prim is first._prim
+    assert caps[0].when() is caps[1].when()
+
+def test_copy_on_write():
+    initialize_registry()
+    cap = Capability(when="now ... future / 1s", label="ping")
+    cap.add_parameter("source.ip4", "10.0.27.2")
+    cap.add_parameter("destination.ip4")
+    cap.add_parameter("destination.port", "1 ... 100")
+    cap.add_result_column("delay.twoway.icmp.us")
+
+    # only parameters taking a value are copied
+    spec = Specification(capability=cap)
+    assert spec._params["destination.ip4"] is cap._params["destination.ip4"]
+    assert spec._params["source.ip4"] is not cap._params["source.ip4"]
+    assert spec.get_parameter_value("source.ip4") == ip_address("10.0.27.2")
+    assert cap.get_parameter_value("source.ip4") is None
+    spec.set_parameter_value("destination.ip4", "10.0.37.2")
+    spec.set_parameter_value("destination.port", 10)
+    assert cap.get_parameter_value("destination.ip4") is None
+    assert spec._params["destination.port"]._constraint is cap._params["destination.port"]._constraint
+
+    # results share columns until they get values
+    res = Result(specification=spec)
+    assert res._resultcolumns["delay.twoway.icmp.us"] is \
+           spec._resultcolumns["delay.twoway.icmp.us"]
+    assert str(res._params["destination.port"]._constraint) == CONSTRAINT_ALL
+    assert str(spec._params["destination.port"]._constraint) == "1 ... 100"
+    res.set_result_value("delay.twoway.icmp.us", 1234)
+    assert spec.count_result_rows() == 0
+    assert res.count_result_rows() == 1
+
+    # the parent copies on write, too
+    spec.set_parameter_value("destination.port", 20)
+    assert res.get_parameter_value("destination.port") == 10
+    spec.add_metadata("System_type", "ping")
+    assert not res.has_metadata("System_type")
+
+    # each subspecification is a statement of its own
+    spec.set_when("repeat now + 30m / 1m { now + 5s / 1s }", force=True)
+    subspecs = spec.subspec_iterator()
+    first = next(subspecs)
+    second = next(subspecs)
+    assert first is not second
+    assert first.when() != second.when()
+    assert first.get_token() != second.get_token()
+    assert first.get_parameter_value("destination.port") == 20
 
 #######################################################################
 # Notifications
@@ -2849,6 +4667,8 @@ class BareNotification(object):
     or Specification.
 
     """
+    __slots__ = ("_token",)
+
     def __init__(self, dictval=None, token=None):
         super().__init__()
         if dictval is not None:
@@ -2867,6 +4687,8 @@ class Exception(BareNotification):
     client and component frameworks.
 
     """
+    __slots__ = ("_errmsg", "status")
+
     def __init__(self, token=None, dictval=None, errmsg=None, status=None):
         super().__init__(dictval=dictval, token=token)
         if dictval is None:
@@ -2912,18 +4734,16 @@ class _StatementNotification(Statement):
     directly
 
     """
+    __slots__ = ()
+
     def __init__(self, dictval=None, statement=None, verb=VERB_MEASURE, token=None):
         super().__init__(dictval=dictval, verb=verb, token=token)
         if dictval is None and statement is not None:
             self._label = statement._label
             self._verb = statement._verb
             self._when = statement._when
-            self._reguri = statement._reguri
-            self._metadata = statement._metadata
-            self._params = deepcopy(statement._params)
-            self._resultcolumns = deepcopy(statement._resultcolumns)
+            self._derive_from(statement)
             self._token = statement.get_token()
-            self._reguri = statement._reguri
 
     def __repr__(self):
         return "<"+self.kind_str()+": "+self._label_repr()+self.get_token()+">"
@@ -2948,6 +4768,8 @@ class Receipt(_StatementNotification):
     A component presents a receipt to a Client in lieu of a result, when the
     result will not be available in a reasonable amount of time; or to confirm
     a Specification """
+    __slots__ = ()
+
     def __init__(self, dictval=None, specification=None, token=None):
         super().__init__(dictval=dictval, statement=specification, token=token)
 
@@ -2966,8 +4788,14 @@ class Redemption(_StatementNotification):
     A client presents a Redemption to a component from which it has received
     a Receipt in order to get the associated Result.
 
+    For repeated measurements, a Redemption may carry the cursor of the
+    last Envelope of results received, to ask only for newer results.
+
     """
-    def __init__(self, dictval=None, receipt=None, token=None):
+    __slots__ = ("_cursor",)
+
+    def __init__(self, dictval=None, receipt=None, token=None, cursor=None):
+        self._cursor = cursor
         super().__init__(dictval=dictval, statement=receipt, token=token)
         if receipt is not None and token is None:
             self._token = receipt.get_token()
@@ -2975,6 +4803,25 @@ class Redemption(_StatementNotification):
     def kind_str(self):
         return KIND_REDEMPTION
 
+    def get_cursor(self):
+        """
+        Returns the cursor of the results already received,
+        or None to ask for all results.
+
+        """
+        return self._cursor
+
+    def to_dict(self, token_only=False):
+        d = super().to_dict(token_only)
+        if self._cursor is not None:
+            d[KEY_CURSOR] = self._cursor
+        return d
+
+    def _from_dict(self, d):
+        super()._from_dict(d)
+        if KEY_CURSOR in d:
+            self._cursor = int(d[KEY_CURSOR])
+
     def validate(self):
         """
         Checks that this is a valid Redemption; performes the same checks as for a Specification.
@@ -2983,6 +4830,8 @@ class Redemption(_StatementNotification):
 
 class Withdrawal(_StatementNotification):
     """A Withdrawal cancels a Capability"""
+    __slots__ = ()
+
     def __init__(self, dictval=None, capability=None, token=None):
         super().__init__(dictval=dictval, statement=capability, token=token)
 
@@ -2997,6 +4846,8 @@ class Withdrawal(_StatementNotification):
 
 class Interrupt(_StatementNotification):
     """An Interrupt cancels a Specification"""
+    __slots__ = ()
+
     def __init__(self, dictval=None, specification=None, token=None):
         super().__init__(dictval=dictval, statement=specification, token=token)
 
@@ -3019,6 +4870,9 @@ class Envelope(object):
 
     """
 
+    __slots__ = ("_version", "_content_type", "_token", "_label", "_when",
+                 "_messages", "_cursor", "_since", "_evicted")
+
     def __init__(self, dictval=None, content_type=ENVELOPE_MESSAGE, token=None, label=None, when=None):
         super().__init__()
 
@@ -3027,6 +4881,9 @@ class Envelope(object):
         self._content_type = content_type
         self._token = token
         self._label = label
+        self._cursor = None
+        self._since = None
+        self._evicted = 0
         self._when = None
         if when:
             (start, end) = when.datetimes()
@@ -3052,12 +4909,43 @@ class Envelope(object):
 
     def trim(self, n):
         """ Removes everything except the last n elements """
-        del self._messages[:-n]
+        del self._messages[:max(len(self._messages) - n, 0)]
 
     def append_message(self, msg):
         """ Appends a message to an Envelope """
         self._messages.append(msg)
 
+    def compact(self):
+        """
+        Returns a copy of this Envelope in which the Results sharing
+        a schema, verb, label, and parameter values are merged into
+        one, with Result.concat(), at the place of the first of them.
+        Other messages are copied as they are.
+
+        """
+        env = Envelope(content_type=self._content_type,
+                       token=self._token, label=self._label)
+        env._when = self._when
+        env.set_cursor(self._cursor, self._since)
+        env._evicted = self._evicted
+
+        groups = {}
+        for msg in self._messages:
+            if isinstance(msg, Result):
+                key = msg._concat_key()
+                if key in groups:
+                    groups[key].append(msg)
+                    continue
+                groups[key] = [msg]
+                env._messages.append(groups[key])
+            else:
+                env._messages.append(msg)
+
+        env._messages = [(msg[0].concat(msg[1:]) if len(msg) > 1 else msg[0])
+                         if isinstance(msg, list) else msg
+                         for msg in env._messages]
+        return env
+
     def messages(self):
         """ Returns an iterator to iterate over all messages in an Envelope """
         return iter(self._messages)
@@ -3066,11 +4954,20 @@ class Envelope(object):
         return KIND_ENVELOPE
 
     def to_dict(self, token_only=False):
+        return self._to_dict(token_only)
+
+    def _to_dict(self, token_only=False, contents=True):
+        """
+        Implements to_dict(); if contents is False, leaves out the
+        contained messages, for callers which serialize them separately.
+
+        """
         d = {}
         d[self.kind_str()] = self._content_type
         d[KEY_VERSION] = self._version
 
-        d[KEY_CONTENTS] = [m.to_dict(token_only=token_only) for m in self.messages()]
+        if contents:
+            d[KEY_CONTENTS] = [m.to_dict(token_only=token_only) for m in self.messages()]
 
         if self._token is not None:
             d[KEY_TOKEN] = self._token
@@ -3081,6 +4978,15 @@ class Envelope(object):
         if self._label is not None:
             d[KEY_LABEL] = self._label
 
+        if self._cursor is not None:
+            d[KEY_CURSOR] = self._cursor
+
+        if self._since is not None:
+            d[KEY_SINCE] = self._since
+
+        if self._evicted:
+            d[KEY_EVICTED] = self._evicted
+
         return d
 
     def _from_dict(self, d):
@@ -3094,11 +5000,20 @@ class Envelope(object):
           self._token = d[KEY_TOKEN]
 
         if KEY_WHEN in d:
-          self._when = When(d[KEY_WHEN])
+          self._when = parse_when(d[KEY_WHEN])
 
         if KEY_LABEL in d:
           self._label = d[KEY_LABEL]
 
+        if KEY_CURSOR in d:
+          self._cursor = int(d[KEY_CURSOR])
+
+        if KEY_SINCE in d:
+          self._since = int(d[KEY_SINCE])
+
+        if KEY_EVICTED in d:
+          self._evicted = int(d[KEY_EVICTED])
+
         for md in d[KEY_CONTENTS]:
             self.append_message(message_from_dict(md))
 
@@ -3120,6 +5035,56 @@ class Envelope(object):
         """ Returns the envelope's temporal scope. (If it's a bunch of multijob results) """
         return self._when
 
+    def get_cursor(self):
+        """
+        Returns the cursor of a set of multijob results, to be presented
+        in the next Redemption to get only newer results; or None.
+
+        """
+        return self._cursor
+
+    def get_since(self):
+        """
+        Returns the cursor from which this Envelope holds the newer
+        multijob results, or None if it holds all results available.
+
+        """
+        return self._since
+
+    def set_cursor(self, cursor, since=None):
+        """
+        Sets the cursor after the last message in this Envelope, and,
+        if it only holds the messages after a given cursor, that cursor.
+
+        """
+        self._cursor = cursor
+        self._since = since
+
+    def merge(self, delta):
+        """
+        Appends to this Envelope the messages of an Envelope holding the
+        results since a cursor (see get_since()), skipping those this
+        Envelope already holds, and takes over its cursor.
+
+        """
+        skip = 0
+        if self._cursor is not None and delta._since is not None:
+            skip = max(self._cursor - delta._since, 0)
+        self._messages.extend(delta._messages[skip:])
+        self._cursor = delta._cursor
+        self._evicted = delta._evicted
+
+    def get_evicted(self):
+        """
+        Returns the number of multijob result rows the component has
+        dropped so far to stay within its retention limits.
+
+        """
+        return self._evicted
+
+    def set_evicted(self, evicted):
+        self._evicted = evicted
+
 #######################################################################
 # Utility methods
 #######################################################################
@@ -3152,6 +5117,252 @@ def parse_json(jstr):
     """
     return message_from_dict(json.loads(jstr))
 
+# states of the JsonStreamParser
+_PS_START = 0       # before the top-level object
+_PS_OBJ_FIRST = 1   # after {, expecting a key or }
+_PS_OBJ_NEXT = 2    # after a member, expecting , or }
+_PS_KEY = 3         # expecting a key
+_PS_COLON = 4       # after a key, expecting :
+_PS_VALUE = 5       # after :, expecting a value
+_PS_LIST_FIRST = 6  # after the [ of the contents, expecting a message or ]
+_PS_LIST_NEXT = 7   # after a message, expecting , or ]
+_PS_ITEM = 8        # expecting a message in the contents
+_PS_END = 9         # after the top-level object
+
+_json_ws_re = re.compile(r'[ \t\n\r]*')
+_json_struct_re = re.compile(r'["\[\]{}]')
+_json_str_re = re.compile(r'["\\]')
+_json_scalar_end_re = re.compile(r'[,\]}\s]')
+
+class JsonStreamParser(object):
+    """
+    Incrementally parses a JSON mPlane message which arrives in chunks.
+
+    Feed the text (or UTF-8 encoded bytes) to feed() as it arrives, and
+    call close() at the end, which returns the decoded message. If the
+    message is an Envelope, each message in its contents is decoded as
+    soon as its text is complete, so that only one contained message at
+    a time is ever held as text or as a dictionary. If a callback is
+    given, each decoded message in the contents is passed to it instead
+    of being added to the Envelope returned by close().
+
+    """
+    def __init__(self, callback=None):
+        super().__init__()
+        self._callback = callback
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = _PS_START
+        self._key = None
+        self._head = {}
+        self._messages = []
+        # scan state of the value currently being read
+        self._vstart = None
+        self._vpos = 0
+        self._vdepth = 0
+        self._vinstr = False
+        # text of the value set aside while waiting for the rest of it
+        self._vchunks = []
+
+    def feed(self, data):
+        """Feeds a chunk of the message to the parser."""
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        self._buf += data
+        self._parse()
+
+        # drop everything already consumed
+        if self._pos > 0:
+            self._buf = self._buf[self._pos:]
+            if self._vstart is not None:
+                self._vstart -= self._pos
+                self._vpos -= self._pos
+            self._pos = 0
+
+    def close(self):
+        """
+        Signals the end of the message, and returns it. Raises ValueError
+        if the message is incomplete or not an mPlane message.
+
+        """
+        self.feed(self._decoder.decode(b"", final=True))
+        if self._state != _PS_END:
+            raise ValueError("Truncated mPlane JSON message")
+
+        if KIND_ENVELOPE in self._head:
+            self._head[KEY_CONTENTS] = []
+            msg = message_from_dict(self._head)
+            for inner in self._messages:
+                msg.append_message(inner)
+            return msg
+        elif KEY_CONTENTS in self._head:
+            raise ValueError("Contents in a message which is not an Envelope")
+        else:
+            return message_from_dict(self._head)
+
+    def _next_char(self):
+        # skip whitespace and return the next character, if there is one
+        self._pos = _json_ws_re.match(self._buf, self._pos).end()
+        if self._pos < len(self._buf):
+            return self._buf[self._pos]
+        else:
+            return None
+
+    def _expect(self, c, expected):
+        if c not in expected:
+            raise ValueError("Invalid mPlane JSON message: unexpected "+
+                             repr(c)+" at "+repr(self._buf[self._pos:self._pos+32]))
+        self._pos += 1
+
+    def _scan_value(self):
+        """
+        Scans forward over the JSON value starting at the current
+        position. Returns the decoded value once its text is
+        complete, or raises IndexError if more input is needed.
+
+        """
+        buf = self._buf
+        if self._vstart is None:
+            self._vstart = self._vpos = self._pos
+            self._vdepth = 0
+            self._vinstr = False
+
+        end = None
+        p = self._vpos
+        if buf[self._vstart] not in '{["':
+            # numbers, true, false, null end at the next delimiter
+            m = _json_scalar_end_re.search(buf, p)
+            if m is not None:
+                end = m.start()
+            else:
+                p = len(buf)
+        else:
+            while end is None:
+                if self._vinstr:
+                    m = _json_str_re.search(buf, p)
+                    if m is None:
+                        p = len(buf)
+                        break
+                    if m.group() == '\\':
+                        if m.end() >= len(buf):
+                            p = m.start()
+                            break
+                        p = m.end() + 1
+                        continue
+                    p = m.end()
+                    self._vinstr = False
+                    if self._vdepth == 0:
+                        end = p
+                else:
+                    m = _json_struct_re.search(buf, p)
+                    if m is None:
+                        p = len(buf)
+                        break
+                    p = m.end()
+                    c = m.group()
+                    if c == '"':
+                        self._vinstr = True
+                    elif c in '[{':
+                        self._vdepth += 1
+                    else:
+                        self._vdepth -= 1
+                        if self._vdepth == 0:
+                            end = p
+
+        if end is None:
+            # set the text scanned so far aside, keeping only the first
+            # character, so that a value arriving in many chunks is
+            # joined once when complete instead of on every chunk
+            self._vchunks.append(buf[self._vstart + 1:p])
+            self._buf = buf[self._vstart] + buf[p:]
+            self._pos = self._vstart = 0
+            self._vpos = 1
+            raise IndexError("incomplete value")
+
+        text = buf[self._vstart:end]
+        if self._vchunks:
+            text = text[0] + "".join(self._vchunks) + text[1:]
+            self._vchunks = []
+        val = json.loads(text)
+        self._vstart = None
+        self._pos = end
+        return val
+
+    def _parse(self):
+        while True:
+            c = self._next_char()
+            if c is None:
+                return
+            try:
+                if self._state == _PS_START:
+                    self._expect(c, "{")
+                    self._state = _PS_OBJ_FIRST
+                elif self._state == _PS_OBJ_FIRST:
+                    if c == "}":
+                        self._expect(c, "}")
+                        self._state = _PS_END
+                    else:
+                        self._state = _PS_KEY
+                elif self._state == _PS_OBJ_NEXT:
+                    self._expect(c, ",}")
+                    if c == "}":
+                        self._state = _PS_END
+                    else:
+                        self._state = _PS_KEY
+                elif self._state == _PS_KEY:
+                    if c != '"':
+                        self._expect(c, '"')
+                    self._key = self._scan_value()
+                    self._state = _PS_COLON
+                elif self._state == _PS_COLON:
+                    self._expect(c, ":")
+                    self._state = _PS_VALUE
+                elif self._state == _PS_VALUE:
+                    if self._key == KEY_CONTENTS and c == "[":
+                        self._expect(c, "[")
+                        self._head[KEY_CONTENTS] = None
+                        self._state = _PS_LIST_FIRST
+                    else:
+                        self._head[self._key] = self._scan_value()
+                        self._state = _PS_OBJ_NEXT
+                elif self._state == _PS_LIST_FIRST:
+                    if c == "]":
+                        self._expect(c, "]")
+                        self._state = _PS_OBJ_NEXT
+                    else:
+                        self._state = _PS_ITEM
+                elif self._state == _PS_LIST_NEXT:
+                    self._expect(c, ",]")
+                    if c == "]":
+                        self._state = _PS_OBJ_NEXT
+                    else:
+                        self._state = _PS_ITEM
+                elif self._state == _PS_ITEM:
+                    msg = message_from_dict(self._scan_value())
+                    if self._callback is not None:
+                        self._callback(msg)
+                    else:
+                        self._messages.append(msg)
+                    self._state = _PS_LIST_NEXT
+                else:
+                    self._expect(c, "")
+            except IndexError:
+                # need more input
+                return
+
+def parse_json_stream(chunks, callback=None):
+    """
+    Parse a JSON object arriving as an iterable of chunks of text or
+    UTF-8 encoded bytes, and return the associated mPlane message. See
+    JsonStreamParser for the handling of Envelope contents and callback.
+
+    """
+    parser = JsonStreamParser(callback=callback)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
 def unparse_json(msg, token_only=False):
     """
     Transform an mPlane message into a JSON object representing it. If
@@ -3162,6 +5373,591 @@ def unparse_json(msg, token_only=False):
     return json.dumps(msg.to_dict(token_only=token_only),
                       sort_keys=True, indent=2, separators=(',',': '))
 
+_JSON_INDENT = "  "
+
+def _json_value(val, indent):
+    # nested values are dumped as at top level, then shifted right;
+    # JSON strings cannot contain raw newlines, so this is safe.
+    return json.dumps(val, sort_keys=True, indent=2,
+                      separators=(',',': ')).replace("\n", "\n" + indent)
+
+def _json_chunks(msg, token_only, indent):
+    """
+    Yields the JSON representation of msg in chunks, as it would be
+    nested at the given indent within an enclosing object.
+
+    """
+    if isinstance(msg, Envelope):
+        d = msg._to_dict(token_only=token_only, contents=False)
+        stream_key = KEY_CONTENTS
+        stream = msg.messages()
+    elif isinstance(msg, Statement) and msg.count_result_rows() > 0:
+        d = msg._to_dict(token_only=token_only, values=False)
+        stream_key = KEY_RESULTVALUES
+        stream = msg._result_row_iterator()
+    else:
+        yield _json_value(msg.to_dict(token_only=token_only), indent)
+        return
+
+    inner = indent + _JSON_INDENT
+    keys = sorted(list(d.keys()) + [stream_key])
+    yield "{"
+    for i, k in enumerate(keys):
+        yield "\n" + inner + json.dumps(k) + ": "
+        if k != stream_key:
+            yield _json_value(d[k], inner)
+        else:
+            item_indent = inner + _JSON_INDENT
+            sep = "[\n"
+            for item in stream:
+                yield sep + item_indent
+                if stream_key == KEY_CONTENTS:
+                    yield from _json_chunks(item, token_only, item_indent)
+                else:
+                    yield _json_value(item, item_indent)
+                sep = ",\n"
+            if sep == "[\n":
+                yield "[]"
+            else:
+                yield "\n" + inner + "]"
+        if i < len(keys) - 1:
+            yield ","
+    yield "\n" + indent + "}"
+
+def unparse_json_stream(msg, token_only=False):
+    """
+    Transform an mPlane message into a JSON object representing it, like
+    unparse_json(), but yield the text in chunks: the values of a Result
+    are encoded one row at a time, and the contents of an Envelope one
+    message at a time, so the whole representation never has to be held
+    in memory at once. The concatenated chunks are identical to the
+    output of unparse_json().
+
+    """
+    return _json_chunks(msg, token_only, "")
+
+def test_json_stream():
+    initialize_registry()
+    cap = Capability(when="now ... future / 1s", label="ping")
+    cap.add_parameter("source.ip4", "10.0.27.2")
+    cap.add_parameter("destination.ip4")
+    cap.add_result_column("time")
+    cap.add_result_column("delay.twoway.icmp.us")
+    spec = Specification(capability=cap)
+    spec.set_parameter_value("destination.ip4", "10.0.37.2")
+    res = Result(specification=spec)
+    res.set_when("2017-12-24 22:18:42 ... 2017-12-24 22:19:42", force=True)
+    for i in range(10):
+        res.set_result_value("time", datetime(2017, 12, 24, 22, 18, 42 + i), i)
+        res.set_result_value("delay.twoway.icmp.us", 1000 + i, i)
+
+    env = Envelope(token="feedbeef", label="ping-0")
+    env.append_message(res)
+    env.append_message(Receipt(specification=spec))
+    env.append_message(Exception(token="feedbeef", errmsg="oops"))
+    env.append_message(Envelope())
+
+    for msg in (cap, spec, res, env, Envelope()):
+        chunks = list(unparse_json_stream(msg))
+        assert "".join(chunks) == unparse_json(msg)
+    assert len(list(unparse_json_stream(res))) > res.count_result_rows()
+    assert "".join(unparse_json_stream(env, token_only=True)) == \
+           unparse_json(env, token_only=True)
+
+def test_json_stream_parser():
+    initialize_registry()
+    env = Envelope(token="feedbeef", label="ping-0")
+    for i in range(3):
+        res = Result(verb="measure", when="2017-12-24 22:18:42 ... 2017-12-24 22:19:42")
+        res.add_parameter("destination.ip4", val="10.0.37."+str(i))
+        res.add_result_column("delay.twoway.icmp.us")
+        res.set_result_value("delay.twoway.icmp.us", 1000 + i)
+        res.set_label("ping-\u00e9-\"{["+str(i))
+        env.append_message(res)
+    env.append_message(Exception(token="feedbeef", errmsg="oops \\ \""))
+    jbytes = unparse_json(env).encode("utf-8")
+
+    # feed one byte at a time, messages are emitted as they complete
+    seen = []
+    parser = JsonStreamParser(callback=seen.append)
+    for i in range(len(jbytes)):
+        parser.feed(jbytes[i:i+1])
+        # incomplete values are set aside rather than kept in the buffer
+        assert len(parser._buf) < 4
+        if i < len(jbytes) // 2:
+            assert len(seen) < 2
+    assert len(seen) == 4
+    clienv = parser.close()
+    assert isinstance(clienv, Envelope)
+    assert clienv.get_token() == "feedbeef"
+    assert len(clienv) == 0
+    assert seen[2].get_label() == "ping-\u00e9-\"{[2"
+    assert seen[1].get_parameter_value("destination.ip4") == ip_address("10.0.37.1")
+    assert seen[3]._errmsg == "oops \\ \""
+
+    # without a callback, contents stay in the envelope
+    chunks = [jbytes[i:i+100] for i in range(0, len(jbytes), 100)]
+    clienv = parse_json_stream(chunks)
+    assert unparse_json(clienv) == unparse_json(env)
+
+    # single messages parse as well
+    assert unparse_json(parse_json_stream([unparse_json(res)])) == unparse_json(res)
+
+    try:
+        parse_json_stream([jbytes[:-3]])
+        assert False
+    except ValueError:
+        pass
+
+def test_lazy_results():
+    initialize_registry()
+    res = Result(verb="measure", when="2017-12-24 22:18:42 ... 2017-12-24 22:19:42")
+    res.add_result_column("time")
+    res.add_result_column("delay.twoway.icmp.us")
+    for i in range(5):
+        res.set_result_value("time", datetime(2017, 12, 24, 22, 18, 42 + i), i)
+        res.set_result_value("delay.twoway.icmp.us", 1000 + i, i)
+    jstr = unparse_json(res)
+
+    set_lazy_result_decoding(True)
+    try:
+        # malformed values go unnoticed until accessed
+        bad = parse_json(jstr.replace('"1003"', '"bogus"'))
+        assert bad.count_result_rows() == 5
+        assert unparse_json(bad) == jstr.replace('"1003"', '"bogus"')
+
+        lazy = parse_json(jstr)
+        assert lazy._resultcolumns["time"]._raw is not None
+        assert unparse_json(lazy) == jstr
+
+        # columns decode one at a time
+        assert lazy._resultcolumns["delay.twoway.icmp.us"][2] == 1002
+        assert lazy._resultcolumns["time"]._raw is not None
+        assert unparse_json(lazy) == jstr
+        lazy.set_result_value("delay.twoway.icmp.us", 7, 4)
+        assert lazy._resultcolumns["delay.twoway.icmp.us"][4] == 7
+        assert unparse_json(lazy) == jstr.replace('"1004"', '"7"')
+        assert list(lazy.schema_dict_iterator())[1]["time"] == \
+               datetime(2017, 12, 24, 22, 18, 43)
+        assert lazy._resultcolumns["time"]._raw is None
+    finally:
+        set_lazy_result_decoding(False)
+
+#######################################################################
+# Binary encoding
+#######################################################################
+
+MIMETYPE_JSON = "application/x-mplane+json"
+MIMETYPE_BINARY = "application/x-mplane+binary"
+
+# Accept header for HTTP requests: prefer binary, fall back to JSON
+MPLANE_ACCEPT = MIMETYPE_BINARY + ", " + MIMETYPE_JSON + ";q=0.5"
+
+_BINARY_MAGIC = b"mPb\x01"
+
+# value tags
+_BT_NONE = 0
+_BT_FALSE = 1
+_BT_TRUE = 2
+_BT_INT = 3
+_BT_FLOAT = 4
+_BT_STR = 5
+_BT_LIST = 6
+_BT_DICT = 7
+_BT_KEYWORD = 8
+_BT_ELEMENT = 9
+_BT_COLUMNS = 10
+_BT_STRREF = 11
+
+# result column encodings
+_BC_VALUES = 0
+_BC_NATURAL = 1
+_BC_REAL = 2
+_BC_TIME = 3
+_BC_ADDRESS = 4
+
+_binary_column_kinds = { _NaturalColumn: _BC_NATURAL,
+                         _RealColumn: _BC_REAL,
+                         _TimeColumn: _BC_TIME,
+                         _AddressColumn: _BC_ADDRESS }
+_binary_column_stores = {v: k for k, v in _binary_column_kinds.items()}
+
+# Protocol keywords, referred to by index. Only ever append to this
+# list: the index of each keyword is part of the wire format.
+_BINARY_KEYWORDS = (KEY_PARAMETERS, KEY_METADATA, KEY_RESULTS,
+                    KEY_RESULTVALUES, KEY_TOKEN, KEY_MESSAGE, KEY_LINK,
+                    KEY_EXPORT, KEY_VERSION, KEY_WHEN, KEY_REGISTRY,
+                    KEY_LABEL, KEY_CONTENTS, KIND_CAPABILITY,
+                    KIND_SPECIFICATION, KIND_RESULT, KIND_RECEIPT,
+                    KIND_REDEMPTION, KIND_INDIRECTION, KIND_WITHDRAWAL,
+                    KIND_INTERRUPT, KIND_EXCEPTION, KIND_ENVELOPE,
+                    VERB_MEASURE, VERB_QUERY, VERB_COLLECT, VERB_STORE,
+                    VERB_CALLBACK, ENVELOPE_STATEMENT, ENVELOPE_NOTIFICATION,
+                    VALUE_NONE, REGURI_DEFAULT, KEY_CURSOR, KEY_SINCE,
+                    KEY_EVICTED)
+_binary_keyword_index = {k: i for i, k in enumerate(_BINARY_KEYWORDS)}
+
+def _le_array(data):
+    # typed column arrays go on the wire little-endian
+    if sys.byteorder != "little":
+        data = array(data.typecode, data)
+        data.byteswap()
+    return data
+
+def _padded_bits(bitmap, n, bit):
+    out = _Bitmap()
+    out._bits = bytearray(bitmap._bits)
+    out._len = len(bitmap)
+    out.extend(n, bit)
+    return out
+
+class _BinaryWriter(object):
+    """
+    Encodes mPlane messages in the binary encoding; see unparse_binary().
+
+    """
+    def __init__(self, registry, token_only=False):
+        super().__init__()
+        self._out = bytearray(_BINARY_MAGIC)
+        self._token_only = token_only
+        self._elements = registry._element_names()[1]
+        # strings already sent, by order of first appearance
+        self._strings = {}
+        self.string(registry.uri())
+        if registry._revision is None:
+            self.varint(0)
+        else:
+            self.varint(registry._revision + 1)
+
+    def varint(self, n):
+        out = self._out
+        while n > 0x7f:
+            out.append((n & 0x7f) | 0x80)
+            n >>= 7
+        out.append(n)
+
+    def string(self, s):
+        b = s.encode("utf-8")
+        self.varint(len(b))
+        self._out += b
+
+    def value(self, val):
+        out = self._out
+        if val is None:
+            out.append(_BT_NONE)
+        elif val is False:
+            out.append(_BT_FALSE)
+        elif val is True:
+            out.append(_BT_TRUE)
+        elif isinstance(val, str):
+            if val in _binary_keyword_index:
+                out.append(_BT_KEYWORD)
+                self.varint(_binary_keyword_index[val])
+            elif val in self._elements:
+                out.append(_BT_ELEMENT)
+                self.varint(self._elements[val])
+            elif val in self._strings:
+                out.append(_BT_STRREF)
+                self.varint(self._strings[val])
+            else:
+                out.append(_BT_STR)
+                self.string(val)
+                self._strings[val] = len(self._strings)
+        elif isinstance(val, int):
+            out.append(_BT_INT)
+            # zigzag, so small negative numbers stay short
+            self.varint(val << 1 if val >= 0 else ((-val) << 1) - 1)
+        elif isinstance(val, float):
+            out.append(_BT_FLOAT)
+            out += struct.pack("<d", val)
+        elif isinstance(val, (list, tuple)):
+            out.append(_BT_LIST)
+            self.varint(len(val))
+            for item in val:
+                self.value(item)
+        elif isinstance(val, dict):
+            out.append(_BT_DICT)
+            self.varint(len(val))
+            for k, v in val.items():
+                self.value(k)
+                self.value(v)
+        else:
+            raise ValueError("Cannot encode "+repr(val))
+
+    def message(self, msg):
+        if isinstance(msg, Envelope):
+            d = msg._to_dict(token_only=self._token_only, contents=False)
+            key = KEY_CONTENTS
+        elif isinstance(msg, Statement) and msg.count_result_rows() > 0:
+            d = msg._to_dict(token_only=self._token_only, values=False)
+            key = KEY_RESULTVALUES
+        else:
+            self.value(msg.to_dict(token_only=self._token_only))
+            return
+
+        self._out.append(_BT_DICT)
+        self.varint(len(d) + 1)
+        for k, v in d.items():
+            self.value(k)
+            self.value(v)
+        self.value(key)
+        if key == KEY_CONTENTS:
+            self._out.append(_BT_LIST)
+            self.varint(len(msg))
+            for inner in msg.messages():
+                self.message(inner)
+        else:
+            self.columns(msg)
+
+    def columns(self, stmt):
+        nrows = stmt.count_result_rows()
+        self._out.append(_BT_COLUMNS)
+        self.varint(nrows)
+        self.varint(stmt.count_result_columns())
+        for col in stmt._resultcolumns.values():
+            self.column(col, nrows)
+
+    def column(self, col, nrows):
+        out = self._out
+        if col._raw is None:
+            kind = _binary_column_kinds.get(type(col._vals), _BC_VALUES)
+        else:
+            kind = _BC_VALUES
+
+        out.append(kind)
+        if kind == _BC_VALUES:
+            # values as they would appear in JSON
+            for i in range(nrows):
+                try:
+                    self.value(col._unparse(i))
+                except IndexError:
+                    self.value(VALUE_NONE)
+            return
+
+        store = col._vals
+        pad = nrows - len(store)
+        out += _padded_bits(store._nulls, pad, True)._bits
+        if kind == _BC_ADDRESS:
+            out += store._data
+            out += bytes(16 * pad)
+            out += _padded_bits(store._v4, pad, False)._bits
+        else:
+            out += _le_array(store._data).tobytes()
+            out += bytes(store._data.itemsize * pad)
+
+    def getvalue(self):
+        return bytes(self._out)
+
+class _DecodedColumns(object):
+    """
+    Result values decoded from the binary encoding, as a list of
+    column stores, to be loaded into the columns of a Result.
+
+    """
+    def __init__(self, stores):
+        super().__init__()
+        self._stores = stores
+
+    def load(self, columns):
+        columns = list(columns)
+        if len(columns) != len(self._stores):
+            raise ValueError("Result value count does not match result columns")
+        for col, store in zip(columns, self._stores):
+            col.clear()
+            if type(store) is type(col._vals):
+                # same native representation; take the store as is
+                col._vals = store
+            else:
+                for i, val in enumerate(store):
+                    col[i] = val
+
+class _BinaryReader(object):
+    """
+    Decodes mPlane messages from the binary encoding; see parse_binary().
+
+    """
+    def __init__(self, buf):
+        super().__init__()
+        self._buf = buf
+        self._pos = len(_BINARY_MAGIC)
+        if bytes(buf[:self._pos]) != _BINARY_MAGIC:
+            raise ValueError("Not a binary mPlane message")
+
+        # element indices refer to the sender's registry, which must
+        # match our own copy of it
+        uri = self.string()
+        revision = self.varint() - 1
+        reg = registry_for_uri(uri)
+        if revision != (-1 if reg._revision is None else reg._revision):
+            raise ValueError("Binary mPlane message refers to revision "+
+                             str(revision)+" of registry "+uri+
+                             ", have "+str(reg._revision))
+        self._elements = reg._element_names()[0]
+        self._strings = []
+
+    def take(self, n):
+        if self._pos + n > len(self._buf):
+            raise ValueError("Truncated binary mPlane message")
+        b = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return b
+
+    def varint(self):
+        buf = self._buf
+        n = 0
+        shift = 0
+        while True:
+            if self._pos >= len(buf):
+                raise ValueError("Truncated binary mPlane message")
+            b = buf[self._pos]
+            self._pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def string(self):
+        return bytes(self.take(self.varint())).decode("utf-8")
+
+    def value(self):
+        tag = self.take(1)[0]
+        if tag == _BT_NONE:
+            return None
+        elif tag == _BT_FALSE:
+            return False
+        elif tag == _BT_TRUE:
+            return True
+        elif tag == _BT_INT:
+            n = self.varint()
+            return -((n + 1) >> 1) if n & 1 else n >> 1
+        elif tag == _BT_FLOAT:
+            return struct.unpack("<d", self.take(8))[0]
+        elif tag == _BT_STR:
+            s = self.string()
+            self._strings.append(s)
+            return s
+        elif tag == _BT_STRREF:
+            try:
+                return self._strings[self.varint()]
+            except IndexError:
+                raise ValueError("Invalid string reference in binary mPlane message")
+        elif tag == _BT_LIST:
+            return [self.value() for i in range(self.varint())]
+        elif tag == _BT_DICT:
+            d = collections.OrderedDict()
+            for i in range(self.varint()):
+                k = self.value()
+                d[k] = self.value()
+            return d
+        elif tag == _BT_KEYWORD:
+            try:
+                return _BINARY_KEYWORDS[self.varint()]
+            except IndexError:
+                raise ValueError("Unknown keyword in binary mPlane message")
+        elif tag == _BT_ELEMENT:
+            try:
+                return self._elements[self.varint()]
+            except IndexError:
+                raise ValueError("Unknown element in binary mPlane message")
+        elif tag == _BT_COLUMNS:
+            nrows = self.varint()
+            return _DecodedColumns([self.column(nrows)
+                                    for i in range(self.varint())])
+        else:
+            raise ValueError("Invalid tag "+str(tag)+" in binary mPlane message")
+
+    def bitmap(self, nrows):
+        bits = _Bitmap()
+        bits._bits = bytearray(self.take((nrows + 7) // 8))
+        bits._len = nrows
+        return bits
+
+    def column(self, nrows):
+        kind = self.take(1)[0]
+        if kind == _BC_VALUES:
+            return [self.value() for i in range(nrows)]
+        elif kind not in _binary_column_stores:
+            raise ValueError("Invalid column encoding in binary mPlane message")
+
+        store = _binary_column_stores[kind]()
+        store._nulls = self.bitmap(nrows)
+        if kind == _BC_ADDRESS:
+            store._data = bytearray(self.take(16 * nrows))
+            store._v4 = self.bitmap(nrows)
+        else:
+            store._data.frombytes(self.take(store._data.itemsize * nrows))
+            store._data = _le_array(store._data)
+        return store
+
+def parse_binary(buf):
+    """
+    Parse a message in the binary encoding (see unparse_binary()) from
+    a bytes-like object, and return the associated mPlane message.
+
+    """
+    return message_from_dict(_BinaryReader(buf).value())
+
+def unparse_binary(msg, token_only=False):
+    """
+    Transform an mPlane message into the compact binary encoding,
+    returning bytes. This carries the same content as the JSON
+    representation, but refers to protocol keys and registry elements
+    by index, and encodes natural, real, time, and address result
+    values in their native representation instead of as strings.
+    Element names are looked up in the base registry, which the
+    receiver must have at the same revision.
+
+    """
+    writer = _BinaryWriter(_base_registry, token_only=token_only)
+    writer.message(msg)
+    return writer.getvalue()
+
+def test_binary():
+    initialize_registry()
+    res = Result(verb="measure", when="2017-12-24 22:18:42 ... 2017-12-24 22:19:42")
+    res.add_parameter("destination.ip4", val="10.0.37.2")
+    res.add_result_column("time")
+    res.add_result_column("source.ip6")
+    res.add_result_column("delay.twoway.icmp.us")
+    res.add_result_column("fps.achieved")
+    res.add_result_column("source.interface")
+    for i in range(100):
+        res.set_result_value("time", datetime(2017, 12, 24, 22, 18, 42, i), i)
+        res.set_result_value("source.ip6", "2001:db8::" + str(i), i)
+        res.set_result_value("fps.achieved", i / 3, i)
+        res.set_result_value("source.interface", "eth" + str(i % 4), i)
+        if i != 17:
+            res.set_result_value("delay.twoway.icmp.us", -i if i % 3 else i, i)
+    res.set_result_value("source.ip6", "10.0.0.1", 3)
+    res.add_metadata("System_type", "ping")
+
+    env = Envelope(token="feedbeef", label="ping-0")
+    env.append_message(res)
+    env.append_message(Exception(token="feedbeef", errmsg="oops"))
+    env.append_message(Envelope())
+
+    for msg in (res, env, Result(dictval=res.to_dict(token_only=True))):
+        binmsg = unparse_binary(msg)
+        assert unparse_json(parse_binary(binmsg)) == unparse_json(msg)
+    assert len(unparse_binary(res)) * 2 < len(unparse_json(res))
+
+    # times without a native representation fall back to strings
+    res.set_result_value("time", time_now, 99)
+    assert unparse_json(parse_binary(unparse_binary(res))) == unparse_json(res)
+
+    # natively encoded columns are taken over as is
+    clires = parse_binary(unparse_binary(res))
+    assert isinstance(clires._resultcolumns["fps.achieved"]._vals, _RealColumn)
+    assert clires._resultcolumns["delay.twoway.icmp.us"][17] is None
+    assert clires._resultcolumns["delay.twoway.icmp.us"][5] == -5
+    assert clires._resultcolumns["source.ip6"][3] == ip_address("10.0.0.1")
+
+    try:
+        parse_binary(unparse_binary(env)[:-5])
+        assert False
+    except ValueError:
+        pass
+
 def parse_yaml(ystr):
     return mplane.model.message_from_dict(yaml.load(ystr))
 
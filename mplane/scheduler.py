@@ -28,11 +28,68 @@ results within the mPlane reference component.
 
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
+import collections
+import concurrent.futures
+import configparser
+import heapq
+import importlib
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
 import threading
+import time
+import weakref
 import mplane.model
 import mplane.azn
 
+# Number of results of a repeated specification retained by default
+DEFAULT_MAX_RESULTS = 1000
+
+# Number of threads running jobs by default
+DEFAULT_WORKERS = 16
+
+# Metadata element noting how long a job waited for a worker
+QUEUE_WAIT_ELEMENT = "delay.queue.us"
+
+# Jobs kept by default: seconds after they finished, seconds after their
+# results were last returned, and number of jobs at most
+DEFAULT_JOB_TTL = 3600
+DEFAULT_REPLIED_JOB_TTL = 300
+DEFAULT_MAX_JOBS = 10000
+
+# Seconds between job prunings
+PRUNE_INTERVAL = 60
+
+# Number of tokens of removed jobs remembered
+_EVICTED_TOKENS_MAX = 10000
+
+# Reasons to reply to a redemption or interrupt with an Exception
+UNKNOWN_JOB_MSG = "Unknown job"
+EVICTED_JOB_MSG = "Job evicted"
+
+# Result retention limits, as MultiJob keyword arguments, and how to
+# read them from a configuration value
+_RETENTION_KEYS = (("max_results", int),
+                   ("max_result_age", float),
+                   ("max_result_bytes", int))
+
+def retention_limits(section, prefix):
+    """
+    Returns the result retention limits given in a configuration section
+    by the keys with the given prefix (e.g. scheduler_max_result_age),
+    as keyword arguments for MultiJob.
+
+    """
+    limits = {}
+    for (key, conv) in _RETENTION_KEYS:
+        if prefix + key in section:
+            limits[key] = conv(section[prefix + key])
+    return limits
+
 class Service(object):
     """
     A Service binds some runnable code to an
@@ -78,6 +135,587 @@ class Service(object):
     def __repr__(self):
         return "<Service for "+repr(self._capability)+">"
 
+class AsyncService(Service):
+    """
+    A Service whose run() is a coroutine. The scheduler runs it as a task
+    on a shared asyncio event loop, so a measurement waiting for a
+    subprocess or a socket does not take up a thread of its own.
+
+    To use asynchronous services with an mPlane scheduler, inherit from
+    mplane.scheduler.AsyncService and implement run().
+
+    """
+
+    async def run(self, specification, interrupted):
+        """
+        Run this service given a specification which matches the capability.
+        This is called by the scheduler, and should be implemented by
+        a concrete subclass of AsyncService.
+
+        The implementation should extract its parameters from a given
+        mplane.model.Specification, and return its result values in a
+        mplane.model.Result derived therefrom.
+
+        When the specification is interrupted, the interrupted
+        asyncio.Event is set, and the task running this method is
+        cancelled. The implementation should then catch the
+        asyncio.CancelledError raised where it is waiting, terminate its
+        processing in an orderly fashion and return its results.
+
+        """
+        raise NotImplementedError("Cannot instantiate an abstract AsyncService")
+
+
+class Timer(object):
+    """
+    A function scheduled to be called by a TimerQueue;
+    returned by TimerQueue.call_later().
+
+    """
+    __slots__ = ("deadline", "function", "args", "_queue")
+
+    def __init__(self, queue, deadline, function, args):
+        self._queue = queue
+        self.deadline = deadline
+        self.function = function
+        self.args = args
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+    def cancel(self):
+        """Cancels the call if it has not been made yet."""
+        self._queue.cancel(self)
+
+class TimerQueue(object):
+    """
+    Calls functions after given delays, from a single thread started on
+    first use, keeping the pending calls in a heap. Scheduling a call
+    takes O(log n) time; cancelled calls are only marked, and dropped
+    when they come due or when they make up half of the heap.
+
+    The functions are called one after another, and should return
+    quickly; anything taking longer should be handed to another thread.
+
+    The time by which calls are late is recorded (see stats()).
+
+    """
+
+    def __init__(self):
+        super(TimerQueue, self).__init__()
+        self._heap = []
+        self._cancelled = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._fired = 0
+        self._lateness_sum = 0.0
+        self._lateness_max = 0.0
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def call_later(self, delay, function, *args):
+        """
+        Calls function with the given arguments after delay seconds.
+        Returns a Timer which can be used to cancel the call.
+
+        """
+        timer = Timer(self, time.monotonic() + delay, function, args)
+        with self._cond:
+            heapq.heappush(self._heap, timer)
+            if self._heap[0] is timer:
+                self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="mplane-timers",
+                                                daemon=True)
+                self._thread.start()
+        return timer
+
+    def cancel(self, timer):
+        """Cancels a call scheduled with call_later()."""
+        with self._cond:
+            if timer.function is None:
+                return
+            timer.function = None
+            timer.args = None
+            self._cancelled += 1
+            if self._cancelled * 2 > len(self._heap):
+                self._heap = [t for t in self._heap if t.function is not None]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _next_due(self):
+        """
+        Waits until the earliest call is due, then removes it from the
+        heap and returns it. Must be called with the condition held.
+
+        """
+        while True:
+            if not self._heap:
+                self._cond.wait()
+                continue
+
+            timer = self._heap[0]
+            if timer.function is None:
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+                continue
+
+            delay = timer.deadline - time.monotonic()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+
+            heapq.heappop(self._heap)
+            return timer
+
+    def _run(self):
+        while True:
+            with self._cond:
+                timer = self._next_due()
+                (function, args) = (timer.function, timer.args)
+                timer.function = None
+
+                lateness = time.monotonic() - timer.deadline
+                self._fired += 1
+                self._lateness_sum += lateness
+                self._lateness_max = max(self._lateness_max, lateness)
+
+            try:
+                function(*args)
+            except Exception as e:
+                print("Timer call to "+repr(function)+" failed: "+str(e))
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of calls pending and made,
+        and the mean and maximum time in seconds by which they were late.
+
+        """
+        with self._cond:
+            mean = 0.0
+            if self._fired:
+                mean = self._lateness_sum / self._fired
+            return {"pending": len(self),
+                    "fired": self._fired,
+                    "lateness_mean": mean,
+                    "lateness_max": self._lateness_max}
+
+# The TimerQueue used to start and interrupt all jobs
+_timers = TimerQueue()
+
+def test_timer_queue():
+    queue = TimerQueue()
+    calls = []
+    for (delay, name) in [(0.3, "c"), (0.1, "a"), (0.2, "b")]:
+        queue.call_later(delay, calls.append, name)
+    cancelled = queue.call_later(0.15, calls.append, "x")
+    cancelled.cancel()
+    cancelled.cancel()
+    # a failing call does not stop the ones after it
+    queue.call_later(0.05, calls.pop)
+    assert len(queue) == 4
+
+    assert _wait_until(lambda: len(calls) == 3)
+    time.sleep(0.1)
+    assert calls == ["a", "b", "c"]
+    stats = queue.stats()
+    assert (stats["pending"], stats["fired"]) == (0, 4)
+    assert 0 <= stats["lateness_mean"] <= stats["lateness_max"] < 1
+
+    # cancelled calls are dropped once they make up half of the heap
+    timers = [queue.call_later(60, calls.append, i) for i in range(10)]
+    for timer in timers[:5]:
+        timer.cancel()
+    assert (len(queue._heap), len(queue)) == (10, 5)
+    timers[5].cancel()
+    assert (len(queue._heap), len(queue)) == (4, 4)
+
+class EventLoopThread(object):
+    """
+    Runs an asyncio event loop on a thread of its own, started on first
+    use, to which other threads can hand functions to call.
+
+    As with a WorkerPool, the number of jobs of a service running at
+    once as tasks on the loop can be limited (see set_limit()); further
+    jobs wait in the order they were started.
+
+    """
+
+    def __init__(self):
+        super(EventLoopThread, self).__init__()
+        self._loop = None
+        self._lock = threading.Lock()
+        # jobs waiting to run by service, and the number running;
+        # only used on the loop's thread
+        self._waiting = {}
+        self._running = {}
+        self._limits = {}
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def call_soon(self, function, *args):
+        """Calls function with the given arguments on the loop's thread."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._run, name="mplane-asyncio",
+                                 daemon=True).start()
+        self._loop.call_soon_threadsafe(function, *args)
+
+    def set_limit(self, service, limit):
+        """Limits the number of jobs of a service running at once."""
+        with self._lock:
+            self._limits[service] = int(limit)
+
+    def submit(self, job):
+        """Runs the job of an AsyncService as a task on the loop."""
+        self.call_soon(self._submit, job)
+
+    def _submit(self, job):
+        with self._lock:
+            limit = self._limits.get(job.service)
+        running = self._running.get(job.service, 0)
+        if limit and running >= limit:
+            job._queued_at = datetime.utcnow()
+            self._waiting.setdefault(job.service,
+                                     collections.deque()).append(job)
+            return
+        self._running[job.service] = running + 1
+        self._start(job)
+
+    def _start(self, job):
+        job._start_task()
+        job._task.add_done_callback(lambda task: self._done(job))
+
+    def _done(self, job):
+        # start the next job of the service waiting, if any
+        waiting = self._waiting.get(job.service)
+        if waiting:
+            self._start(waiting.popleft())
+        else:
+            self._running[job.service] -= 1
+
+# The EventLoopThread running the jobs of all AsyncServices
+_event_loop = EventLoopThread()
+
+def timer_stats():
+    """
+    Returns statistics about the timers starting and interrupting
+    jobs (see TimerQueue.stats()).
+
+    """
+    return _timers.stats()
+
+class WorkerPool(object):
+    """
+    Runs jobs on up to a given number of threads, started as needed,
+    in the order the jobs were submitted. A job whose service already
+    runs as many jobs as its limit allows (see set_limit()) waits,
+    without holding up the jobs of other services.
+
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        super(WorkerPool, self).__init__()
+        self._workers = int(workers)
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # jobs waiting to run by service, each with its submission number
+        self._waiting = {}
+        self._running = {}
+        self._limits = {}
+        self._threads = 0
+        # threads waiting for a job, and not yet notified of one
+        self._idle = 0
+
+    def set_limit(self, service, limit):
+        """Limits the number of jobs of a service running at once."""
+        with self._cond:
+            self._limits[service] = int(limit)
+
+    def submit(self, job):
+        """Queues a job to run its service as soon as possible."""
+        with self._cond:
+            self._waiting.setdefault(job.service, collections.deque()).append(
+                (next(self._seq), job))
+            if self._idle:
+                self._idle -= 1
+                self._cond.notify()
+            elif self._threads < self._workers:
+                self._threads += 1
+                threading.Thread(target=self._work,
+                                 name="mplane-worker-"+str(self._threads),
+                                 daemon=True).start()
+
+    def waiting(self):
+        """Returns the number of jobs waiting to run."""
+        with self._cond:
+            return sum(len(queue) for queue in self._waiting.values())
+
+    def _take(self):
+        """
+        Removes and returns the earliest submitted job which may run now,
+        or None if there is none. Must be called with the condition held.
+
+        """
+        first = None
+        for (service, queue) in self._waiting.items():
+            limit = self._limits.get(service, 0)
+            if limit and self._running.get(service, 0) >= limit:
+                continue
+            if first is None or queue[0][0] < first[1][0][0]:
+                first = (service, queue)
+
+        if first is None:
+            return None
+
+        (service, queue) = first
+        job = queue.popleft()[1]
+        if not queue:
+            del self._waiting[service]
+        self._running[service] = self._running.get(service, 0) + 1
+        return job
+
+    def _work(self):
+        try:
+            while True:
+                with self._cond:
+                    job = self._take()
+                    while job is None:
+                        self._idle += 1
+                        self._cond.wait()
+                        job = self._take()
+
+                try:
+                    job._run()
+                except Exception as e:
+                    print("Worker failed running "+repr(job)+": "+str(e))
+                finally:
+                    with self._cond:
+                        self._running[job.service] -= 1
+        finally:
+            with self._cond:
+                self._threads -= 1
+
+def _wait_until(predicate, timeout=5):
+    """Waits for predicate() to be true, for testing; returns its value."""
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+class _TestJob(object):
+    """A stand-in for a Job, recording when it runs, for testing."""
+
+    def __init__(self, service, log, duration=0, fail=False):
+        self.service = service
+        self._log = log
+        self._duration = duration
+        self._fail = fail
+
+    def _run(self):
+        self._log.append(self)
+        time.sleep(self._duration)
+        if self._fail:
+            raise ValueError("failed on purpose")
+
+def test_worker_pool():
+    # jobs run in the order they were submitted
+    log = []
+    pool = WorkerPool(1)
+    jobs = [_TestJob("a", log) for i in range(5)]
+    for job in jobs:
+        pool.submit(job)
+    assert _wait_until(lambda: len(log) == 5)
+    assert log == jobs
+
+    # a service over its limit does not hold up other services
+    log = []
+    pool = WorkerPool(3)
+    pool.set_limit("slow", 1)
+    slow = [_TestJob("slow", log, duration=0.3) for i in range(2)]
+    fast = _TestJob("fast", log)
+    for job in slow + [fast]:
+        pool.submit(job)
+    assert _wait_until(lambda: len(log) == 2)
+    assert log == [slow[0], fast]
+    assert pool.waiting() == 1
+    assert _wait_until(lambda: len(log) == 3)
+
+    # a failing job does not cost the pool its thread
+    log = []
+    pool = WorkerPool(2)
+    for i in range(2):
+        pool.submit(_TestJob("a", log, fail=True))
+    assert _wait_until(lambda: len(log) == 2)
+    good = _TestJob("a", log)
+    pool.submit(good)
+    assert _wait_until(lambda: good in log)
+    assert pool._threads == 2
+
+    # jobs submitted while a thread is idle start as many threads as needed
+    log = []
+    pool = WorkerPool(4)
+    pool.submit(_TestJob("a", log))
+    assert _wait_until(lambda: pool._idle == 1)
+    pool.submit(_TestJob("a", log, duration=0.5))
+    pool.submit(_TestJob("a", log, duration=0.5))
+    assert _wait_until(lambda: len(log) == 3, timeout=0.4)
+
+# The services of the component module run by a worker process of a
+# ProcessPool, in the order the module's services() function returns them
+_process_services = None
+
+def _process_init(module, kwargs, registry_uri, registry_preload):
+    global _process_services
+    if registry_preload is not None:
+        mplane.model.preload_registry(registry_preload)
+    mplane.model.initialize_registry(registry_uri)
+    _process_services = importlib.import_module(module).services(**kwargs)
+
+def _process_run(index, specification, interrupt):
+    started_at = datetime.utcnow()
+    result = _process_services[index].run(
+                mplane.model.parse_binary(specification), interrupt.is_set)
+    return (started_at, mplane.model.unparse_binary(result))
+
+class ProcessPool(object):
+    """
+    Runs the jobs of the services of a component module on a given
+    number of worker processes, for services which spend their time
+    computing in Python rather than waiting. Each worker creates the
+    module's services itself, calling its services() function with the
+    given keyword arguments, after initializing the registry as the
+    component did.
+
+    Specifications and results are passed to and from the workers in
+    their binary representation; a job's interrupts are passed on to
+    its worker through an Event held by a multiprocessing manager.
+
+    As with a WorkerPool, the number of jobs of a service running at
+    once can be limited (see set_limit()); further jobs wait in the
+    order they were submitted.
+
+    """
+
+    def __init__(self, processes, module, kwargs, services,
+                 registry_uri=None, registry_preload=None):
+        super(ProcessPool, self).__init__()
+        self._context = multiprocessing.get_context("spawn")
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+                            int(processes), mp_context=self._context,
+                            initializer=_process_init,
+                            initargs=(module, kwargs,
+                                      registry_uri, registry_preload))
+        self._index = {service: i for (i, service) in enumerate(services)}
+        self._manager = None
+        self._lock = threading.Lock()
+        # jobs waiting to run by service, and the number running
+        self._waiting = {}
+        self._running = {}
+        self._limits = {}
+
+    def set_limit(self, service, limit):
+        """Limits the number of jobs of a service running at once."""
+        with self._lock:
+            self._limits[service] = int(limit)
+
+    def _event(self):
+        with self._lock:
+            if self._manager is None:
+                self._manager = self._context.Manager()
+        return self._manager.Event()
+
+    def submit(self, job):
+        """Queues a job to run its service in a worker process."""
+        job._share_interrupt(self._event())
+        with self._lock:
+            running = self._running.get(job.service, 0)
+            limit = self._limits.get(job.service)
+            if limit and running >= limit:
+                self._waiting.setdefault(job.service,
+                                         collections.deque()).append(job)
+                return
+            self._running[job.service] = running + 1
+        self._start(job)
+
+    def _start(self, job):
+        future = self._executor.submit(
+                    _process_run, self._index[job.service],
+                    mplane.model.unparse_binary(job.specification),
+                    job._interrupt)
+        future.add_done_callback(
+                    lambda future: self._done(job, future))
+
+    def _done(self, job, future):
+        # start the next job of the service waiting, if any
+        with self._lock:
+            waiting = self._waiting.get(job.service)
+            if waiting:
+                next_job = waiting.popleft()
+            else:
+                next_job = None
+                self._running[job.service] -= 1
+        if next_job is not None:
+            self._start(next_job)
+        job._process_done(future)
+
+_TEST_PROCESS_MODULE = """
+import mplane.scheduler
+
+def services():
+    service = mplane.scheduler._HoldingService(
+                mplane.scheduler._test_capability())
+    service.held.add("10.0.27.1")
+    return [service]
+"""
+
+def test_process_pool():
+    with tempfile.TemporaryDirectory() as path:
+        with open(os.path.join(path, "_mplane_test_services.py"), "w") as f:
+            f.write(_TEST_PROCESS_MODULE)
+        sys.path.insert(0, path)
+        try:
+            services = importlib.import_module(
+                            "_mplane_test_services").services()
+            pool = ProcessPool(2, "_mplane_test_services", {}, services)
+            pool.set_limit(services[0], 1)
+            jobs = []
+            for destination in ["10.0.27.1", "10.0.27.1", "10.0.27.2"]:
+                spec = _test_specification(services[0].capability(),
+                                           destination)
+                jobs.append(Job(services[0], spec, pool=pool))
+                jobs[-1].schedule()
+
+            # the jobs run one at a time, until interrupted
+            time.sleep(1)
+            assert not any(job.finished() for job in jobs)
+            jobs[0].interrupt()
+            assert _wait_until(jobs[0].finished, timeout=30)
+            time.sleep(0.5)
+            assert not jobs[2].finished()
+            jobs[1].interrupt()
+            assert _wait_until(jobs[2].finished, timeout=30)
+            assert all(isinstance(job.get_reply(), mplane.model.Result)
+                       for job in jobs)
+        finally:
+            sys.path.remove(path)
+            pool._executor.shutdown()
+            pool._manager.shutdown()
+
+def _note_queue_wait(statement, wait):
+    """Notes the time (a timedelta) a job waited for a worker in a statement."""
+    try:
+        statement.add_metadata(QUEUE_WAIT_ELEMENT,
+                               int(wait.total_seconds() * 1000000))
+    except KeyError:
+        # element not in the registry used by the statement
+        pass
+
 
 class Job(object):
     """
@@ -100,8 +738,13 @@ class Job(object):
     specification = None
     receipt = None
     _interrupt = None
+    _interrupt_timer = None
+    _queued_at = None
+    _task = None
+    _interrupted = None
 
-    def __init__(self, service, specification, session=None, callback=None):
+    def __init__(self, service, specification, session=None, callback=None,
+                 pool=None):
         super(Job, self).__init__()
         self.service = service
         self.session = session
@@ -109,32 +752,126 @@ class Job(object):
         self.receipt = mplane.model.Receipt(specification=specification)
         self._interrupt = threading.Event()
         self._callback = callback
+        self._pool = pool
 
     def __repr__(self):
         return "<Job for "+repr(self.specification)+">"
 
     def _run(self):
         self._started_at = datetime.utcnow()
+        if self._queued_at is not None:
+            _note_queue_wait(self.receipt, self._started_at - self._queued_at)
         try:
-            self.result = self.service.run(self.specification,
-                                           self._check_interrupt)
+            result = self.service.run(self.specification,
+                                      self._check_interrupt)
         except Exception as e:
+            self._finish(None, e)
+        else:
+            self._finish(result)
+
+    def _start_task(self):
+        """Starts running an AsyncService as a task; called on the loop."""
+        self._interrupted = asyncio.Event()
+        if self._interrupt.is_set():
+            self._interrupted.set()
+        self._task = asyncio.ensure_future(self._run_task())
+        self._task.add_done_callback(self._task_done)
+        if self._interrupt.is_set():
+            # interrupted before it started: let the service start,
+            # then cancel it as if it had been interrupted while running
+            asyncio.get_event_loop().call_soon(self._interrupt_task)
+
+    async def _run_task(self):
+        self._started_at = datetime.utcnow()
+        return await self.service.run(self.specification, self._interrupted)
+
+    def _task_done(self, task):
+        if task.cancelled():
+            outcome = (None, "interrupted before returning results")
+        elif task.exception() is not None:
+            outcome = (None, task.exception())
+        else:
+            outcome = (task.result(),)
+
+        self._finish_apart(*outcome)
+
+    def _interrupt_task(self):
+        """Interrupts the task running an AsyncService; called on the loop."""
+        if self._task is not None:
+            self._interrupted.set()
+            self._task.cancel()
+
+    def _finish(self, result, error=None):
+        """
+        Records the result returned by the service, or the error
+        it raised instead.
+
+        """
+        if error is None:
+            if self._queued_at is not None and \
+                    isinstance(result, mplane.model.Result):
+                _note_queue_wait(result, self._started_at - self._queued_at)
+            self.result = result
+        else:
             self.exception = mplane.model.Exception(
                             token=self.specification.get_token(),
-                            errmsg=str(e))
+                            errmsg=str(error))
             print("Got exception in _run(), returning "+str(self.exception))
             self._exception_at = datetime.utcnow()
         self._ended_at = datetime.utcnow()
+        if self._interrupt_timer is not None:
+            self._interrupt_timer.cancel()
 
         if self._callback:
             self._callback(self.receipt)
 
+    def _finish_apart(self, result, error=None):
+        """
+        Like _finish(), for threads which must not block: the callback
+        may, e.g. returning results over HTTP, so if there is one, the
+        job is finished from a thread of its own.
+
+        """
+        if self._callback:
+            threading.Thread(target=self._finish, args=(result, error)).start()
+        else:
+            self._finish(result, error)
+
+    def _process_done(self, future):
+        """Records the outcome of running the service in another process."""
+        try:
+            (started_at, result) = future.result()
+        except Exception as e:
+            self._finish_apart(None, e)
+        else:
+            self._started_at = started_at
+            self._finish_apart(mplane.model.parse_binary(result))
+
+    def _share_interrupt(self, event):
+        """
+        Signals interrupts on the given Event, e.g. one shared with
+        another process, from now on.
+
+        """
+        interrupted = self._interrupt.is_set()
+        self._interrupt = event
+        if interrupted:
+            event.set()
+
     def _check_interrupt(self):
         return self._interrupt.is_set()
 
     def _schedule_now(self):
-        # spawn a thread to run the service
-        threading.Thread(target=self._run).start()
+        # run asynchronous services on the event loop; queue other jobs
+        # to run on the pool, if any; relays mostly wait for another
+        # component, so spawn a thread to run those
+        if isinstance(self.service, AsyncService):
+            _event_loop.submit(self)
+        elif self._pool is not None and not hasattr(self.service, 'relay'):
+            self._queued_at = datetime.utcnow()
+            self._pool.submit(self)
+        else:
+            threading.Thread(target=self._run).start()
 
     def schedule(self):
         """
@@ -151,13 +888,13 @@ class Job(object):
 
         # start interrupt timer
         if end_delay is not None and not hasattr(self.service, 'relay'):
-            threading.Timer(end_delay, self.interrupt).start()
+            self._interrupt_timer = _timers.call_later(end_delay, self.interrupt)
             print("Will interrupt "+repr(self)+" after "+str(end_delay)+" sec")
 
         # start start timer
         if start_delay > 0:
             print("Scheduling "+repr(self)+" after "+str(start_delay)+" sec")
-            threading.Timer(start_delay, self._schedule_now).start()
+            _timers.call_later(start_delay, self._schedule_now)
         else:
             print("Scheduling "+repr(self)+" immediately")
             self._schedule_now()
@@ -165,6 +902,8 @@ class Job(object):
     def interrupt(self):
         """Interrupt this job."""
         self._interrupt.set()
+        if isinstance(self.service, AsyncService):
+            _event_loop.call_soon(self._interrupt_task)
 
     def failed(self):
         """A job only fails if it is finished and has no results"""
@@ -191,6 +930,9 @@ class Job(object):
         elif self.finished():
             return self.result
         else:
+            if self._queued_at is not None and self._started_at is None:
+                _note_queue_wait(self.receipt,
+                                 self._replied_at - self._queued_at)
             return self.receipt
 
     def get_token(self):
@@ -206,35 +948,237 @@ class Job(object):
         return self.specification.get_label()
 
 
+def _test_capability(label="test"):
+    mplane.model.initialize_registry()
+    cap = mplane.model.Capability(when="now ... future / 1s", label=label)
+    cap.add_parameter("destination.ip4")
+    cap.add_result_column("delay.twoway.icmp.us")
+    return cap
+
+def _test_specification(cap, destination="10.0.27.2"):
+    spec = mplane.model.Specification(capability=cap)
+    spec.set_parameter_value("destination.ip4", destination)
+    spec.set_when("now + 1m / 1s")
+    return spec
+
+def _test_result(specification):
+    res = mplane.model.Result(specification=specification)
+    res.set_when(mplane.model.When(a=datetime.utcnow()))
+    res.set_result_value("delay.twoway.icmp.us", 1)
+    return res
+
+class _TestService(Service):
+    """Returns a single delay at once, for testing."""
+
+    def run(self, specification, check_interrupt):
+        return _test_result(specification)
+
+class _SleepingService(AsyncService):
+    """Returns a single delay once interrupted, for testing."""
+
+    def __init__(self, capability):
+        super(_SleepingService, self).__init__(capability)
+        self.cancelled = False
+
+    async def run(self, specification, interrupted):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled = interrupted.is_set()
+        return _test_result(specification)
+
+def test_async_service():
+    service = _SleepingService(_test_capability())
+    threads = []
+    job = Job(service, _test_specification(service.capability()),
+              callback=lambda receipt: threads.append(threading.current_thread()))
+    job.schedule()
+    time.sleep(0.1)
+    assert not job.finished()
+
+    job.interrupt()
+    assert _wait_until(lambda: threads)
+    assert service.cancelled
+    assert isinstance(job.get_reply(), mplane.model.Result)
+    # the callback is not called on the event loop's thread
+    assert threads[0].name != "mplane-asyncio"
+
+def test_async_service_interrupted_early():
+    service = _SleepingService(_test_capability())
+    job = Job(service, _test_specification(service.capability()))
+    job.interrupt()
+    job.schedule()
+
+    # the service starts, and is cancelled at once
+    assert _wait_until(job.finished, timeout=1)
+    assert service.cancelled
+    assert isinstance(job.get_reply(), mplane.model.Result)
+
+def test_async_service_concurrency():
+    service = _SleepingService(_test_capability())
+    scheduler = Scheduler()
+    scheduler.add_service(service, concurrency=1)
+    try:
+        jobs = []
+        for i in range(3):
+            spec = _test_specification(service.capability(), "10.0.27.%d" % i)
+            jobs.append(scheduler.jobs[
+                    scheduler.submit_job(None, spec).get_token()])
+        started = lambda: [job._started_at is not None for job in jobs]
+        time.sleep(0.2)
+        assert started() == [True, False, False]
+
+        jobs[0].interrupt()
+        assert _wait_until(lambda: started() == [True, True, False])
+        assert not jobs[1].finished()
+        jobs[1].interrupt()
+        assert _wait_until(lambda: all(started()))
+        jobs[2].interrupt()
+        assert _wait_until(lambda: all(job.finished() for job in jobs))
+    finally:
+        scheduler.close()
+
+class ResultBuffer(object):
+    """
+    Retains the results of a MultiJob in the order they were collected.
+    The oldest results are evicted once more than max_results are held,
+    once they have been held for more than max_age seconds, or once
+    together their JSON representations take more than max_bytes (the
+    latest result is kept in any case). A limit of 0 is not enforced.
+
+    Results are numbered in the order they are collected; first_seq is
+    the number of the oldest result held, i.e. the number of results
+    evicted so far, and evicted_rows counts the result rows among them.
+
+    """
+
+    def __init__(self, max_results=0, max_age=0, max_bytes=0):
+        super(ResultBuffer, self).__init__()
+        self._max_results = int(max_results)
+        self._max_age = timedelta(seconds=float(max_age))
+        self._max_bytes = int(max_bytes)
+        # (collection time, size, message), oldest first
+        self._entries = collections.deque()
+        self._bytes = 0
+        self.first_seq = 0
+        self.evicted_rows = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, msg):
+        """Retains a result, evicting older ones to stay within the limits."""
+        size = 0
+        if self._max_bytes:
+            size = len(mplane.model.unparse_json(msg))
+        self._entries.append((datetime.utcnow(), size, msg))
+        self._bytes += size
+
+        while self._max_results and len(self._entries) > self._max_results:
+            self._evict()
+        while self._max_bytes and self._bytes > self._max_bytes and \
+                len(self._entries) > 1:
+            self._evict()
+        self.expire()
+
+    def expire(self):
+        """Evicts the results held for longer than max_age."""
+        if self._max_age:
+            oldest = datetime.utcnow() - self._max_age
+            while self._entries and self._entries[0][0] < oldest:
+                self._evict()
+
+    def _evict(self):
+        (collected_at, size, msg) = self._entries.popleft()
+        self._bytes -= size
+        self.first_seq += 1
+        if isinstance(msg, mplane.model.Result):
+            self.evicted_rows += msg.count_result_rows()
+
+    def messages(self, start=0):
+        """Returns a list of the results held, from the start-th on."""
+        return [entry[2] for entry in
+                itertools.islice(self._entries, start, None)]
+
+def test_result_buffer():
+    service = _TestService(_test_capability())
+    spec = _test_specification(service.capability())
+    results = [service.run(spec, None) for i in range(4)]
+
+    buf = ResultBuffer(max_results=2)
+    for res in results:
+        buf.append(res)
+    assert buf.messages() == results[2:]
+    assert buf.messages(1) == results[3:]
+    assert (buf.first_seq, buf.evicted_rows) == (2, 2)
+
+    size = len(mplane.model.unparse_json(results[0]))
+    buf = ResultBuffer(max_bytes=size * 2)
+    for res in results:
+        buf.append(res)
+    assert buf.messages() == results[2:]
+
+    # the latest result is kept in any case
+    buf = ResultBuffer(max_bytes=1)
+    for res in results:
+        buf.append(res)
+    assert buf.messages() == results[3:]
+
+    buf = ResultBuffer(max_age=0.1)
+    buf.append(results[0])
+    time.sleep(0.2)
+    buf.append(results[1])
+    assert buf.messages() == results[1:2]
+    time.sleep(0.2)
+    buf.expire()
+    assert len(buf) == 0
+    assert buf.first_seq == 2
+
 class MultiJob(object):
     """
     A MultiJob spawns multiple jobs determined by its schedule.
 
     Each MultiJob will result in multiple result rows, one for each sub-job.
+    If compact is True, the results of the sub-jobs are returned merged
+    into as few Results as possible (see mplane.model.Envelope.compact()),
+    except in replies to a cursor: the client skips the results it
+    already holds by number (see mplane.model.Envelope.merge()).
+    The results are retained within the given limits (see ResultBuffer).
     """
 
     jobs = []
-    results = None
     service = None
     session = None
     specification = None
     receipt = None
     _replied_at = None
+    _ended_at = None
     _scheduling_finished = False
     _subspec_iterator = None
+    _start_timer = None
+    _interrupt_timer = None
 
-    def __init__(self, service, specification, session=None, max_results=0, callback=None):
+    def __init__(self, service, specification, session=None, max_results=0, callback=None,
+                 compact=False, max_result_age=0, max_result_bytes=0, pool=None):
         super(MultiJob, self).__init__()
+        self.jobs = []
+        # guards the running jobs and the results, collected on the
+        # threads the jobs finish on
+        self._lock = threading.RLock()
         self.service = service
         self.session = session
         self.specification = specification
         self.receipt = mplane.model.Receipt(specification=specification)
-        self.results = mplane.model.Envelope(token=specification.get_token(),
-                                             label=specification.get_label(),
-                                             when=specification.when())
+        # temporal scope of the results, fixed when the job is submitted
+        (start, end) = specification.when().datetimes()
+        self._results_when = mplane.model.When(a=start, b=end,
+                                period=specification.when().period())
+        self._results = ResultBuffer(max_results, max_result_age,
+                                     max_result_bytes)
         self._subspec_iterator = specification.subspec_iterator()
-        self._max_results = int(max_results)
         self._callback = callback
+        self._compact = compact
+        self._pool = pool
 
     def __repr__(self):
         return "<MultiJob for "+repr(self.specification)+">"
@@ -246,9 +1190,11 @@ class MultiJob(object):
         new_job = Job(service=self.service,
                       specification=self._subspec,
                       session=self.session,
-                      callback=self._job_callback)
+                      callback=self._job_callback,
+                      pool=self._pool)
 
-        self.jobs.append(new_job)
+        with self._lock:
+            self.jobs.append(new_job)
         new_job.schedule()
 
         self._next_job()
@@ -257,23 +1203,26 @@ class MultiJob(object):
         """
         Gets the next job and schedules it.
         """
+        if self._scheduling_finished:
+            return
+
         try:
             self._subspec = next(self._subspec_iterator)
         except StopIteration:
-            self._scheduling_finished = True
+            self._stop_scheduling()
             return
 
         (start_delay, end_delay) = self._subspec.when().timer_delays()
 
         # if no start_delay for the next run was found we should stop this MultiJob
         if start_delay is None:
-            self._scheduling_finished = True
+            self._stop_scheduling()
             return
 
         # start start timer
         if start_delay > 0:
             print("Scheduling "+repr(self._subspec)+" from "+repr(self)+" after "+str(start_delay)+" sec")
-            threading.Timer(start_delay, self._schedule_job).start()
+            self._start_timer = _timers.call_later(start_delay, self._schedule_job)
         else:
             print("Scheduling "+repr(self._subspec)+" from "+repr(self)+" immediately")
             self._schedule_job()
@@ -289,66 +1238,202 @@ class MultiJob(object):
 
         # if no start_delay for the next run was found we should stop this MultiJob
         if start_delay is None:
-            self._scheduling_finished = True
+            self._stop_scheduling()
             return
 
         # start interrupt timer
         if end_delay is not None:
-            threading.Timer(end_delay, self.interrupt).start()
+            self._interrupt_timer = _timers.call_later(end_delay, self.interrupt)
             print("Will interrupt "+repr(self)+" after "+str(end_delay)+" sec")
 
         # begin scheduling of all jobs
         self._next_job()
 
+    def _stop_scheduling(self):
+        """Schedules no more jobs, noting the end if none is running."""
+        with self._lock:
+            self._scheduling_finished = True
+            self.finished()
+
     def interrupt(self):
-        """Interrupt all jobs."""
-        for job in self.jobs:
+        """Interrupt all jobs, and schedule no more."""
+        self._stop_scheduling()
+        for timer in (self._start_timer, self._interrupt_timer):
+            if timer is not None:
+                timer.cancel()
+        with self._lock:
+            jobs = list(self.jobs)
+        for job in jobs:
             job.interrupt()
 
     def failed(self):
         """A multijob will only fail if it is finished and has no results"""
-        if self.finished() and len(self.results) == 0:
+        if self.finished() and len(self._results) == 0 and \
+                self._results.first_seq == 0:
             return True
 
         return False
 
     def finished(self):
         """Return True if all jobs are complete."""
-        if not self._scheduling_finished:
-            return False
+        with self._lock:
+            if not self._scheduling_finished:
+                return False
 
-        if len(self.jobs) > 0:
-            return False
+            if len(self.jobs) > 0:
+                return False
 
-        return True
-
-    def _collect_results(self):
-        """Stores the last self.max_results results."""
-        for job in self.jobs[:]:
-            if job.failed() or job.finished():
-                self.results.append_message(job.get_reply())
-                self.jobs.remove(job)
+            if self._ended_at is None:
+                self._ended_at = datetime.utcnow()
+            return True
 
-        self.results.trim(self._max_results)
+    def _results_since(self, cursor=None):
+        """
+        Returns an Envelope holding the results retained, or if a
+        cursor is given, those collected after it.
 
-    def get_reply(self):
         """
-        If results are available for this MultiJob, return them.
-        Otherwise, create a receipt from the Specification and return that.
+        first_seq = self._results.first_seq
+        since = None
+        start = 0
+        if cursor is not None:
+            since = max(cursor, first_seq)
+            start = since - first_seq
+
+        env = mplane.model.Envelope(token=self.specification.get_token(),
+                                    label=self.specification.get_label(),
+                                    when=self._results_when)
+        for msg in self._results.messages(start):
+            env.append_message(msg)
+        env.set_cursor(first_seq + len(self._results), since)
+        env.set_evicted(self._results.evicted_rows)
+        return env
+
+    def get_reply(self, cursor=None):
+        """
+        If results are available for this MultiJob, return them;
+        if a cursor from an earlier reply is given, only those
+        collected since. Otherwise, create a receipt from the
+        Specification and return that.
 
         """
-        self._collect_results()
         self._replied_at = datetime.utcnow()
-        if len(self.results) > 0:
-            return self.results
-        else:
-            return self.receipt
+        with self._lock:
+            self._results.expire()
+            if len(self._results) == 0 and self._results.first_seq == 0:
+                return self.receipt
+            reply = self._results_since(cursor)
+
+        if self._compact and cursor is None:
+            reply = reply.compact()
+        return reply
+
+    def _job_callback(self, receipt):
+        """
+        Retains the result of the sub-job which finished with the given
+        receipt, within the limits, and notes the end if it was the last.
+
+        """
+        with self._lock:
+            for job in self.jobs:
+                if job.receipt is receipt:
+                    self.jobs.remove(job)
+                    self._results.append(job.get_reply())
+                    break
+            self.finished()
 
-    def _job_callback(self, arg):
         if self._callback:
             self._callback(self.receipt)
 
 
+def _test_multijob(**kwargs):
+    """
+    Returns a MultiJob of a _TestService, and a function running one
+    of its sub-jobs to completion, for testing.
+
+    """
+    service = _TestService(_test_capability())
+    spec = _test_specification(service.capability())
+    multijob = MultiJob(service, spec, **kwargs)
+
+    def run_job():
+        job = Job(service, spec, callback=multijob._job_callback)
+        multijob.jobs.append(job)
+        job._run()
+
+    return (multijob, run_job)
+
+def test_multijob_results():
+    (multijob, run_job) = _test_multijob(max_results=2)
+    for i in range(4):
+        run_job()
+
+    # results are retained within the limits as the sub-jobs finish
+    assert multijob.jobs == []
+    assert len(multijob._results) == 2
+
+    reply = multijob.get_reply()
+    assert len(reply) == 2
+    assert reply.get_evicted() == 2
+    assert reply.get_cursor() == 4
+
+def test_multijob_cursor():
+    (multijob, run_job) = _test_multijob(max_results=4)
+    assert isinstance(multijob.get_reply(cursor=0), mplane.model.Receipt)
+
+    for i in range(3):
+        run_job()
+    reply = multijob.get_reply()
+    assert (len(reply), reply.get_cursor(), reply.get_since()) == (3, 3, None)
+
+    for i in range(3):
+        run_job()
+    delta = multijob.get_reply(cursor=3)
+    assert (len(delta), delta.get_cursor(), delta.get_since()) == (3, 6, 3)
+    assert delta.get_evicted() == 2
+
+    # a cursor older than the retained results starts at the oldest
+    delta = multijob.get_reply(cursor=0)
+    assert (len(delta), delta.get_cursor(), delta.get_since()) == (4, 6, 2)
+
+    env = mplane.model.parse_json(mplane.model.unparse_json(reply))
+    env.merge(mplane.model.parse_json(mplane.model.unparse_json(
+            multijob.get_reply(cursor=3))))
+    assert len(env) == 6
+
+def test_multijob_cursor_compact():
+    (multijob, run_job) = _test_multijob(max_results=4, compact=True)
+    for i in range(3):
+        run_job()
+    env = multijob.get_reply()
+    assert len(env) == 1
+    assert env.get_cursor() == 3
+
+    # the delta is not compacted, so the overlap can be skipped
+    for i in range(3):
+        run_job()
+    delta = multijob.get_reply(cursor=2)
+    assert (len(delta), delta.get_since()) == (4, 2)
+    env.merge(delta)
+    assert sum(msg.count_result_rows() for msg in env.messages()) == 6
+    assert [msg.count_result_rows() for msg in env.compact().messages()] == [6]
+
+def _prune_periodically(scheduler_ref):
+    """
+    Prunes the jobs of a Scheduler, then calls itself again later,
+    until the Scheduler is closed or no longer referenced.
+
+    """
+    scheduler = scheduler_ref()
+    if scheduler is None or scheduler._prune_timer is None:
+        return
+    try:
+        scheduler.prune_jobs()
+    finally:
+        if scheduler._prune_timer is not None:
+            scheduler._prune_timer = _timers.call_later(
+                    PRUNE_INTERVAL, _prune_periodically, scheduler_ref)
+
 class Scheduler(object):
     """
     Scheduler implements the common runtime of a Component within the
@@ -360,22 +1445,67 @@ class Scheduler(object):
     def __init__(self, config=None):
         super(Scheduler, self).__init__()
 
+        self._retention = {"max_results": DEFAULT_MAX_RESULTS}
+        self._compact_results = False
+        workers = DEFAULT_WORKERS
+        job_ttl = DEFAULT_JOB_TTL
+        replied_job_ttl = DEFAULT_REPLIED_JOB_TTL
+        self._max_jobs = DEFAULT_MAX_JOBS
+
         if config:
             self.azn = mplane.azn.Authorization(config)
 
-            if "component" not in config.sections() or \
-                    "scheduler_max_results" not in config["component"]:
-                self._max_results = 0
-            else:
-                self._max_results = \
-                    int(config["component"]["scheduler_max_results"])
+            if "component" in config.sections():
+                self._retention.update(
+                    retention_limits(config["component"], "scheduler_"))
+                self._compact_results = config["component"].getboolean(
+                    "scheduler_compact_results", fallback=False)
+                workers = config["component"].getint(
+                    "scheduler_workers", fallback=DEFAULT_WORKERS)
+                job_ttl = config["component"].getfloat(
+                    "scheduler_job_ttl", fallback=DEFAULT_JOB_TTL)
+                replied_job_ttl = config["component"].getfloat(
+                    "scheduler_replied_job_ttl",
+                    fallback=DEFAULT_REPLIED_JOB_TTL)
+                self._max_jobs = config["component"].getint(
+                    "scheduler_max_jobs", fallback=DEFAULT_MAX_JOBS)
         else:
-            self._max_results = 0
             self.azn = mplane.azn.Authorization()
 
+        # the pool running jobs, unless every job runs on its own thread
+        self._pool = None
+        if workers > 0:
+            self._pool = WorkerPool(workers)
+
         self.services = []
-        self.jobs = {}
+        # jobs by token, least recently used first
+        self.jobs = collections.OrderedDict()
+        self._jobs_lock = threading.RLock()
+        self._job_ttl = timedelta(seconds=job_ttl)
+        self._replied_job_ttl = timedelta(seconds=replied_job_ttl)
+        # tokens of removed jobs, and how many were removed for which reason
+        self._evicted_tokens = collections.OrderedDict()
+        self._evictions = {"expired": 0, "replied": 0, "lru": 0}
         self._capability_cache = {}
+        # services by capability schema digest, then by temporal scope,
+        # each with its position in self.services
+        self._service_index = {}
+        # result retention limits overriding the above, by capability token
+        self._service_retention = {}
+        # pools running the jobs of particular services
+        self._service_pools = {}
+
+        # the timer pruning jobs, which holds no reference to the scheduler
+        self._prune_timer = None
+        if self._job_ttl or self._replied_job_ttl:
+            self._prune_timer = _timers.call_later(
+                    PRUNE_INTERVAL, _prune_periodically, weakref.ref(self))
+
+    def close(self):
+        """Stops pruning jobs periodically."""
+        if self._prune_timer is not None:
+            self._prune_timer.cancel()
+            self._prune_timer = None
 
     def process_message(self, user, msg, session=None, callback=None):
         """
@@ -391,24 +1521,26 @@ class Scheduler(object):
             reply = self.submit_job(user, specification=msg, session=session, callback=callback)
         elif isinstance(msg, mplane.model.Redemption):
             job_key = msg.get_token()
-            if job_key in self.jobs:
-                job = self.jobs[job_key]
-                reply = job.get_reply()
+            job = self._use_job(job_key)
+            if job is not None:
+                if isinstance(job, MultiJob):
+                    reply = job.get_reply(cursor=msg.get_cursor())
+                else:
+                    reply = job.get_reply()
                 if job.finished():
-                    self.jobs.pop(job_key, None)
+                    with self._jobs_lock:
+                        self.jobs.pop(job_key, None)
             else:
-                reply = mplane.model.Exception(token=job_key,
-                errmsg="Unknown job")
+                reply = self._unknown_job(job_key)
         elif isinstance(msg, mplane.model.Interrupt):
             job_key = msg.get_token()
-            if job_key in self.jobs:
-                job = self.jobs[job_key]
+            job = self._use_job(job_key)
+            if job is not None:
                 print("Interrupting " + job.specification.get_label())
                 job.interrupt()
                 reply = job.get_reply()
             else:
-                reply = mplane.model.Exception(token=job_key,
-                errmsg="Unknown job")
+                reply = self._unknown_job(job_key)
         else:
             print("exception")
             reply = mplane.model.Exception(token=msg.get_token(),
@@ -416,12 +1548,55 @@ class Scheduler(object):
 
         return reply
 
-    def add_service(self, service):
-        """Add a service to this Scheduler"""
+    def add_service(self, service, retention=None, concurrency=None, pool=None):
+        """
+        Add a service to this Scheduler, optionally with result retention
+        limits for its repeated specifications (see retention_limits()),
+        with a limit on the number of its jobs running at once, and with
+        a pool other than the scheduler's (e.g. a ProcessPool) to run
+        its jobs on.
+
+        """
         print("Added "+repr(service))
         self.services.append(service)
         cap = service.capability()
         self._capability_cache[cap.get_token()] = cap
+        if retention:
+            self._service_retention[cap.get_token()] = retention
+        if concurrency and isinstance(service, AsyncService):
+            _event_loop.set_limit(service, concurrency)
+        elif concurrency:
+            if pool is None and self._pool is None:
+                # jobs run on threads of their own; limit those of the
+                # service by running them on a pool of their own
+                pool = WorkerPool(concurrency)
+            (pool or self._pool).set_limit(service, concurrency)
+        if pool is not None:
+            self._service_pools[service] = pool
+        scopes = self._service_index.setdefault(cap._schema_hash(), {})
+        scopes.setdefault(cap.when(), []).append((len(self.services), service))
+
+    def _service_for(self, specification):
+        """
+        Returns the first added Service whose capability the given
+        Specification fulfills, or None if there is none. Only the
+        services with the specification's schema are considered, and
+        the temporal scope is checked once for all those sharing one.
+
+        """
+        scopes = self._service_index.get(specification._schema_hash())
+        if scopes is None:
+            return None
+
+        found = None
+        for (when, services) in scopes.items():
+            if (found is None or services[0][0] < found[0]) and \
+                    specification.when().follows(when):
+                found = services[0]
+
+        if found is None:
+            return None
+        return found[1]
 
     def capability_keys(self):
         """
@@ -444,44 +1619,55 @@ class Scheduler(object):
         a new Job to execute the statement.
 
         """
-        # linearly search the available services
-        for service in self.services:
-            if specification.fulfills(service.capability()):
-                if self.azn.check(service.capability(), user):
-                    # Found. Create a new job.
-                    print(repr(service)+" matches "+repr(specification))
-                    if (specification.when().is_repeated() and
-                        # the service is not a RelayService from supervisor.py,
-                        # handle it as a normal multijob
-                        not hasattr(service, 'relay')):
-                        new_job = MultiJob(service=service,
-                                           specification=specification,
-                                           session=session,
-                                           max_results=self._max_results,
-                                           callback=callback)
-                    else:
-                        new_job = Job(service=service,
-                                      specification=specification,
-                                      session=session,
-                                      callback=callback)
-
-                    # Key by the receipt's token, and return
-                    job_key = new_job.receipt.get_token()
-                    if job_key in self.jobs:
-                        # Job already running. Return receipt
-                        print(repr(self.jobs[job_key])+" already running")
-                        return self.jobs[job_key].receipt
-
-                    # Keep track of the job and return receipt
+        service = self._service_for(specification)
+        if service is not None:
+            if self.azn.check(service.capability(), user):
+                # Found. Create a new job.
+                print(repr(service)+" matches "+repr(specification))
+                pool = self._service_pools.get(service, self._pool)
+                if (specification.when().is_repeated() and
+                    # the service is not a RelayService from supervisor.py,
+                    # handle it as a normal multijob
+                    not hasattr(service, 'relay')):
+                    retention = dict(self._retention)
+                    retention.update(self._service_retention.get(
+                                        service.capability().get_token(), {}))
+                    new_job = MultiJob(service=service,
+                                       specification=specification,
+                                       session=session,
+                                       callback=callback,
+                                       compact=self._compact_results,
+                                       pool=pool,
+                                       **retention)
+                else:
+                    new_job = Job(service=service,
+                                  specification=specification,
+                                  session=session,
+                                  callback=callback,
+                                  pool=pool)
+
+                # Key by the receipt's token, and return
+                job_key = new_job.receipt.get_token()
+                running_job = self._use_job(job_key)
+                if running_job is not None:
+                    # Job already running. Return receipt
+                    print(repr(running_job)+" already running")
+                    return running_job.receipt
+
+                # Keep track of the job and return receipt
+                with self._jobs_lock:
                     self.jobs[job_key] = new_job
-                    new_job.schedule()
-                    print("Returning "+repr(new_job.receipt))
-                    return new_job.receipt
-
-                # user not authorized to request the capability
-                print("Not allowed to request this capability: " + repr(specification))
-                return mplane.model.Exception(token=specification.get_token(),
-                            errmsg="User has no permission to request this capability")
+                    self._evicted_tokens.pop(job_key, None)
+                    while self._max_jobs and len(self.jobs) > self._max_jobs:
+                        self._evict_job(self._lru_job_key(), "lru")
+                new_job.schedule()
+                print("Returning "+repr(new_job.receipt))
+                return new_job.receipt
+
+            # user not authorized to request the capability
+            print("Not allowed to request this capability: " + repr(specification))
+            return mplane.model.Exception(token=specification.get_token(),
+                        errmsg="User has no permission to request this capability")
 
         # fall-through, no job
         print("No service for "+repr(specification))
@@ -496,11 +1682,264 @@ class Scheduler(object):
         """
         return self.jobs[msg.get_token()]
 
+    def _use_job(self, job_key):
+        """
+        Returns the job with the given token, marking it as the most
+        recently used, or None if there is no such job.
+
+        """
+        with self._jobs_lock:
+            job = self.jobs.get(job_key)
+            if job is not None:
+                self.jobs.move_to_end(job_key)
+            return job
+
+    def _unknown_job(self, job_key):
+        """
+        Returns an Exception for a message referring to a job not held,
+        telling apart jobs removed by prune_jobs() or to keep within
+        the maximum number of jobs.
+
+        """
+        if job_key in self._evicted_tokens:
+            return mplane.model.Exception(token=job_key, errmsg=EVICTED_JOB_MSG)
+        return mplane.model.Exception(token=job_key, errmsg=UNKNOWN_JOB_MSG)
+
+    def _lru_job_key(self):
+        """
+        Returns the token of the least recently used job which is done,
+        or if every job is still running, of the least recently used one.
+
+        """
+        for (job_key, job) in self.jobs.items():
+            if job.failed() or job.finished():
+                return job_key
+        return next(iter(self.jobs))
+
+    def _evict_job(self, job_key, reason):
+        """Removes a job, interrupting it if still running."""
+        job = self.jobs.pop(job_key)
+        if not (job.failed() or job.finished()):
+            job.interrupt()
+        print("Evicting "+repr(job)+" ("+reason+")")
+        self._evicted_tokens[job_key] = reason
+        if len(self._evicted_tokens) > _EVICTED_TOKENS_MAX:
+            self._evicted_tokens.popitem(last=False)
+        self._evictions[reason] += 1
+
     def prune_jobs(self):
         """
-        Currently does nothing. Will remove Jobs which are
-        finished and whose Results have been retrieved
-        from the scheduler in a future version.
+        Removes the Jobs which finished longer ago than the job TTL, and
+        those whose results were returned after they finished, last
+        longer ago than the replied job TTL. Called periodically.
+
+        Returns the number of jobs removed.
 
         """
-        pass
+        now = datetime.utcnow()
+        evicted = 0
+        with self._jobs_lock:
+            for (job_key, job) in list(self.jobs.items()):
+                if not (job.failed() or job.finished()) or \
+                        job._ended_at is None:
+                    continue
+
+                if self._job_ttl and now - job._ended_at > self._job_ttl:
+                    reason = "expired"
+                elif self._replied_job_ttl and \
+                        job._replied_at is not None and \
+                        job._replied_at >= job._ended_at and \
+                        now - job._replied_at > self._replied_job_ttl:
+                    reason = "replied"
+                else:
+                    continue
+
+                self._evict_job(job_key, reason)
+                evicted += 1
+
+        return evicted
+
+    def job_stats(self):
+        """
+        Returns a dictionary with the number of jobs held, and the number
+        of jobs removed since the scheduler started: because they finished
+        longer ago than the job TTL (expired), because their results were
+        returned longer ago than the replied job TTL (replied), and to keep
+        within the maximum number of jobs (lru).
+
+        """
+        with self._jobs_lock:
+            stats = {"jobs": len(self.jobs)}
+            for (reason, count) in self._evictions.items():
+                stats["evicted_"+reason] = count
+            return stats
+
+class _HoldingService(_TestService):
+    """
+    Returns a single delay once its destination is no longer held,
+    or when interrupted, for testing.
+
+    """
+
+    def __init__(self, capability):
+        super(_HoldingService, self).__init__(capability)
+        self.held = set()
+
+    def run(self, specification, check_interrupt):
+        destination = str(specification.get_parameter_value("destination.ip4"))
+        while destination in self.held and not check_interrupt():
+            time.sleep(0.01)
+        return super(_HoldingService, self).run(specification, check_interrupt)
+
+def _test_scheduler(config, concurrency=None):
+    """Returns a Scheduler with a _HoldingService, for testing."""
+    parser = configparser.ConfigParser()
+    parser.read_string("[component]\n" + config)
+    scheduler = Scheduler(parser)
+    service = _HoldingService(_test_capability())
+    scheduler.add_service(service, concurrency=concurrency)
+    return (scheduler, service)
+
+def _test_redeem(scheduler, receipt):
+    return scheduler.process_message(None,
+                mplane.model.Redemption(receipt=receipt))
+
+def test_scheduler_prune_jobs():
+    (scheduler, service) = _test_scheduler(
+            "scheduler_job_ttl = 0.3\nscheduler_replied_job_ttl = 0.1\n")
+    try:
+        spec = _test_specification(service.capability(), "10.0.27.1")
+        receipt = scheduler.submit_job(None, spec)
+        job = scheduler.jobs[receipt.get_token()]
+        assert _wait_until(job.finished)
+        assert scheduler.prune_jobs() == 0
+
+        # a MultiJob nobody polls ends with its last sub-job
+        (multijob, run_job) = _test_multijob()
+        run_job()
+        multijob._stop_scheduling()
+        assert multijob._ended_at is not None
+        scheduler.jobs[multijob.receipt.get_token()] = multijob
+
+        # replied after it finished
+        polled = scheduler.submit_job(None,
+                    _test_specification(service.capability(), "10.0.27.4"))
+        assert _wait_until(scheduler.jobs[polled.get_token()].finished)
+        scheduler.jobs[polled.get_token()].get_reply()
+
+        time.sleep(0.2)
+        assert scheduler.prune_jobs() == 1
+        time.sleep(0.2)
+        assert scheduler.prune_jobs() == 2
+        assert len(scheduler.jobs) == 0
+        assert _test_redeem(scheduler, receipt)._errmsg == EVICTED_JOB_MSG
+        assert scheduler.job_stats() == {"jobs": 0, "evicted_expired": 2,
+                                         "evicted_replied": 1, "evicted_lru": 0}
+
+        unknown = mplane.model.Receipt(specification=
+                    _test_specification(service.capability(), "10.0.27.3"))
+        assert _test_redeem(scheduler, unknown)._errmsg == UNKNOWN_JOB_MSG
+    finally:
+        scheduler.close()
+
+def test_scheduler_max_jobs():
+    (scheduler, service) = _test_scheduler("scheduler_max_jobs = 2\n")
+    try:
+        service.held.update(["10.0.27.1", "10.0.27.4", "10.0.27.5"])
+        receipts = []
+        for i in range(1, 6):
+            spec = _test_specification(service.capability(), "10.0.27.%d" % i)
+            receipts.append(scheduler.submit_job(None, spec))
+            job = scheduler.jobs[receipts[-1].get_token()]
+            if i in (2, 3):
+                assert _wait_until(job.finished)
+            if i == 3:
+                # finished jobs are evicted first
+                assert list(scheduler.jobs) == \
+                        [receipts[0].get_token(), receipts[2].get_token()]
+
+        # then the least recently used
+        assert list(scheduler.jobs) == \
+                [receipts[3].get_token(), receipts[4].get_token()]
+        assert [_test_redeem(scheduler, r)._errmsg for r in receipts[:3]] == \
+                [EVICTED_JOB_MSG] * 3
+        assert scheduler.job_stats()["evicted_lru"] == 3
+    finally:
+        service.held.clear()
+        scheduler.close()
+
+def test_scheduler_concurrency():
+    # the limit holds even if every job runs on a thread of its own
+    (scheduler, service) = _test_scheduler("scheduler_workers = 0\n", 1)
+    try:
+        service.held.add("10.0.27.1")
+        jobs = []
+        for destination in ["10.0.27.1", "10.0.27.2"]:
+            spec = _test_specification(service.capability(), destination)
+            jobs.append(scheduler.jobs[
+                    scheduler.submit_job(None, spec).get_token()])
+        time.sleep(0.2)
+        assert jobs[0]._started_at is not None
+        assert jobs[1]._started_at is None
+
+        service.held.clear()
+        assert _wait_until(jobs[1].finished)
+    finally:
+        service.held.clear()
+        scheduler.close()
+
+def test_scheduler_service_for():
+    parser = configparser.ConfigParser()
+    parser.read_string("[TLS]\n[Roles]\ntester = measure\n"
+                       "[Authorizations]\nping-any = measure\n")
+    scheduler = Scheduler(parser)
+    scopes = {"coarse": "now ... future / 10s",
+              "any": "now ... future / 1s",
+              "old": "2000-01-01 00:00:00 ... 2000-01-02 00:00:00 / 1s"}
+    for name in ["old", "coarse", "any", "coarse", "any"]:
+        cap = _test_capability("ping-" + name)
+        cap.set_when(scopes[name])
+        scheduler.add_service(_TestService(cap))
+    try:
+        other = _test_capability()
+        other.add_result_column("packets.lost")
+
+        specs = []
+        for cap in [_test_capability(), other]:
+            for when in ["now + 1m / 10s", "now + 1m / 1s",
+                         "2000-01-01 12:00:00 ... 2000-01-01 13:00:00 / 1s",
+                         "2001-01-01 12:00:00 ... 2001-01-01 13:00:00 / 1s"]:
+                spec = _test_specification(cap)
+                spec.set_when(when, force=True)
+                specs.append(spec)
+
+        # the earliest added service whose capability is fulfilled
+        found = [scheduler._service_for(spec) for spec in specs]
+        assert found == [next((service for service in scheduler.services
+                               if spec.fulfills(service.capability())), None)
+                         for spec in specs]
+        assert found[:4] == [scheduler.services[1], scheduler.services[2],
+                             scheduler.services[0], None]
+        assert found[4:] == [None] * 4
+
+        # only that service is checked for authorization, even if a
+        # later one would be allowed
+        denied = scheduler.submit_job("tester", specs[0])
+        assert isinstance(denied, mplane.model.Exception)
+        allowed = scheduler.submit_job("tester", specs[1])
+        assert isinstance(allowed, mplane.model.Receipt)
+        scheduler.jobs[allowed.get_token()].interrupt()
+    finally:
+        scheduler.close()
+
+def test_scheduler_close():
+    (scheduler, service) = _test_scheduler("scheduler_job_ttl = 1\n")
+    scheduler_ref = weakref.ref(scheduler)
+    timer = scheduler._prune_timer
+    assert timer is not None
+    del scheduler
+    assert scheduler_ref() is None
+
+    (scheduler, service) = _test_scheduler("scheduler_job_ttl = 1\n")
+    scheduler.close()
+    assert scheduler._prune_timer is None
@@ -93,6 +93,9 @@ class BaseSupervisor(object):
             registry_uri = None
         mplane.model.initialize_registry(registry_uri)
 
+        # results are mostly relayed untouched; only decode values on access
+        mplane.model.set_lazy_result_decoding(True)
+
         tls_state = mplane.tls.TlsState(config)
 
         self.from_cli = queue.Queue()
@@ -24,6 +24,37 @@ import mplane.model
 import json
 import urllib3
 
+STREAM_CHUNK_SIZE = 65536
+
+def accepts_mimetype(accept, mimetype):
+    """
+    Returns True if the value of an HTTP Accept header explicitly
+    lists the given MIME type with a nonzero quality.
+
+    """
+    if accept is None:
+        return False
+    for rng in accept.split(","):
+        params = [p.strip() for p in rng.split(";")]
+        if params[0] == mimetype:
+            return "q=0" not in params and "q=0.0" not in params
+    return False
+
+def parse_message_body(body, content_type):
+    """
+    Parses an HTTP message body of the given Content-Type into
+    an mPlane message, for either the JSON or binary encoding.
+
+    """
+    if content_type == mplane.model.MIMETYPE_JSON:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        return mplane.model.parse_json(body)
+    elif content_type == mplane.model.MIMETYPE_BINARY:
+        return mplane.model.parse_binary(body)
+    else:
+        raise ValueError("Unsupported message content type "+str(content_type))
+
 def read_setting(filepath, param):
     """
     Reads a setting from the indicated conf file
@@ -98,6 +129,25 @@ def add_value_to(container, key, value):
     else:
         container[key].append(value)
 
+def coalesce_chunks(chunks, size=STREAM_CHUNK_SIZE):
+    """
+    Joins a stream of small text chunks (as yielded by
+    mplane.model.unparse_json_stream) into UTF-8 encoded
+    chunks of at least the given size, for writing to the network.
+
+    """
+    buf = []
+    buflen = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buflen += len(chunk)
+        if buflen >= size:
+            yield "".join(buf).encode("utf-8")
+            buf = []
+            buflen = 0
+    if len(buf) > 0:
+        yield "".join(buf).encode("utf-8")
+
 def split_stmt_list(msg):
     """
     Splits a JSON array of statements (capabilities or specifications) in